@@ -8,9 +8,10 @@ import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 
-from src.data_processing import load_data
-from predict import predict_for_product
-from chatbot_streamlit import get_product_map as get_chatbot_map, chatbot_response
+from src.catalog import catalog_product_names
+from src.forecast_cache import FORECAST_CACHE_PATH, configure_forecast_cache
+from forecast_worker import ForecastWorker
+from chatbot_streamlit import chatbot_response
 
 # --- 1. CONFIGURATION ---
 
@@ -65,19 +66,34 @@ add_3d_background()
 
 # --- 3. DATA HELPERS ---
 
-@st.cache_data
+@st.cache_resource
+def init_forecast_cache():
+    # Forecasts persist on disk so a restarted app does not recompute them
+    return configure_forecast_cache(disk_path=FORECAST_CACHE_PATH)
+
+init_forecast_cache()
+
+
+@st.cache_resource
+def get_forecast_worker():
+    # One worker per server process, shared by every session: it loads data
+    # and model once and precomputes 90-day forecasts for all products
+    return ForecastWorker(horizon=90, history_days=90).start()
+
+forecast_worker = get_forecast_worker()
+
+
 def get_product_map():
-    df = load_data()
-    product_df = df[['product_id', 'product_name']].drop_duplicates()
-    product_list = sorted(product_df['product_name'].unique())
-    name_to_id = product_df.set_index('product_name')['product_id'].to_dict()
+    # From the catalog sidecar: the product list does not wait for the data
+    # load or the forecasts
+    names = catalog_product_names()
+    product_list = sorted(names.values())
+    name_to_id = {name: pid for pid, name in names.items()}
     return product_list, name_to_id
 
 
-@st.cache_data
 def get_historical_data(product_id):
-    df = load_data()
-    df = df[df['product_id'] == product_id].sort_values('date').tail(90)
+    df = forecast_worker.history(product_id).copy()
     df['Type'] = 'Historical'
     return df
 
@@ -142,61 +158,62 @@ with st.sidebar:
 
     selected_product_id = name_to_id.get(selected_product_name)
     days_ahead = st.slider("Forecast Horizon (Days)", 7, 90, 30, 7)
-    run_forecast = st.button("🚀 Generate Forecast")
 
 
 # --- 7. MAIN LOGIC ---
 
-if run_forecast or st.session_state.get("initial_run", True):
-    st.session_state["initial_run"] = False
+# Forecasts come precomputed from the background worker, so every change of
+# product or horizon is rendered straight away
+if selected_product_id and not forecast_worker.ready():
+    with st.spinner("Loading data and model, precomputing forecasts..."):
+        forecast_worker.snapshot()
 
-    if selected_product_id:
-        with st.spinner("Running AI Forecast..."):
-            forecast = predict_for_product(selected_product_id, days_ahead)
+if selected_product_id:
+    forecast = forecast_worker.forecast(selected_product_id, days_ahead)
 
-        forecast_df = pd.DataFrame(forecast)
-        forecast_df['date'] = pd.to_datetime(forecast_df['date'])
-        forecast_df.rename(columns={'predicted_demand': 'demand'}, inplace=True)
-        forecast_df['Type'] = 'Forecast'
+    forecast_df = pd.DataFrame(forecast)
+    forecast_df['date'] = pd.to_datetime(forecast_df['date'])
+    forecast_df.rename(columns={'predicted_demand': 'demand'}, inplace=True)
+    forecast_df['Type'] = 'Forecast'
 
-        history_df = get_historical_data(selected_product_id)
+    history_df = get_historical_data(selected_product_id)
 
-        combined_df = pd.concat([
-            history_df[['date', 'demand', 'price', 'Type']],
-            forecast_df[['date', 'demand', 'price', 'Type']]
-        ])
+    combined_df = pd.concat([
+        history_df[['date', 'demand', 'price', 'Type']],
+        forecast_df[['date', 'demand', 'price', 'Type']]
+    ])
 
-        st.subheader(f"📊 Results: {selected_product_name}")
+    st.subheader(f"📊 Results: {selected_product_name}")
 
-        total = forecast_df['demand'].sum()
-        avg = forecast_df['demand'].mean()
+    total = forecast_df['demand'].sum()
+    avg = forecast_df['demand'].mean()
 
-        col1, col2 = st.columns([1, 4])
+    col1, col2 = st.columns([1, 4])
 
-        with col1:
-            st.metric("Total Forecast", f"{total:,.0f}")
-            st.metric("Daily Avg", f"{avg:.1f}")
+    with col1:
+        st.metric("Total Forecast", f"{total:,.0f}")
+        st.metric("Daily Avg", f"{avg:.1f}")
 
-        with col2:
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=history_df['date'], y=history_df['demand'],
-                name="Historical", mode="lines",
-                line=dict(color="#d4a373")
-            ))
-            fig.add_trace(go.Scatter(
-                x=forecast_df['date'], y=forecast_df['demand'],
-                name="Forecast", mode="lines+markers",
-                line=dict(color="#00ffd0", width=3)
-            ))
+    with col2:
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=history_df['date'], y=history_df['demand'],
+            name="Historical", mode="lines",
+            line=dict(color="#d4a373")
+        ))
+        fig.add_trace(go.Scatter(
+            x=forecast_df['date'], y=forecast_df['demand'],
+            name="Forecast", mode="lines+markers",
+            line=dict(color="#00ffd0", width=3)
+        ))
 
-            fig.update_layout(
-                paper_bgcolor="rgba(0,0,0,0)",
-                plot_bgcolor="rgba(0,0,0,0)",
-                height=350
-            )
+        fig.update_layout(
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            height=350
+        )
 
-            st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig, use_container_width=True)
 
 
 # --- 8. CHATBOT ---
@@ -205,7 +222,7 @@ st.markdown("---")
 st.header("🤖 Chatbot Assistant")
 
 if "chatbot_map" not in st.session_state:
-    st.session_state.chatbot_map = get_chatbot_map()
+    st.session_state.chatbot_map = forecast_worker.snapshot()['matcher']
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
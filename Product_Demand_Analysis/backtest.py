@@ -0,0 +1,242 @@
+# backtest.py
+# Walk-forward backtest of the recursive forecast: many origins, all products, scored by horizon.
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from predict import HISTORY_WINDOW, forecast_histories
+from src.data_processing import load_data
+from src.model import load_artifact, load_model
+
+# --- 1. Origins and histories ---
+
+def origin_dates(max_date, horizon=90, n_origins=26, stride=7):
+    """Origins every `stride` days, the latest one `horizon` days before the data ends."""
+    last = pd.Timestamp(max_date) - pd.Timedelta(days=horizon)
+    return pd.DatetimeIndex([last - pd.Timedelta(days=stride * k) for k in range(n_origins)][::-1])
+
+def out_of_sample(origins, trained_through, allow_in_sample=False):
+    """Origins whose forecasts start after the model's training data ends.
+
+    An origin forecasts the days after it, so one on `trained_through` is
+    out-of-sample; an origin before it forecasts days the model was fit on,
+    so those are dropped (with a warning); none left is an error.
+    allow_in_sample=True keeps them and only warns. Without a
+    trained_through date (models saved before versioning) nothing can be
+    checked, which is warned about too.
+    """
+    if trained_through is None:
+        print("Warning: the model has no 'trained_through' date; origins may be in-sample "
+              "and the scores optimistic (retrain with train.py to record it)")
+        return origins
+
+    trained_through = pd.Timestamp(trained_through)
+    in_sample = origins < trained_through
+    if not in_sample.any():
+        return origins
+    if allow_in_sample:
+        print(f"Warning: {in_sample.sum()} of {len(origins)} origins are before {trained_through.date()}, "
+              "the end of the model's training data; their scores are in-sample")
+        return origins
+    if in_sample.all():
+        raise ValueError(f"Every origin ({origins[0].date()} .. {origins[-1].date()}) is before "
+                         f"{trained_through.date()}, the end of the model's training data. Use a shorter "
+                         "--horizon, a model trained through an earlier date, or --allow-in-sample.")
+    print(f"Warning: skipping {in_sample.sum()} of {len(origins)} origins before "
+          f"{trained_through.date()}, the end of the model's training data")
+    return origins[~in_sample]
+
+class PanelHistory:
+    """Demand history sorted by (product, date) with the index arrays backtests slice from."""
+
+    def __init__(self, df, product_ids=None):
+        if product_ids is not None:
+            df = df[df['product_id'].isin(product_ids)]
+        df = df.sort_values(['product_id', 'date'])
+        self.product_ids = sorted(df['product_id'].unique())
+        self.first = df['date'].min()
+        self.n_days = (df['date'].max() - self.first).days + 1
+
+        self.code = pd.Categorical(df['product_id'], categories=self.product_ids).codes.astype(np.int64)
+        self.day = (df['date'] - self.first).dt.days.to_numpy()
+        self.demand = df['demand'].to_numpy(dtype=float)
+        self.price = df['price'].to_numpy(dtype=float)
+        # (product, day) keys are sorted, so searchsorted finds any product's rows up to a day
+        self.key = self.code * (self.n_days + 1) + self.day
+        self.start = np.searchsorted(self.code, np.arange(len(self.product_ids)))
+
+        known = ~np.isnan(self.price)
+        self.price_sum = np.concatenate([[0.0], np.cumsum(np.where(known, self.price, 0.0))])
+        self.price_count = np.concatenate([[0], np.cumsum(known)])
+
+        self.dense = np.full((len(self.product_ids), self.n_days), np.nan)
+        self.dense[self.code, self.day] = self.demand
+
+    def histories(self, origins, window=HISTORY_WINDOW):
+        """Right-aligned histories for every (origin, product) pair, origin-major.
+
+        Same layout as history_matrix on the rows dated up to each origin,
+        plus each product's average price over those rows. Pairs with no
+        history before the origin are left out.
+        """
+        origin_day = np.asarray((pd.DatetimeIndex(origins) - self.first).days)
+        n_products = len(self.product_ids)
+        product = np.tile(np.arange(n_products), len(origin_day))
+        origin = np.repeat(np.arange(len(origin_day)), n_products)
+
+        end = np.searchsorted(self.key, product * (self.n_days + 1) + origin_day[origin], side='right')
+        keep = end > self.start[product]
+        product, origin, end = product[keep], origin[keep], end[keep]
+
+        pos = end[:, None] - window + np.arange(window)
+        valid = pos >= self.start[product][:, None]
+        pos = np.where(valid, pos, 0)
+        demand = np.where(valid, self.demand[pos], np.nan)
+        price = np.where(valid, self.price[pos], np.nan)
+
+        begin = self.start[product]
+        avg_price = (self.price_sum[end] - self.price_sum[begin]) / (self.price_count[end] - self.price_count[begin])
+        last_day = self.day[end - 1]
+        return product, origin, demand, price, last_day, avg_price
+
+    def actuals(self, product, last_day, horizon):
+        """(series x horizon) observed demand on the forecast dates; NaN where unknown."""
+        day = last_day[:, None] + np.arange(1, horizon + 1)
+        inside = day < self.n_days
+        return np.where(inside, self.dense[product[:, None], np.where(inside, day, 0)], np.nan)
+
+# --- 2. Workers ---
+
+_worker = {}
+
+def _init_worker(model_path, data_path, product_ids, threads):
+    from threadpoolctl import threadpool_limits
+
+    # One process per core already; LightGBM's own threads would oversubscribe
+    _worker['limits'] = threadpool_limits(threads)
+    _worker['model'], _worker['features'] = load_model(model_path)
+    _worker['panel'] = PanelHistory(load_data(data_path), product_ids)
+
+def _run_origins(origins, horizon):
+    panel, model, features = _worker['panel'], _worker['model'], _worker['features']
+    product, origin, demand, price, last_day, avg_price = panel.histories(origins)
+    series_ids = [panel.product_ids[p] for p in product]
+    last_dates = panel.first + pd.to_timedelta(last_day, unit='D')
+
+    pred = forecast_histories(model, features, series_ids, demand, price, last_dates, avg_price, horizon)
+    return series_ids, origin, pred.astype(np.float32), panel.actuals(product, last_day, horizon).astype(np.float32)
+
+# --- 3. Driver and summaries ---
+
+def _errors(err, axis):
+    """MAE, RMSE and count of the known errors along `axis`."""
+    known = ~np.isnan(err)
+    count = known.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nansum(np.abs(err), axis=axis) / count, np.sqrt(np.nansum(err ** 2, axis=axis) / count), count
+
+def run_backtest(horizon=90, n_origins=26, stride=7, workers=None, product_ids=None,
+                 model_path=None, data_path=None, allow_in_sample=False):
+    """Recursive forecasts from `n_origins` origins for every product, scored against actuals.
+
+    Each worker process forecasts a block of origins for all products in one
+    vectorized recursive run: a step is a single predict over every
+    (product, origin) pair in the block. Origins inside the model's training
+    period are dropped (see out_of_sample).
+    """
+    start = time.perf_counter()
+    index = load_data(data_path, columns=['product_id', 'date'])
+    if product_ids:
+        missing = sorted(set(product_ids) - set(index['product_id'].unique()))
+        if missing:
+            raise ValueError(f"Unknown product_id(s): {', '.join(missing)}")
+    origins = origin_dates(index['date'].max(), horizon, n_origins, stride)
+    del index
+    trained_through = load_artifact(model_path)['metadata'].get('trained_through')
+    origins = out_of_sample(origins, trained_through, allow_in_sample)
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(origins)))
+    blocks = [b for b in np.array_split(np.arange(len(origins)), workers) if len(b)]
+    init_args = (model_path, data_path, product_ids, max(1, cores // workers))
+
+    if workers == 1:
+        _init_worker(*init_args)
+        parts = [_run_origins(origins, horizon)]
+        _worker.clear()
+    else:
+        ctx = mp.get_context('spawn')  # LightGBM's OpenMP runtime is not fork-safe
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=init_args) as pool:
+            futures = [pool.submit(_run_origins, origins[b], horizon) for b in blocks]
+            parts = []
+            for b, future in zip(blocks, futures):
+                series_ids, origin, pred, actual = future.result()
+                parts.append((series_ids, b[origin], pred, actual))
+
+    series_ids = np.concatenate([np.asarray(p[0], dtype=object) for p in parts])
+    pred, actual = (np.concatenate([p[i] for p in parts]) for i in (2, 3))
+    err = pred.astype(float) - actual
+
+    h_mae, h_rmse, h_n = _errors(err, axis=0)
+    products = sorted(set(series_ids))
+    codes = pd.Categorical(series_ids, categories=products).codes
+    by_product = []
+    for p, pid in enumerate(products):
+        mae, rmse, n = _errors(err[codes == p].ravel(), axis=0)
+        by_product.append({'product_id': pid, 'mae': float(mae), 'rmse': float(rmse), 'n': int(n)})
+    mae, rmse, n = _errors(err.ravel(), axis=0)
+
+    return {
+        'config': {'horizon': horizon, 'origins': len(origins), 'stride': stride, 'workers': workers,
+                   'first_origin': str(origins[0].date()), 'last_origin': str(origins[-1].date()),
+                   'trained_through': trained_through},
+        'series': int(len(err)),
+        'seconds': round(time.perf_counter() - start, 3),
+        'overall': {'mae': float(mae), 'rmse': float(rmse), 'n': int(n)},
+        'by_horizon': [{'horizon': h + 1, 'mae': float(h_mae[h]), 'rmse': float(h_rmse[h]), 'n': int(h_n[h])}
+                       for h in range(horizon)],
+        'by_product': by_product,
+    }
+
+def print_report(result, horizons=(1, 2, 3, 7, 14, 21, 28, 42, 60, 90)):
+    cfg = result['config']
+    print(f"\n--- Walk-forward backtest: {result['series']} (product, origin) series, "
+          f"{cfg['origins']} origins {cfg['first_origin']} .. {cfg['last_origin']} every {cfg['stride']} days ---")
+    print(f"Overall  MAE {result['overall']['mae']:.2f}  RMSE {result['overall']['rmse']:.2f}  "
+          f"({result['seconds']:.1f}s, {cfg['workers']} workers)")
+
+    print(f"\n{'horizon':>7} {'MAE':>8} {'RMSE':>8}")
+    for row in result['by_horizon']:
+        if row['horizon'] in horizons:
+            print(f"{row['horizon']:>7} {row['mae']:8.2f} {row['rmse']:8.2f}")
+
+    print(f"\n{'product':<10} {'MAE':>8} {'RMSE':>8}")
+    for row in result['by_product']:
+        print(f"{row['product_id']:<10} {row['mae']:8.2f} {row['rmse']:8.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the recursive forecast.")
+    parser.add_argument("--horizon", type=int, default=90, help="Days forecast from each origin.")
+    parser.add_argument("--origins", type=int, default=26, help="Number of forecast origins.")
+    parser.add_argument("--stride", type=int, default=7, help="Days between consecutive origins.")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores).")
+    parser.add_argument("--products", nargs='+', help="Only backtest these product IDs.")
+    parser.add_argument("--output", help="Also write the full report (every horizon and product) as JSON here.")
+    parser.add_argument("--allow-in-sample", action="store_true",
+                        help="Keep origins inside the model's training period (scores will be optimistic).")
+    args = parser.parse_args()
+
+    result = run_backtest(args.horizon, args.origins, args.stride, args.workers, args.products,
+                          allow_in_sample=args.allow_in_sample)
+    print_report(result)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print("\nReport written to", args.output)
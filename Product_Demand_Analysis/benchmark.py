@@ -0,0 +1,305 @@
+# benchmark.py
+# Times each pipeline stage on synthetic data at several scales and compares runs.
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from queue import Empty
+
+from src.memory_profile import RssSampler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks')
+
+# --- 1. Measurement helpers ---
+
+def measure(stage, fn, repeat=1, rows=None, forecasts=None):
+    """Run fn `repeat` times; returns (last result, record with the best wall time)."""
+    times = []
+    with RssSampler() as rss:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+
+    wall = min(times)
+    record = {
+        'stage': stage,
+        'wall_s': round(wall, 6),
+        'runs_s': [round(t, 6) for t in times],
+        'peak_rss_mb': round(rss.peak / 2**20, 1),
+        'rss_delta_mb': round((rss.peak - rss.start_rss) / 2**20, 1),
+    }
+    if rows is not None:
+        record['rows'] = rows
+        record['rows_per_s'] = round(rows / wall, 1)
+    if forecasts is not None:
+        record['forecasts'] = forecasts
+        record['forecasts_per_s'] = round(forecasts / wall, 2)
+    print(f"  {stage:<28} {wall:9.3f}s  peak RSS {record['peak_rss_mb']:8.1f} MB", flush=True)
+    return result, record
+
+# --- 2. Stages for one scale ---
+
+def run_scale(n_products, years, n_estimators, forecast_days, repeat):
+    """All stages on one synthetic dataset; runs in a fresh process per scale."""
+    import pandas as pd
+    from data_sample import write_dataset
+    from predict import evaluate_model, forecast_products
+    from src.data_processing import build_columnar_cache, columnar_cache_path, create_lag_features, load_data, train_test_split_time_series
+    from src.compiled_model import compile_model
+    from src.model import category_codes, predict_matrix, train_model
+    from src.streaming import encode_features
+    from train import select_feature_cols
+
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, 'demand.csv.gz')
+        model_path = os.path.join(tmp, 'model.joblib')
+        end = (pd.Timestamp('2022-01-01') + pd.DateOffset(years=years) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+        rows, rec = measure('generate_data', lambda: write_dataset(data_path, n_products=n_products, end=end))
+        records.append(dict(rec, rows=rows))
+
+        _, rec = measure('load_data_csv', lambda: load_data(data_path, use_cache=False), repeat, rows=rows)
+        records.append(rec)
+        build_columnar_cache(data_path, columnar_cache_path(data_path))
+        df, rec = measure('load_data', lambda: load_data(data_path), repeat, rows=rows)
+        records.append(rec)
+
+        feats, rec = measure('create_lag_features', lambda: create_lag_features(df), repeat, rows=len(df))
+        records.append(rec)
+
+        (train_df, test_df), rec = measure(
+            'train_test_split_time_series', lambda: train_test_split_time_series(feats, test_size_days=90),
+            repeat, rows=len(feats)
+        )
+        records.append(rec)
+
+        # Same validation split and categorical handling as train.py
+        split_val_date = train_df['date'].max() - pd.Timedelta(days=30)
+        fit_df = train_df[train_df['date'] <= split_val_date].copy()
+        val_df = train_df[train_df['date'] > split_val_date].copy()
+        for col in ['product_id', 'product_month_interaction']:
+            fit_df[col] = fit_df[col].astype('category')
+            val_df[col] = val_df[col].astype('category')
+        feature_cols = select_feature_cols(fit_df.columns)
+
+        model, rec = measure(
+            'train_model',
+            lambda: train_model(fit_df, feature_cols, val_df=val_df,
+                                params={'n_estimators': n_estimators, 'verbose': -1}, model_path=model_path),
+            rows=len(fit_df)
+        )
+        records.append(dict(rec, n_estimators=n_estimators))
+        row_df = val_df[feature_cols].iloc[:1]
+        del feats, train_df, test_df, fit_df, val_df
+
+        # Single-row scoring: pandas frame, float matrix to the Booster, compiled arrays
+        compiled, rec = measure('compile_model', lambda: compile_model(model))
+        records.append(rec)
+        row = encode_features(row_df, feature_cols, {c: list(m) for c, m in category_codes(model, feature_cols).items()})
+        n_calls = 200
+        for stage, fn in [('predict_row_pandas', lambda: model.predict(row_df)),
+                          ('predict_row_matrix', lambda: predict_matrix(model, row)),
+                          ('predict_row_compiled', lambda: compiled.predict(row))]:
+            _, rec = measure(stage, lambda: [fn() for _ in range(n_calls)], repeat, forecasts=n_calls)
+            records.append(rec)
+
+        product_ids = sorted(df['product_id'].unique())
+        sample = product_ids[:min(10, len(product_ids))]
+        _, rec = measure(
+            'predict_for_product',
+            lambda: [forecast_products(model, feature_cols, df, [pid], forecast_days) for pid in sample],
+            repeat, forecasts=len(sample)
+        )
+        records.append(dict(rec, days_ahead=forecast_days))
+
+        _, rec = measure(
+            'predict_for_products_batch',
+            lambda: forecast_products(model, feature_cols, df, product_ids, forecast_days),
+            repeat, forecasts=len(product_ids)
+        )
+        records.append(dict(rec, days_ahead=forecast_days))
+
+        _, rec = measure(
+            'evaluate_model', lambda: evaluate_model(model_path=model_path, data_path=data_path),
+            repeat, rows=rows
+        )
+        records.append(rec)
+
+    return [dict(r, products=n_products, years=years) for r in records]
+
+def _scale_worker(queue, *args):
+    try:
+        queue.put(('ok', run_scale(*args)))
+    except Exception as e:
+        queue.put(('error', f"{type(e).__name__}: {e}"))
+
+def _wait_for_result(queue, proc, poll=1.0):
+    """The (status, payload) a scale process sends, or an error if it dies first.
+
+    An OOM kill or a segfault ends the process without a result, so the
+    queue is polled while the process is alive instead of waited on.
+    """
+    while True:
+        try:
+            return queue.get(timeout=poll)
+        except Empty:
+            if not proc.is_alive():
+                break
+    # The result may have landed just before the process exited
+    try:
+        return queue.get(timeout=poll)
+    except Empty:
+        proc.join()
+        return 'error', f"process exited with code {proc.exitcode} without a result"
+
+def run_benchmarks(scales, years=3, n_estimators=200, forecast_days=30, repeat=1):
+    """Each scale runs in its own spawned process so peak RSS is not shared between scales."""
+    ctx = mp.get_context('spawn')
+    results = []
+    for n_products in scales:
+        print(f"\n--- {n_products} products x {years} years ---", flush=True)
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_scale_worker,
+                           args=(queue, n_products, years, n_estimators, forecast_days, repeat))
+        proc.start()
+        status, payload = _wait_for_result(queue, proc)
+        proc.join()
+        if status != 'ok':
+            raise RuntimeError(f"Benchmark at {n_products} products failed: {payload}")
+        results.extend(payload)
+    return results
+
+def environment():
+    import lightgbm
+    import numpy as np
+    import pandas as pd
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'lightgbm': lightgbm.__version__,
+    }
+
+# --- 3. Startup budgets ---
+
+# Wall time of a fresh interpreter running each entry point up to its first
+# prompt (or --help), in seconds. Heavy imports belong behind first use.
+# train.py and backtest.py need pandas, NumPy and LightGBM for every run and
+# import them up front; their budget is that import cost plus headroom.
+STARTUP_BUDGETS = [
+    ('chatbot.py', ['chatbot.py'], 'exit\n', 0.3),
+    ('chatbot.py --warm', ['chatbot.py', '--warm'], 'exit\n', 0.3),
+    ('predict.py --help', ['predict.py', '--help'], None, 0.2),
+    ('backtest.py --help', ['backtest.py', '--help'], None, 0.8),
+    ('train.py --help', ['train.py', '--help'], None, 0.8),
+    ('import predict', ['-c', 'import predict'], None, 0.2),
+]
+
+def measure_startup(repeat=5, budgets=None):
+    """Best-of-`repeat` startup time of each entry point against its budget."""
+    import subprocess
+
+    records = []
+    for name, args, stdin, budget in budgets or STARTUP_BUDGETS:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], input=stdin, cwd=BASE_DIR, text=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        wall = min(times)
+        records.append({'entry_point': name, 'wall_s': round(wall, 4), 'budget_s': budget,
+                        'over_budget': wall > budget})
+        flag = 'OVER BUDGET' if wall > budget else ''
+        print(f"  {name:<24} {wall:7.3f}s  budget {budget:5.2f}s  {flag}", flush=True)
+    return records
+
+# --- 4. Comparing runs ---
+
+def compare_runs(base, new, threshold=0.10, min_seconds=0.05):
+    """Rows of (products, stage, base, new, change, flag) for stages present in both runs.
+
+    A stage regresses when wall time grows by more than `threshold` (and by
+    more than `min_seconds`, to ignore timer noise on tiny stages) or when
+    peak RSS grows by more than `threshold`.
+    """
+    base_by_key = {(r['products'], r['stage']): r for r in base['results']}
+    rows = []
+    for r in new['results']:
+        b = base_by_key.get((r['products'], r['stage']))
+        if b is None:
+            continue
+        change = r['wall_s'] / b['wall_s'] - 1 if b['wall_s'] else 0.0
+        rss_change = r['peak_rss_mb'] / b['peak_rss_mb'] - 1 if b['peak_rss_mb'] else 0.0
+        flags = []
+        if change > threshold and r['wall_s'] - b['wall_s'] > min_seconds:
+            flags.append('SLOWER')
+        if rss_change > threshold:
+            flags.append('MORE MEMORY')
+        rows.append({
+            'products': r['products'], 'stage': r['stage'],
+            'base_s': b['wall_s'], 'new_s': r['wall_s'], 'change': change,
+            'base_rss_mb': b['peak_rss_mb'], 'new_rss_mb': r['peak_rss_mb'], 'rss_change': rss_change,
+            'regression': bool(flags), 'flags': flags,
+        })
+    return rows
+
+def print_comparison(rows):
+    print(f"{'products':>8}  {'stage':<28} {'base s':>9} {'new s':>9} {'time':>8} {'rss':>8}")
+    for r in rows:
+        print(f"{r['products']:>8}  {r['stage']:<28} {r['base_s']:9.3f} {r['new_s']:9.3f} "
+              f"{r['change']:+8.1%} {r['rss_change']:+8.1%}  {' '.join(r['flags'])}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting pipeline on synthetic data.")
+    parser.add_argument("--products", type=int, nargs='+', default=[20, 1000],
+                        help="Product counts to benchmark (e.g. 20 1000 10000).")
+    parser.add_argument("--years", type=int, default=3, help="Years of daily history per product.")
+    parser.add_argument("--n-estimators", type=int, default=200,
+                        help="Boosting rounds for train_model (the production 10000 is too slow to benchmark).")
+    parser.add_argument("--forecast-days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is reported.")
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/<timestamp>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=('BASE', 'NEW'),
+                        help="Compare two result files instead of running; exits 1 on regressions.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown flagged as a regression.")
+    parser.add_argument("--startup", action="store_true",
+                        help="Check entry point startup times against STARTUP_BUDGETS instead; exits 1 if any is over.")
+    args = parser.parse_args()
+
+    if args.startup:
+        print("--- Startup (best of", max(args.repeat, 5), "runs) ---")
+        records = measure_startup(repeat=max(args.repeat, 5))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'environment': environment(), 'startup': records}, f, indent=2)
+        sys.exit(1 if any(r['over_budget'] for r in records) else 0)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        rows = compare_runs(base, new, threshold=args.threshold)
+        print_comparison(rows)
+        sys.exit(1 if any(r['regression'] for r in rows) else 0)
+
+    results = run_benchmarks(args.products, args.years, args.n_estimators, args.forecast_days, args.repeat)
+    run = {'environment': environment(), 'config': vars(args), 'results': results}
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(run, f, indent=2)
+    print("\nResults written to", output)
@@ -1,54 +1,88 @@
-import re
-import pandas as pd
-from src.data_processing import load_data
-from predict import predict_for_product
+import argparse
+import threading
+
+# Only light modules at import time: the forecasting stack (pandas, the
+# model code, LightGBM) is imported on the first forecast, or in the
+# background with --warm, so the prompt comes up straight away
+from src.catalog import catalog_product_names
+from src.chat_queries import display_name, parse_days, parse_query, summarize
+from src.product_matcher import as_matcher
 
 def get_product_map():
-    """Loads all product names and IDs from the data file for easy lookup."""
+    """Loads all product names and IDs from the catalog index for easy lookup."""
     try:
-        # Load only the necessary columns (ID and Name) from the data
-        df = load_data()
-        product_map = df[['product_id', 'product_name']].drop_duplicates().set_index('product_id')['product_name'].to_dict()
+        # The catalog sidecar lists products without reading the demand history
+        product_map = catalog_product_names()
         return {name.lower(): pid for pid, name in product_map.items()}
     except Exception as e:
         print(f"Error loading product map: {e}")
         return {}
 
-def parse_user_query(query: str, product_map: dict):
-    query = query.lower()
-    product_id = None
-    days_ahead = 7 
-
-    # A. Extract Days Ahead 
-    day_match = re.search(r'(\d+)\s*(day|week|month)', query)
-    if day_match:
-        number = int(day_match.group(1))
-        unit = day_match.group(2)
-        if unit == 'day':
-            days_ahead = number
-        elif unit == 'week':
-            days_ahead = number * 7
-        elif unit == 'month':
-            days_ahead = number * 30
-        
-        # Max prediction 90 days
-        days_ahead = min(days_ahead, 90)
-
-    # Extracts Product ID 
-    for name, pid in product_map.items():
-        if name in query or pid.lower() in query:
-            product_id = pid
-            break
-            
-    # Handle default if only one product exists
-    if not product_id and len(product_map) == 1:
-        product_id = list(product_map.values())[0]
+def parse_user_query(query: str, product_map):
+    """(product_id, days_ahead) for a single-product question.
+
+    product_map: a ProductMatcher, or the {name_lower: product_id} dict. The
+    first product mentioned wins; product_id is None when none is found or
+    the question is about the whole catalog (see parse_query).
+    """
+    request = parse_query(query, as_matcher(product_map))
+    if request is None or request.scope == 'all':
+        return None, parse_days(query)
+    return request.product_ids[0], request.days
+
+def format_summary(request, summary, id_to_name):
+    """Text reply for a list, all-products or ranking request."""
+    if request.rank:
+        order = "Top" if request.rank == 'top' else "Bottom"
+        response = [f"{order} {summary['products']} products by predicted demand over the next {request.days} days:"]
+    elif request.scope == 'all':
+        response = [f"Forecast for all {summary['products']} products over the next {request.days} days:"]
+    else:
+        response = [f"Forecast for {summary['products']} products over the next {request.days} days:"]
 
-    return product_id, days_ahead
+    response.append(f"  > Total Predicted Demand: {summary['total']:.0f} units.")
+    response.append("  > By Product:")
+    for i, (pid, total) in enumerate(summary['ranking'], 1):
+        response.append(f"    {i:>2}. {id_to_name.get(pid, pid)} ({pid}): {total:.0f} units.")
+    response.append("  > Daily Breakdown (combined):")
+    for date, total in summary['daily']:
+        response.append(f"    - {date}: {total:.0f} units.")
+    return '\n'.join(response)
+
+def forecast(product_ids, days_ahead):
+    """One batched forecast; imports the forecasting stack on first use."""
+    from predict import predict_for_products
+    return predict_for_products(product_ids, days_ahead)
+
+def warm_up():
+    """Import the forecasting stack and load model and data on a background thread.
+
+    A query typed before it finishes simply waits for the loads in progress.
+    Errors are left for that query to report.
+    """
+    def load():
+        try:
+            from src.registry import get_data, get_model
+            get_model()
+            get_data()
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=load, name='chatbot-warm-up', daemon=True)
+    thread.start()
+    return thread
 
 # --- 2. Main Chatbot Loop ---
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask for demand forecasts in plain language.")
+    parser.add_argument("--warm", action="store_true",
+                        help="Load the model and data in the background while the prompt is shown.")
+    args = parser.parse_args()
+
+    if args.warm:
+        warm_up()
+
     print("🤖 Forecasting Chatbot Initialized...")
     
     # Load product map once at the start
@@ -57,10 +91,13 @@ if __name__ == "__main__":
         print("FATAL: Could not load products. Ensure data_sample.py has been run and data/ is correct.")
     
     # Reverse map for printing results
-    ID_TO_NAME = {pid: name.title().replace('_', ' ') for name, pid in PRODUCT_MAP.items()}
+    ID_TO_NAME = {pid: display_name(name) for name, pid in PRODUCT_MAP.items()}
+    # Name/ID index built once and reused for every message
+    PRODUCT_MATCHER = as_matcher(PRODUCT_MAP)
 
     print(f"I can forecast demand for {len(ID_TO_NAME)} products.")
     print("Example Products: Coffee Beans Arabica (P001), Chai Latte Mix (P005)")
+    print("Also try: 'P001 and P005 for 2 weeks', 'all products next month', 'top 5 products for 30 days'")
     print("---")
     
     while True:
@@ -71,16 +108,30 @@ if __name__ == "__main__":
                 break
             
             # 1. Parse Input
-            pid, days = parse_user_query(user_input, PRODUCT_MAP)
+            request = parse_query(user_input, PRODUCT_MATCHER)
             
-            if not pid:
-                print("Bot: Sorry, I couldn't identify the product. Try using the Product ID (e.g., P005) or name.")
+            if not request:
+                print("Bot: Sorry, I couldn't identify the product. Try using the Product ID (e.g., P005) or name, 'all products' or 'top 5'.")
                 continue
 
-            # 2. Generate Forecast
-            print(f"Bot: Generating {days}-day forecast for {ID_TO_NAME.get(pid, pid)}...")
+            # 2. Generate Forecast (one batched call however many products were asked for)
+            days = request.days
+            if request.scope == 'single':
+                pid = request.product_ids[0]
+                print(f"Bot: Generating {days}-day forecast for {ID_TO_NAME.get(pid, pid)}...")
+            else:
+                print(f"Bot: Generating {days}-day forecasts for {len(request.product_ids)} products...")
             
-            forecast_results = predict_for_product(product_id=pid, days_ahead=days)
+            forecasts = forecast(request.product_ids, days)
+
+            if request.scope != 'single':
+                if any(forecasts.values()):
+                    print(format_summary(request, summarize(forecasts, request.rank, request.top_n), ID_TO_NAME))
+                else:
+                    print("Bot: I could not generate a forecast. Check the product IDs and model file.")
+                continue
+
+            forecast_results = forecasts.get(pid)
             
             # 3. Format and Print Results
             if forecast_results:
@@ -1,68 +1,76 @@
 # chatbot_streamlit.py
-import re
-from src.data_processing import load_data
-from predict import predict_for_product
+from src.chat_queries import display_name, parse_days, parse_query, summarize
+from src.product_matcher import as_matcher
+from src.catalog import catalog_product_names
+from predict import predict_for_products
 
 # ---------- UTILITIES ----------
 
 def get_product_map():
-    """Returns {product_name_lower: product_id}"""
+    """Returns {product_name_lower: product_id} from the catalog index."""
     try:
-        df = load_data()
-        map_ = df[['product_id', 'product_name']].drop_duplicates()
-        
-        product_map = {}
-        for _, row in map_.iterrows():
-            name = str(row['product_name']).lower()
-            product_map[name] = row['product_id']
-        return product_map
+        return {str(name).lower(): pid for pid, name in catalog_product_names().items()}
     except Exception:
         return {}
 
-def parse_user_query(query: str, product_map: dict):
-    """Extracts product ID and forecast horizon from natural language."""
-    query = query.lower()
-    product_id = None
-    days = 7  # default
+def parse_user_query(query: str, product_map):
+    """Extracts product ID and forecast horizon from natural language.
 
-    # extract time period
-    m = re.search(r"(\d+)\s*(day|days|week|weeks|month|months)", query)
-    if m:
-        value = int(m.group(1))
-        unit = m.group(2)
-
-        if "day" in unit:
-            days = value
-        elif "week" in unit:
-            days = value * 7
-        elif "month" in unit:
-            days = value * 30
-
-        days = min(days, 90)
-
-    # match product name
-    for name, pid in product_map.items():
-        if name in query:
-            product_id = pid
-            break
-
-    return product_id, days
+    product_map: a ProductMatcher, or the {name_lower: product_id} dict.
+    Returns (product_id, days); see chatbot.parse_user_query.
+    """
+    request = parse_query(query, as_matcher(product_map))
+    if request is None or request.scope == "all":
+        return None, parse_days(query)
+    return request.product_ids[0], request.days
 
 # ---------- MAIN CHAT FUNCTION ----------
 
-def chatbot_response(user_input: str, product_map: dict):
-    """Handles user message and returns chatbot reply."""
-    pid, days = parse_user_query(user_input, product_map)
-
-    if not pid:
-        return "I couldn’t identify the product. Try using the product name like *Chai Latte Mix*."
+def format_summary(request, summary, names):
+    """Markdown reply for a list, all-products or ranking request."""
+    if request.rank:
+        order = "Top" if request.rank == "top" else "Bottom"
+        title = f"### 🏆 {order} {summary['products']} products over the next *{request.days} days*"
+    elif request.scope == "all":
+        title = f"### 📦 Forecast for all {summary['products']} products over the next *{request.days} days*"
+    else:
+        title = f"### 📦 Forecast for {summary['products']} products over the next *{request.days} days*"
+
+    lines = [title, f"*Total demand:* **{summary['total']:.0f} units**\n", "#### By product:"]
+    for i, (pid, total) in enumerate(summary['ranking'], 1):
+        lines.append(f"{i}. **{display_name(names.get(pid, pid))}** ({pid}) → {total:.0f} units")
+
+    lines.append("\n#### Daily Breakdown (combined):")
+    for date, total in summary['daily']:
+        lines.append(f"- **{date}** → {total:.0f} units")
+    return "\n".join(lines)
+
+def chatbot_response(user_input: str, product_map):
+    """Handles user message and returns chatbot reply.
+
+    Lists of products, "all products" and "top/bottom N" requests are
+    forecast in one batched call and answered with totals, a ranking and
+    the combined daily breakdown.
+    """
+    matcher = as_matcher(product_map)
+    request = parse_query(user_input, matcher)
+
+    if not request:
+        return "I couldn’t identify the product. Try using the product name like *Chai Latte Mix*, or ask for *all products* or the *top 5*."
 
     try:
-        forecast = predict_for_product(pid, days)
+        forecasts = predict_for_products(request.product_ids, request.days)
+
+        if request.scope != "single":
+            if not any(forecasts.values()):
+                return "I couldn’t generate a forecast. Check the model or the data."
+            return format_summary(request, summarize(forecasts, request.rank, request.top_n), matcher.names)
 
+        forecast = forecasts.get(request.product_ids[0])
         if not forecast:
             return "I couldn’t generate a forecast. Check the model or the data."
 
+        days = request.days
         total = sum(f["predicted_demand"] for f in forecast)
         lines = [
             f"### 📦 Forecast for next *{days} days*",
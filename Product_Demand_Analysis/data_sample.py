@@ -1,14 +1,16 @@
-
 # Generates synthetic product demand data for multiple products
-import numpy as np
-import pandas as pd
-from datetime import datetime
+import argparse
+import gzip
 import os
 
-os.makedirs('data', exist_ok=True)
+import numpy as np
+import pandas as pd
 
-np.random.seed(42)
+from src.catalog import catalog_path
+from src.data_processing import product_stats, write_catalog
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, 'data', 'sample_product_demand.csv.gz')
 
 product_names = [
     'Coffee_Beans_Arabica', 'Espresso_Machine_V1', 'Milk_Frother_Pro', 'Tea_Sampler_Green', 'Chai_Latte_Mix',
@@ -16,11 +18,6 @@ product_names = [
     'Pastry_Mix_Croissant', 'Honey_Local_12oz', 'Sugar_Cane_Cubes', 'Spoon_Set_Long', 'Cleaning_Tablets_50ct',
     'Filter_Paper_Cone', 'Water_Kettle_Electric', 'Grinder_Blade_Mini', 'Scale_Digital_Precision', 'Decaf_Blend_House'
 ]
-products = {f'P{str(i).zfill(3)}': name for i, name in enumerate(product_names, 1)}
-
-# Date range
-dates = pd.date_range(start="2022-01-01", end="2024-12-31", freq="D")
-
 
 holidays = {
     (12, 25): 1.5, # Christmas spike
@@ -28,63 +25,130 @@ holidays = {
     (7, 4): 1.1,   # Independence Day minor spike
 }
 
-rows = []
-for date in dates:
-    days_in_year = 366 if date.is_leap_year else 365
-    day_of_year = date.timetuple().tm_yday
-    
-    # Check for holidays
-    holiday_factor = holidays.get((date.month, date.day), 1.0)
-
-    for p_id, p_name in products.items():
-        p_index = int(p_id[1:])
-        
-        # 1. Baseline demand
-        base = 50 + (p_index % 20) * 3
-
-        # 2. Weekly seasonality (+10% on weekends)
-        weekly = 1.0 + (0.1 if date.weekday() >= 5 else 0)
-
-        # 3. Annual seasonality (sin wave)
-        annual = 1.0 + 0.2 * np.sin(2 * np.pi * day_of_year / days_in_year)
-
-        # 4. Product-specific trend: Growing products (odd index) vs. Stable/Declining (even index)
-        trend_slope = 0.0001 if p_index % 2 == 1 else -0.00005 
-        days_elapsed = (date - dates[0]).days
+def product_catalog(n_products=len(product_names)):
+    """IDs and names; past the 20 named products, names repeat with a numeric suffix."""
+    width = max(3, len(str(n_products)))
+    ids, names = [], []
+    for i in range(1, n_products + 1):
+        ids.append(f'P{str(i).zfill(width)}')
+        base = product_names[(i - 1) % len(product_names)]
+        cycle = (i - 1) // len(product_names)
+        names.append(base if cycle == 0 else f'{base}_{cycle + 1}')
+    return ids, names
+
+def generate_chunks(n_products=20, start="2022-01-01", end="2024-12-31", seed=42, chunk_rows=1_000_000):
+    """Yield the dataset as date-ordered DataFrames of about `chunk_rows` rows.
+
+    Each chunk is a (dates x products) block computed with array operations,
+    using the same demand model as before: baseline x weekly x annual x trend
+    x holiday x promotion x price elasticity, plus Gaussian noise.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start=start, end=end, freq="D")
+    ids, names = product_catalog(n_products)
+
+    # --- Per-product terms, shape (N,) ---
+    p_index = np.arange(1, n_products + 1)
+    base = 50 + (p_index % 20) * 3                                   # 1. Baseline demand
+    trend_slope = np.where(p_index % 2 == 1, 0.0001, -0.00005)       # 4. Growing (odd) vs declining (even)
+    expected_base_price = 10 + (p_index % 10) * 0.5
+
+    days_per_chunk = max(1, chunk_rows // max(1, n_products))
+    for lo in range(0, len(dates), days_per_chunk):
+        chunk_dates = dates[lo:lo + days_per_chunk]
+        n_days = len(chunk_dates)
+        month_of = chunk_dates.month.to_numpy()
+        day_of = chunk_dates.day.to_numpy()
+
+        # --- Per-date terms, shape (D, 1) ---
+        weekly = np.where(chunk_dates.weekday.to_numpy() >= 5, 1.1, 1.0)[:, None]  # 2. Weekly seasonality
+        days_in_year = np.where(chunk_dates.is_leap_year, 366, 365)
+        annual = (1.0 + 0.2 * np.sin(2 * np.pi * chunk_dates.dayofyear.to_numpy() / days_in_year))[:, None]  # 3. Annual seasonality
+        days_elapsed = (chunk_dates - dates[0]).days.to_numpy()[:, None]
+        holiday_factor = np.ones(n_days)
+        for (month, day), factor in holidays.items():
+            holiday_factor[(month_of == month) & (day_of == day)] = factor
+        holiday_factor = holiday_factor[:, None]
+
+        # --- (D, N) block ---
         trend_factor = 1.0 + trend_slope * days_elapsed
-        
-    
-        promo = 1.0
-        is_promo = False
-        if np.random.rand() < 0.02:
-            promo = 1.5
-            is_promo = True
+        is_promo = rng.random((n_days, n_products)) < 0.02
+        promo = np.where(is_promo, 1.5, 1.0)
 
         # Price generation (with base product offset)
-        expected_base_price = 10 + (p_index % 10) * 0.5
-        price = max(0, round(expected_base_price + np.random.normal(0, 0.5), 2))
-        
-    
-        price_elasticity_factor = 1.0 - 0.05 * (price - expected_base_price) 
-        price_elasticity_factor = max(0.5, price_elasticity_factor) 
+        price = np.maximum(0, np.round(expected_base_price + rng.normal(0, 0.5, (n_days, n_products)), 2))
+        price_elasticity_factor = np.maximum(0.5, 1.0 - 0.05 * (price - expected_base_price))
 
         # Final Demand Calculation
         demand = base * weekly * annual * trend_factor * holiday_factor * promo * price_elasticity_factor
-        demand = max(0, int(np.round(demand + np.random.normal(0, 8))))
-
-        rows.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'product_id': p_id,
-            'product_name': p_name, # Added
-            'price': price,
-            'demand': demand,
-            'promotion': 1 if is_promo else 0
+        demand = np.maximum(0, np.round(demand + rng.normal(0, 8, (n_days, n_products)))).astype(int)
+
+        # Product columns are categorical: one code per row instead of a string
+        codes = np.tile(np.arange(n_products), n_days)
+        yield pd.DataFrame({
+            'date': np.repeat(chunk_dates.values, n_products),
+            'product_id': pd.Categorical.from_codes(codes, categories=ids),
+            'product_name': pd.Categorical.from_codes(codes, categories=names),
+            'price': price.ravel(),
+            'demand': demand.ravel(),
+            'promotion': is_promo.ravel().astype(int),
         })
 
-# Build DataFrame
-df = pd.DataFrame(rows)
-
-# Save compressed CSV
-df.to_csv('data/sample_product_demand.csv.gz', index=False, compression='gzip')
-
-print('Written data/sample_product_demand.csv.gz with', len(df), 'rows')
\ No newline at end of file
+def write_dataset(path=DEFAULT_OUTPUT, catalog=True, **gen_kwargs):
+    """Stream generate_chunks to CSV.gz or Parquet (by extension); returns the row count.
+
+    catalog=True also writes the product catalog sidecar, built from the
+    chunks as they are written so the dataset is never read back.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rows = 0
+    stats = None
+
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for chunk in generate_chunks(**gen_kwargs):
+                if catalog:
+                    stats = product_stats(chunk, stats)
+                # Plain string columns, same schema as load_data's columnar cache
+                chunk = chunk.astype({'product_id': str, 'product_name': str})
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with gzip.open(path, 'wt', compresslevel=6, newline='') as f:
+            for chunk in generate_chunks(**gen_kwargs):
+                if catalog:
+                    stats = product_stats(chunk, stats)
+                chunk.to_csv(f, index=False, header=(rows == 0), date_format='%Y-%m-%d')
+                rows += len(chunk)
+
+    if stats is not None:
+        write_catalog(stats, path)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic product demand data.")
+    parser.add_argument("--products", type=int, default=20, help="Number of products.")
+    parser.add_argument("--start", default="2022-01-01", help="First date (YYYY-MM-DD).")
+    parser.add_argument("--end", default="2024-12-31", help="Last date (YYYY-MM-DD).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows generated and written per chunk.")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Output path ending in .csv.gz or .parquet.")
+    args = parser.parse_args()
+
+    rows = write_dataset(
+        args.output, n_products=args.products, start=args.start, end=args.end,
+        seed=args.seed, chunk_rows=args.chunk_rows
+    )
+    print('Written', args.output, 'with', rows, 'rows')
+    # Written alongside the data, so the apps never scan the history to list products
+    print('Catalog written to', catalog_path(args.output))
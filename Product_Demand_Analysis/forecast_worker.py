@@ -0,0 +1,107 @@
+# forecast_worker.py
+# Background precomputation of every product's forecast for the Streamlit app.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from predict import predict_for_products
+from src.data_processing import DATA_PATH
+from src.model import MODEL_PATH
+from src.product_matcher import ProductMatcher
+from src.registry import get_data, get_model
+
+class ForecastWorker:
+    """Loads data and model once on a background thread and precomputes forecasts.
+
+    A snapshot holds the `horizon`-day forecast and the last `history_days`
+    of history for every product, plus the product names and a name matcher
+    for the chatbot. Readers get the current snapshot without waiting, and
+    shorter horizons are prefix slices of the precomputed forecast.
+
+    When the model or data file changes, the snapshot is rebuilt in the
+    background while readers keep getting the previous one, so a long
+    recomputation never blocks other sessions. Forecasts also land in the
+    shared forecast cache, so predict_for_product calls made elsewhere in
+    the process are served from it.
+    """
+
+    def __init__(self, horizon=90, history_days=90, check_seconds=5.0):
+        self.horizon = horizon
+        self.history_days = history_days
+        self.check_seconds = check_seconds
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast-worker')
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._pending = None
+        self._checked_at = 0.0
+
+    def start(self):
+        self.refresh()
+        return self
+
+    @staticmethod
+    def signature():
+        return tuple(os.stat(path).st_mtime_ns for path in (MODEL_PATH, DATA_PATH))
+
+    def refresh(self):
+        """Schedule a rebuild unless one is already running; returns its future."""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = self._executor.submit(self._build)
+            return self._pending
+
+    def _build(self):
+        started = time.perf_counter()
+        signature = self.signature()
+        df = get_data()
+        get_model()
+        product_ids = sorted(df['product_id'].unique())
+        names = df[['product_id', 'product_name']].drop_duplicates('product_id')
+        tails = df.sort_values('date').groupby('product_id').tail(self.history_days)
+
+        product_names = dict(zip(names['product_id'], names['product_name']))
+
+        snapshot = {
+            'signature': signature,
+            'product_names': product_names,
+            'matcher': ProductMatcher(product_names),
+            'forecasts': predict_for_products(product_ids, self.horizon),
+            'history': {pid: g.reset_index(drop=True) for pid, g in tails.groupby('product_id')},
+            'built_at': time.time(),
+            'build_seconds': time.perf_counter() - started,
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def ready(self):
+        return self._snapshot is not None
+
+    def snapshot(self, timeout=None):
+        """The latest snapshot; waits only for the first build.
+
+        At most every `check_seconds`, a changed model or data file triggers
+        a background rebuild and the current snapshot is returned meanwhile.
+        """
+        current = self._snapshot
+        if current is None:
+            return self.refresh().result(timeout)
+
+        now = time.monotonic()
+        if now - self._checked_at > self.check_seconds:
+            self._checked_at = now
+            if self.signature() != current['signature']:
+                self.refresh()
+        return current
+
+    def forecast(self, product_id, days_ahead):
+        if days_ahead > self.horizon:
+            return predict_for_products([product_id], days_ahead)[product_id]
+        return self.snapshot()['forecasts'][product_id][:days_ahead]
+
+    def history(self, product_id):
+        return self.snapshot()['history'][product_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,148 +1,396 @@
-import pandas as pd
-import numpy as np
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from src.data_processing import load_data, create_lag_features, train_test_split_time_series
-from src.model import load_model
+from __future__ import annotations
+
+import argparse
+import time
+from src import memory_profile, telemetry
 from typing import Dict, Any, List
 
+# pandas, numpy and everything under src that pulls them in are imported in
+# the functions that use them, so `--help` and `import predict` stay fast.
+
 FULL_LAGS = [1, 7, 14, 28, 42, 60]
-START_DATE = pd.Timestamp("2022-01-01")
+HISTORY_WINDOW = 100
+START_DATE = "2022-01-01"
 
-def get_base_features(date: pd.Timestamp, product_id: str, avg_price: float) -> Dict[str, Any]:
-    dayofweek = date.weekday()
-    day_of_year = date.dayofyear
-    
-    try:
-        p_num = int(product_id[1:])
-    except:
-        p_num = 0
-    
+def get_base_feature_frame(dates: pd.DatetimeIndex, product_ids: List[str]) -> pd.DataFrame:
+    """Calendar and product features for each (date, product_id) pair, one row per pair."""
+    import numpy as np
+    import pandas as pd
+
+    dates = pd.DatetimeIndex(dates)
+    product_ids = pd.Series(product_ids, dtype=object)
+
+    p_num = pd.to_numeric(product_ids.str[1:], errors='coerce').fillna(0).astype(int).to_numpy()
     id_group = p_num % 2
-    days_elapsed = (date - START_DATE).days
-    
-    # Trend Interaction Calculation
-    trend_direction = 1 if id_group == 1 else -1
-    trend_sim = days_elapsed * trend_direction
+    days_elapsed = (dates - pd.Timestamp(START_DATE)).days.to_numpy()
+    trend_direction = np.where(id_group == 1, 1, -1)
+
+    month = dates.month.to_numpy()
+    day = dates.day.to_numpy()
+    dayofweek = dates.weekday.to_numpy()
+    day_of_year = dates.dayofyear.to_numpy()
 
-    row = {
-        'day': date.day,
-        'month': date.month,
+    return pd.DataFrame({
+        'day': day,
+        'month': month,
         'dayofweek': dayofweek,
-        'is_weekend': 1 if dayofweek >= 5 else 0,
-        
+        'is_weekend': (dayofweek >= 5).astype(int),
+
         'product_num': p_num,
         'id_group': id_group,
         'days_elapsed': days_elapsed,
-        
-        # New Interaction Feature
+
         'trend_direction': trend_direction,
-        'trend_sim': trend_sim,
-        
+        'trend_sim': days_elapsed * trend_direction,
+
         'day_of_year': day_of_year,
         'sin_annual': np.sin(2 * np.pi * day_of_year / 365.25),
         'cos_annual': np.cos(2 * np.pi * day_of_year / 365.25),
-        
-        'is_christmas': 1 if (date.month == 12 and date.day == 25) else 0,
-        'is_newyear': 1 if (date.month == 1 and date.day == 1) else 0,
-        'is_july4': 1 if (date.month == 7 and date.day == 4) else 0,
-        
-        'product_month_interaction': f"{product_id}_{date.month}",
-        
-        # Placeholder
+
+        'is_christmas': ((month == 12) & (day == 25)).astype(int),
+        'is_newyear': ((month == 1) & (day == 1)).astype(int),
+        'is_july4': ((month == 7) & (day == 4)).astype(int),
+
+        'product_month_interaction': product_ids.to_numpy() + '_' + month.astype(str).astype(object),
+
         'price_diff': 0.0,
         'price_ratio': 1.0
-    }
-    return row
+    })
 
 def predict_for_product(product_id: str, days_ahead: int = 7) -> List[Dict[str, Any]]:
-    model, features = load_model()
-    df = load_data()
-    avg_price = df[df['product_id'] == product_id]['price'].mean()
-    
-    df = df[df['product_id'] == product_id].copy()
-    df = df.sort_values('date')
-    history = df[['date', 'demand', 'price', 'promotion']].tail(100).copy() 
-    
-    preds = []
-    
-    for step in range(1, days_ahead + 1):
-        current_date = history['date'].max() + pd.Timedelta(days=1)
-        row = get_base_features(current_date, product_id, avg_price)
-        row['date'] = current_date
-        row['product_id'] = product_id
-        
-        last_known = history.iloc[-1]
-        row['price'] = last_known['price'] 
-        row['promotion'] = 0 
-        
-        # Update Price Features
-        row['price_diff'] = row['price'] - avg_price
-        row['price_ratio'] = row['price'] / avg_price
-
-        for lag in FULL_LAGS:
-            if lag <= len(history):
-                row[f'demand_lag_{lag}'] = history['demand'].iloc[-lag] 
-                row[f'price_lag_{lag}'] = history['price'].iloc[-lag]
-            else:
-                row[f'demand_lag_{lag}'] = history['demand'].mean() 
-                row[f'price_lag_{lag}'] = history['price'].mean()
-
-        shifted_demand = history['demand'] 
-        row['rolling_7_mean'] = shifted_demand.tail(7).mean() 
-        row['rolling_28_mean'] = shifted_demand.tail(28).mean()
-        row['rolling_7_std'] = shifted_demand.tail(7).std()
-        
-        X = pd.DataFrame([row])
-        X['product_id'] = X['product_id'].astype('category')
-        X['product_month_interaction'] = X['product_month_interaction'].astype('category')
-
-        # Ensure columns match
-        X = X[features]
-        pred = model.predict(X)[0]
-        pred_actual = max(0, round(pred, 0))
-        
-        # --- FIX: Added 'price' to the appended dictionary ---
-        preds.append({
-            'date': current_date.strftime('%Y-%m-%d'), 
-            'predicted_demand': float(pred_actual),
-            'price': float(row['price'])
-        })
-        
-        new_history_row = {
-            'date': current_date, 
-            'demand': pred_actual,
-            'price': row['price'], 
-            'promotion': row['promotion']
-        }
-        history = pd.concat([history, pd.DataFrame([new_history_row])], ignore_index=True, sort=False)
-        
+    return predict_for_products([product_id], days_ahead)[product_id]
+
+def predict_for_products(product_ids: List[str], days_ahead: int = 7,
+                         use_cache: bool = True, mode: str = 'recursive') -> Dict[str, List[Dict[str, Any]]]:
+    """Forecast for several products at once.
+
+    mode='recursive' steps all products forward together: each horizon step
+    builds one N-row feature matrix and makes a single model.predict call.
+    mode='direct' uses the per-bucket direct models (see forecast_direct),
+    one predict call per horizon bucket. Results are cached per (product,
+    last data date, model version); products whose cached forecast is at
+    least `days_ahead` long need no model calls.
+    """
+    with telemetry.span('predict_for_products', products=len(product_ids), days_ahead=days_ahead, mode=mode):
+        return _predict_for_products(product_ids, days_ahead, use_cache, mode)
+
+def _forecaster(mode):
+    """(forecast(df, product_ids, days_ahead), cache version prefix) for a forecasting mode."""
+    from src.direct import forecast_direct
+    from src.registry import get_direct_models, get_model
+
+    if mode == 'recursive':
+        model, features = get_model()
+        return (lambda df, pids, days: forecast_products(model, features, df, pids, days)), 'model'
+    if mode == 'direct':
+        artifact = get_direct_models()
+        return (lambda df, pids, days: forecast_direct(artifact, df, pids, days)), 'direct_models'
+    raise ValueError(f"Unknown forecast mode: {mode!r}")
+
+def _predict_for_products(product_ids, days_ahead, use_cache, mode='recursive'):
+    from src.forecast_cache import get_forecast_cache
+    from src.registry import REGISTRY, get_data, get_last_dates
+
+    forecast, registry_key = _forecaster(mode)
+    if not use_cache:
+        return forecast(get_data(), product_ids, days_ahead)
+
+    cache = get_forecast_cache()
+    model_version = f"{registry_key}-{REGISTRY.version(registry_key)}"
+    last_dates = get_last_dates()
+
+    preds, todo = {}, []
+    for pid in dict.fromkeys(product_ids):
+        cached = None
+        if pid in last_dates.index:
+            cached = cache.get(pid, last_dates[pid], model_version, days_ahead)
+        if cached is None:
+            todo.append(pid)
+        else:
+            preds[pid] = cached
+
+    telemetry.inc('forecast_cache_hits_total', len(preds))
+    telemetry.inc('forecast_cache_misses_total', len(todo))
+    if todo:
+        fresh = forecast(get_data(), todo, days_ahead)
+        cache.put_many([(pid, last_dates[pid], rows) for pid, rows in fresh.items()], model_version)
+        preds.update(fresh)
+
+    return {pid: preds[pid] for pid in dict.fromkeys(product_ids)}
+
+def forecast_products(model, features: List[str], df: pd.DataFrame,
+                      product_ids: List[str], days_ahead: int = 7) -> Dict[str, List[Dict[str, Any]]]:
+    import pandas as pd
+    from src.recursive_state import history_matrix
+
+    product_ids = list(dict.fromkeys(product_ids))
+    n = len(product_ids)
+    if n == 0:
+        return {}
+
+    df = df[df['product_id'].isin(product_ids)]
+    missing = [pid for pid in product_ids if pid not in set(df['product_id'].unique())]
+    if missing:
+        raise ValueError(f"Unknown product_id(s): {', '.join(missing)}")
+
+    # --- 1. Per-product state: average price and the last HISTORY_WINDOW days ---
+    avg_price = df.groupby('product_id')['price'].mean().reindex(product_ids).to_numpy()
+    demand, price, last_dates = history_matrix(df, product_ids, HISTORY_WINDOW)
+
+    pred_matrix = forecast_histories(model, features, product_ids, demand, price, last_dates, avg_price, days_ahead)
+
+    preds = {}
+    last_price = price[:, -1]
+    date_strs = [(last_dates + pd.Timedelta(days=step + 1)).strftime('%Y-%m-%d') for step in range(days_ahead)]
+    for i, pid in enumerate(product_ids):
+        preds[pid] = [{
+            'date': date_strs[step][i],
+            'predicted_demand': float(pred_matrix[i, step]),
+            'price': float(last_price[i])
+        } for step in range(days_ahead)]
+
     return preds
 
-def evaluate_model():
-    model, features = load_model()
-    df = load_data()
-    df = create_lag_features(df)
-    
-    train_df, test_df = train_test_split_time_series(df, test_size_days=90)
-    
-    X_test = test_df[features].copy() 
-    y_test = test_df['demand']
+def forecast_histories(model, features: List[str], series_ids: List[str], demand: np.ndarray, price: np.ndarray,
+                       last_dates: pd.DatetimeIndex, avg_price: np.ndarray, days_ahead: int = 7) -> np.ndarray:
+    """Recursive forecast core: (series x days_ahead) predictions from history matrices.
+
+    Row i is a history of product series_ids[i] ending at last_dates[i];
+    demand/price are right-aligned (see history_matrix). A product may
+    appear in several rows, e.g. one per backtest origin.
+    """
+    import numpy as np
+    import pandas as pd
+    from src.model import CATEGORICAL_FEATURES, category_codes
+    from src.recursive_state import RingBufferHistory
+
+    n = len(series_ids)
+    product_ids = list(series_ids)
+    last_price = price[:, -1].copy()
+    history = RingBufferHistory(demand, price, size=max(FULL_LAGS), windows=(7, 28))
+
+    # --- 2. Calendar features and categorical codes for the whole horizon, up front ---
+    step_dates = [last_dates + pd.Timedelta(days=step + 1) for step in range(days_ahead)]
+    base = get_base_feature_frame(pd.DatetimeIndex(np.concatenate(step_dates)), product_ids * days_ahead)
+
+    codes = category_codes(model, features)
+    for cat_col in CATEGORICAL_FEATURES:
+        if cat_col in features and cat_col not in codes:
+            raise ValueError(f"Model has no category mapping for '{cat_col}'")
+    base['product_month_interaction'] = base['product_month_interaction'].map(codes.get('product_month_interaction', {}))
+
+    static = {
+        'product_id': np.array([codes.get('product_id', {}).get(pid, np.nan) for pid in product_ids], dtype=float),
+        'price': last_price,
+        'promotion': np.zeros(n),
+        'price_diff': last_price - avg_price,
+        'price_ratio': last_price / avg_price,
+    }
+    lag_cols = [f'{name}_lag_{lag}' for lag in FULL_LAGS for name in ('demand', 'price')]
+    rolling = {'rolling_7_mean': ('mean', 7), 'rolling_28_mean': ('mean', 28), 'rolling_7_std': ('std', 7)}
+
+    base_cols = [f for f in features if f in base.columns and f not in static]
+    unknown = set(features) - set(static) - set(base_cols) - set(lag_cols) - set(rolling)
+    if unknown:
+        raise KeyError(f"Cannot build features for recursive forecast: {sorted(unknown)}")
+
+    col = {f: i for i, f in enumerate(features)}
+    base_idx = [col[f] for f in base_cols]
+    base_block = base[base_cols].to_numpy(dtype=float).reshape(days_ahead, n, len(base_cols))
+
+    # Preallocated feature matrix; the step loop only writes into it
+    X = np.full((n, len(features)), np.nan)
+    for name, values in static.items():
+        if name in col:
+            X[:, col[name]] = values
+    lag_demand = np.empty(n)
+    lag_price = np.empty(n)
+    pred_matrix = np.empty((n, days_ahead))
+
+    # --- 3. Recursive loop: one vectorized predict per horizon step ---
+    for step in range(days_ahead):
+        with telemetry.span('forecast_step', step=step, products=n):
+            _forecast_step(model, history, X, col, base_idx, base_block[step], rolling,
+                           lag_demand, lag_price, pred_matrix[:, step], last_price)
+    telemetry.inc('forecast_steps_total', days_ahead)
+    return pred_matrix
+
+def _forecast_step(model, history, X, col, base_idx, base_row, rolling,
+                   lag_demand, lag_price, pred, last_price):
+    """One recursive step: fill X from the history, predict, push the prediction."""
+    import numpy as np
+    from src.model import predict_matrix
+
+    X[:, base_idx] = base_row
+
+    for lag in FULL_LAGS:
+        history.lag(lag, lag_demand, lag_price)
+        if f'demand_lag_{lag}' in col:
+            X[:, col[f'demand_lag_{lag}']] = lag_demand
+        if f'price_lag_{lag}' in col:
+            X[:, col[f'price_lag_{lag}']] = lag_price
+
+    for name, (kind, window) in rolling.items():
+        if name in col:
+            if kind == 'mean':
+                history.rolling_mean(window, lag_demand)
+            else:
+                history.rolling_std(window, lag_demand)
+            X[:, col[name]] = lag_demand
+
+    np.maximum(0, predict_matrix(model, X), out=pred)
+    np.round(pred, 0, out=pred)
+    history.push(pred, last_price)
+
+@telemetry.traced('evaluate_model')
+def evaluate_model(streaming: bool = False, chunk_rows: int = None,
+                   model_path: str = None, data_path: str = None):
+    import numpy as np
+    # scikit-learn is slow to import and only this report needs it
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    from src.data_processing import create_lag_features, train_test_split_time_series
+    from src.registry import get_data, get_model
+
+    with memory_profile.stage('load_model'):
+        model, features = get_model(model_path)
+    if streaming:
+        with memory_profile.stage('evaluate_streaming'):
+            return evaluate_model_streaming(model, features, chunk_rows, data_path)
+
+    with memory_profile.stage('load_data'):
+        df = get_data(data_path)
+    with memory_profile.stage('create_lag_features'):
+        df = create_lag_features(df)
     
-    categorical_cols = ['product_id', 'product_month_interaction']
-    for col in categorical_cols:
-        X_test[col] = X_test[col].astype('category')
+    with memory_profile.stage('split_and_prepare'):
+        train_df, test_df = train_test_split_time_series(df, test_size_days=90)
+
+        X_test = test_df[features].copy()
+        y_test = test_df['demand']
+
+        categorical_cols = ['product_id', 'product_month_interaction']
+        for col in categorical_cols:
+            X_test[col] = X_test[col].astype('category')
     
-    y_pred = model.predict(X_test)
-    y_pred_actual = np.maximum(0, y_pred) 
+    with memory_profile.stage('predict'):
+        y_pred = model.predict(X_test)
+        y_pred_actual = np.maximum(0, y_pred) 
     
     mae = mean_absolute_error(y_test, y_pred_actual)
     rmse = np.sqrt(mean_squared_error(y_test, y_pred_actual))
     r2 = r2_score(y_test, y_pred_actual)
 
+    print_metrics(mae, rmse, r2)
+    return {'mae': float(mae), 'rmse': float(rmse), 'r2': float(r2)}
+
+def evaluate_model_streaming(model, features: List[str], chunk_rows: int = None,
+                             data_path: str = None) -> Dict[str, float]:
+    """evaluate_model over feature chunks, for histories that do not fit in memory."""
+    import numpy as np
+    import pandas as pd
+    from src.model import CATEGORICAL_FEATURES
+    from src.streaming import DEFAULT_CHUNK_ROWS, StreamingMetrics, scan_history, stream_lag_features
+
+    chunk_rows = chunk_rows or DEFAULT_CHUNK_ROWS
+    stats = scan_history(data_path, chunk_rows=chunk_rows)
+    split_date = stats['max_date'] - pd.Timedelta(days=90)
+    metrics = StreamingMetrics()
+
+    for feats in stream_lag_features(data_path, chunk_rows=chunk_rows, price_means=stats['price_means']):
+        test_df = feats[feats['date'] > split_date]
+        if test_df.empty:
+            continue
+
+        X_test = test_df[features].copy()
+        for col in CATEGORICAL_FEATURES:
+            if col in X_test.columns:
+                X_test[col] = X_test[col].astype('category')
+        metrics.update(test_df['demand'], np.maximum(0, model.predict(X_test)))
+
+    result = metrics.result()
+    print_metrics(result['mae'], result['rmse'], result['r2'])
+    return result
+
+def compare_forecast_modes(holdout_days: int = 90, data_path: str = None) -> Dict[str, Any]:
+    """Recursive vs direct forecasts from one origin, scored on the holdout.
+
+    Both forecasts start from `holdout_days` before the last data date and
+    see only the history up to it; errors are broken down by the direct
+    models' horizon buckets.
+    """
+    import numpy as np
+    import pandas as pd
+    from src.direct import forecast_direct
+    from src.registry import get_data, get_direct_models, get_model
+
+    df = get_data(data_path)
+    origin = df['date'].max() - pd.Timedelta(days=holdout_days)
+    history = df[df['date'] <= origin]
+    product_ids = sorted(history['product_id'].unique())
+    model, features = get_model()
+    artifact = get_direct_models()
+
+    trained_through = artifact['metadata'].get('trained_through')
+    if trained_through and pd.Timestamp(trained_through) > origin:
+        print(f"Warning: direct models were trained through {trained_through}, after the origin {origin.date()}")
+
+    actual = df[df['date'] > origin].pivot(index='product_id', columns='date', values='demand')
+    actual = actual.reindex(product_ids).to_numpy(dtype=float)
+
+    results = {}
+    for mode, forecast in [('recursive', lambda: forecast_products(model, features, history, product_ids, holdout_days)),
+                           ('direct', lambda: forecast_direct(artifact, history, product_ids, holdout_days))]:
+        start = time.perf_counter()
+        preds = forecast()
+        elapsed = time.perf_counter() - start
+        pred = np.array([[p['predicted_demand'] for p in preds[pid]] for pid in product_ids])
+        err = pred - actual
+
+        rows = {}
+        for lo, hi in artifact['buckets'] + [(1, holdout_days)]:
+            e = err[:, lo - 1:min(hi, holdout_days)]
+            e = e[~np.isnan(e)]
+            rows[f'{lo}-{hi}'] = {'mae': float(np.mean(np.abs(e))), 'rmse': float(np.sqrt(np.mean(e ** 2)))}
+        results[mode] = {'seconds': elapsed, 'horizons': rows}
+
+    print(f"\n--- Recursive vs Direct ({len(product_ids)} products, origin {origin.date()}) ---")
+    print(f"{'horizon':<9} {'recursive MAE':>14} {'RMSE':>8} {'direct MAE':>11} {'RMSE':>8}")
+    for name in results['recursive']['horizons']:
+        r, d = results['recursive']['horizons'][name], results['direct']['horizons'][name]
+        print(f"{name:<9} {r['mae']:14.2f} {r['rmse']:8.2f} {d['mae']:11.2f} {d['rmse']:8.2f}")
+    print(f"{'time (s)':<9} {results['recursive']['seconds']:14.3f} {'':>8} {results['direct']['seconds']:11.3f}")
+    return results
+
+def print_metrics(mae, rmse, r2):
     print(f"\n--- Evaluation for ALL Products ---")
     print(f"MAE: {round(mae, 2)}")
     print(f"RMSE: {round(rmse, 2)}")
     print(f"R²: {round(r2, 4)}")
 
 if __name__ == "__main__":
-    evaluate_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate the trained model on the 90-day hold-out.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Stream features chunk by chunk instead of loading the full history.")
+    parser.add_argument("--chunk-rows", type=int,
+                        help="Raw rows per chunk in streaming mode (default: 500000).")
+    parser.add_argument("--compare-direct", action="store_true",
+                        help="Compare recursive and direct (per-horizon-bucket) forecasts on the hold-out.")
+    parser.add_argument("--trace", action="store_true",
+                        help="Log timing spans and print a metrics snapshot (Prometheus text) at the end.")
+    parser.add_argument("--metrics-out", help="Write the metrics snapshot here (.prom for text, else JSON).")
+    memory_profile.add_cli_args(parser)
+    args = parser.parse_args()
+
+    if args.trace or args.metrics_out:
+        telemetry.enable(log_spans=args.trace)
+
+    with memory_profile.profile_from_args(args):
+        if args.compare_direct:
+            compare_forecast_modes()
+        else:
+            evaluate_model(streaming=args.streaming, chunk_rows=args.chunk_rows)
+
+    if args.metrics_out:
+        telemetry.write_snapshot(args.metrics_out)
+    elif args.trace:
+        print(telemetry.prometheus_text())
@@ -0,0 +1,293 @@
+# serve.py
+# Local HTTP service for forecasts and evaluation (standard library only).
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from predict import evaluate_model, predict_for_products
+from src import telemetry
+from src.forecast_cache import get_forecast_cache
+from src.registry import get_last_dates, get_model, registry_stats
+
+MAX_DAYS_AHEAD = 365
+MAX_BODY_BYTES = 1 << 20
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# --- 1. Micro-batching of forecast requests ---
+
+class ForecastBatcher:
+    """Collects concurrent forecast requests into one predict_for_products call.
+
+    The first request of a batch waits at most `window` seconds for others to
+    join (or until `max_batch` requests are queued). The batch is forecast at
+    its longest horizon, and each caller gets a prefix slice of the result,
+    which is exactly what a request for fewer days would return. The model
+    runs on `executor` so the event loop keeps accepting connections;
+    requests arriving meanwhile form the next batch.
+    """
+
+    def __init__(self, executor, window=0.005, max_batch=256):
+        self.executor = executor
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, product_ids, days_ahead):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((product_ids, days_ahead, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            product_ids = list(dict.fromkeys(pid for pids, _, _ in batch for pid in pids))
+            days_ahead = max(days for _, days, _ in batch)
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                preds = await loop.run_in_executor(self.executor, _forecast, product_ids, days_ahead)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for pids, days, future in batch:
+                if not future.done():
+                    future.set_result({pid: preds[pid][:days] for pid in pids})
+
+def _forecast(product_ids, days_ahead):
+    return predict_for_products(product_ids, days_ahead)
+
+def _evaluate(streaming):
+    return evaluate_model(streaming=streaming)
+
+# --- 2. Request handling ---
+
+class ForecastService:
+    """Routes HTTP requests: /health, /forecast, /evaluate, /stats and /metrics."""
+
+    def __init__(self, window=0.005, max_batch=256):
+        # One worker: batches run back to back, LightGBM threads internally
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast')
+        self.eval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='evaluate')
+        self.batcher = ForecastBatcher(self.executor, window=window, max_batch=max_batch)
+        self._evaluations = {}  # in-flight evaluation per streaming flag, shared by concurrent callers
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # Load model and history before accepting traffic
+        await loop.run_in_executor(self.executor, get_model)
+        await loop.run_in_executor(self.executor, get_last_dates)
+        self.batcher.start()
+
+    async def close(self):
+        await self.batcher.stop()
+        self.executor.shutdown(wait=False)
+        self.eval_executor.shutdown(wait=False)
+
+    async def handle(self, method, target, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == '/health':
+            return {'status': 'ok'}
+        if url.path == '/forecast':
+            if method == 'POST':
+                try:
+                    payload = json.loads(body or b'{}')
+                except ValueError:
+                    raise HTTPError(400, "Body must be JSON")
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, "Body must be a JSON object")
+                product_ids = payload.get('product_ids')
+                if product_ids is not None and not isinstance(product_ids, list):
+                    raise HTTPError(400, 'product_ids must be a JSON list, e.g. {"product_ids": ["P001"]}')
+                product_ids = product_ids or [payload.get('product_id')]
+                days = payload.get('days', 7)
+            elif method == 'GET':
+                product_ids = [pid for pid in query.get('product_id', '').split(',') if pid]
+                days = query.get('days', 7)
+            else:
+                raise HTTPError(405, "Use GET or POST")
+            return await self.forecast(product_ids, days)
+        if url.path == '/evaluate':
+            if method not in ('GET', 'POST'):
+                raise HTTPError(405, "Use GET or POST")
+            return await self.evaluate(query.get('streaming', '').lower() in ('1', 'true', 'yes'))
+        if url.path == '/stats':
+            return {
+                'batches': self.batcher.batches,
+                'forecast_requests': self.batcher.requests,
+                'forecast_cache': get_forecast_cache().stats(),
+                'registry': registry_stats(),
+            }
+        if url.path == '/metrics':
+            # Prometheus text by default, the JSON snapshot with ?format=json
+            return telemetry.snapshot() if query.get('format') == 'json' else telemetry.prometheus_text()
+        raise HTTPError(404, f"No route for {url.path}")
+
+    async def forecast(self, product_ids, days):
+        try:
+            days = int(days)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "days must be an integer")
+        if not 1 <= days <= MAX_DAYS_AHEAD:
+            raise HTTPError(400, f"days must be between 1 and {MAX_DAYS_AHEAD}")
+        if not product_ids or not all(isinstance(pid, str) and pid for pid in product_ids):
+            raise HTTPError(400, "product_id(s) required")
+
+        # Reject unknown IDs up front so one bad request cannot fail a whole batch.
+        # get_last_dates reloads the history when the data file changes, so it
+        # runs off the event loop
+        loop = asyncio.get_running_loop()
+        known = (await loop.run_in_executor(None, get_last_dates)).index
+        unknown = [pid for pid in product_ids if pid not in known]
+        if unknown:
+            raise HTTPError(404, f"Unknown product_id(s): {', '.join(unknown)}")
+
+        preds = await self.batcher.submit(list(dict.fromkeys(product_ids)), days)
+        return {'days': days, 'forecasts': preds}
+
+    async def evaluate(self, streaming=False):
+        evaluation = self._evaluations.get(streaming)
+        if evaluation is None or evaluation.done():
+            loop = asyncio.get_running_loop()
+            evaluation = self._evaluations[streaming] = loop.run_in_executor(self.eval_executor, _evaluate, streaming)
+        return await asyncio.shield(evaluation)
+
+# --- 3. Minimal HTTP/1.1 server on asyncio streams ---
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length') or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b''
+    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return method.upper(), target, body, keep_alive
+
+def _response(status, payload, keep_alive):
+    if isinstance(payload, str):
+        body, content_type = payload.encode(), 'text/plain; version=0.0.4'
+    else:
+        body, content_type = json.dumps(payload).encode(), 'application/json'
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode() + body
+
+async def serve(host='127.0.0.1', port=8000, window=0.005, max_batch=256):
+    service = ForecastService(window=window, max_batch=max_batch)
+    await service.start()
+
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await _read_request(reader)
+                    if request is None:
+                        break
+                    method, target, body, keep_alive = request
+                    start = time.perf_counter()
+                    payload = await service.handle(method, target, body)
+                    status = 200
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    status, payload = 500, {'error': f"{type(e).__name__}: {e}"}
+                else:
+                    telemetry.observe('http_request_seconds', time.perf_counter() - start, path=urlsplit(target).path)
+                    if isinstance(payload, dict):
+                        payload = dict(payload, elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_connection, host, port, backlog=1024)
+    print(f"Serving forecasts on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve demand forecasts over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="How long the first request of a batch waits for others to join.")
+    parser.add_argument("--max-batch", type=int, default=256, help="Maximum requests per model batch.")
+    parser.add_argument("--trace", action="store_true",
+                        help="Record spans and metrics (exposed on /metrics) and log top-level spans.")
+    args = parser.parse_args()
+
+    if args.trace:
+        telemetry.enable()
+
+    try:
+        asyncio.run(serve(args.host, args.port, window=args.batch_window_ms / 1000, max_batch=args.max_batch))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,63 @@
+import json
+import os
+
+# Dataset locations and the product catalog sidecar: a small JSON index next
+# to the dataset (see src.data_processing.build_catalog), so listing products
+# never touches the demand history. Standard library only, so the command
+# line tools can list products without importing pandas.
+
+# Robust path finding: looks for data folder relative to this script
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'sample_product_demand.csv.gz')
+
+CATALOG_VERSION = 2
+
+def _dataset_base(path):
+    return path[:-len('.csv.gz')] if path.endswith('.csv.gz') else os.path.splitext(path)[0]
+
+def columnar_cache_path(path):
+    return _dataset_base(path) + '.parquet'
+
+def catalog_path(path):
+    return _dataset_base(path) + '.catalog.json'
+
+def _catalog_is_fresh(catalog, path):
+    st = os.stat(path)
+    return (catalog.get('version') == CATALOG_VERSION
+            and (catalog.get('source_mtime_ns'), catalog.get('source_size')) == (st.st_mtime_ns, st.st_size))
+
+def load_catalog(path=None):
+    """The catalog for the dataset at `path` (see build_catalog).
+
+    Reading it costs one stat of the dataset and parsing a file with one
+    entry per product, however much history there is. A missing or stale
+    catalog (the dataset changed since it was written) is rebuilt first.
+    """
+    path = path or DATA_PATH
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Could not find data file at: {path}")
+
+    try:
+        with open(catalog_path(path)) as f:
+            catalog = json.load(f)
+        if _catalog_is_fresh(catalog, path):
+            return catalog
+    except (OSError, ValueError):
+        pass
+
+    # Stale or missing: only now is pandas needed
+    from src import telemetry
+    from src.data_processing import (HAS_PYARROW, _cache_is_fresh, build_catalog, build_columnar_cache,
+                                     load_data)
+
+    with telemetry.span('build_catalog'):
+        if HAS_PYARROW and not _cache_is_fresh(path, columnar_cache_path(path)):
+            # Rebuilding the columnar cache writes the catalog as well
+            build_columnar_cache(path)
+            with open(catalog_path(path)) as f:
+                return json.load(f)
+        return build_catalog(load_data(path, columns=['product_id', 'product_name', 'date']), path)
+
+def catalog_product_names(path=None):
+    """{product_id: product_name} from the catalog."""
+    return {p['product_id']: p['product_name'] for p in load_catalog(path)['products']}
@@ -0,0 +1,95 @@
+import re
+from collections import namedtuple
+
+from src.product_matcher import normalize
+
+# product_ids: products to forecast (in mention order for lists)
+# scope: 'single', 'list' or 'all'
+# rank: None, 'top' or 'bottom'; top_n: how many products a ranking shows
+ChatQuery = namedtuple('ChatQuery', ['product_ids', 'days', 'scope', 'rank', 'top_n'])
+
+MAX_DAYS = 90
+DEFAULT_TOP_N = 5
+
+_DAYS = re.compile(r'(\d+)\s*(day|week|month)')
+_NEXT_UNIT = re.compile(r'\b(?:next|a|one|this|the)\s+(?:(?:whole|entire|full)\s+)?(day|week|month)\b')
+_UNIT_DAYS = {'day': 1, 'week': 7, 'month': 30}
+# Only explicit phrasing widens a request: "all products", "every product",
+# "everything", "the catalog"; "the whole month" or "each day" does not
+_ALL = re.compile(r'\b(?:all|every)\s+(?:the\s+)?(?:products?|items?|skus?)\b|\beverything\b|\bcatalog(?:ue)?\b')
+# A ranking needs a count or "products": "top 5", "best products", not "most likely"
+_TOP = re.compile(r'\b(?:top|best|highest)\s+(?:(\d+)|products?\b)')
+_BOTTOM = re.compile(r'\b(?:bottom|worst|lowest)\s+(?:(\d+)|products?\b)')
+
+def parse_days(query, default=7):
+    """Forecast horizon from "10 days", "3 weeks", "next month", "the whole month"...; capped at MAX_DAYS."""
+    query = query.lower()
+    m = _DAYS.search(query)
+    if m:
+        days = int(m.group(1)) * _UNIT_DAYS[m.group(2)]
+    else:
+        m = _NEXT_UNIT.search(query)
+        days = _UNIT_DAYS[m.group(1)] if m else default
+    return max(1, min(days, MAX_DAYS))
+
+def parse_query(query, matcher, default_days=7):
+    """A ChatQuery for a single product, a list of products, all of them or a ranking.
+
+    Every product mentioned by name or ID is taken (exact matches, in the
+    order they appear); the fuzzy fallback only ever supplies one product.
+    "all products"/"every product"/"everything" widens the request to the
+    whole catalog, and "top N"/"bottom N" (or "top products") ranks the
+    selection. A query naming exactly one product is always about that
+    product. Returns None when no product can be identified.
+    """
+    text = query.lower()
+    days = parse_days(text, default_days)
+
+    rank, top_n = None, None
+    for name, pattern in (('top', _TOP), ('bottom', _BOTTOM)):
+        m = pattern.search(text)
+        if m:
+            rank, top_n = name, int(m.group(1)) if m.group(1) else DEFAULT_TOP_N
+            break
+
+    mentioned = [m.product_id for m in sorted(matcher.exact(text), key=lambda m: m.start)]
+    if len(mentioned) > 1:
+        return ChatQuery(mentioned, days, 'list', rank, top_n)
+    if not mentioned and (rank or _ALL.search(text)):
+        return ChatQuery(list(matcher.names), days, 'all', rank, top_n)
+
+    pid = mentioned[0] if mentioned else matcher.best(text)
+    if pid is None and len(matcher) == 1:
+        pid = next(iter(matcher.names))
+    if pid is None:
+        return None
+    return ChatQuery([pid], days, 'single', None, None)
+
+def display_name(name):
+    """"Chai_Latte_Mix" -> "Chai Latte Mix"."""
+    return normalize(name).title()
+
+def summarize(forecasts, rank=None, top_n=None):
+    """Totals, ranking and daily breakdown of a batch of forecasts.
+
+    forecasts: {product_id: [{'date', 'predicted_demand'}, ...]} as returned
+    by predict_for_products. The ranking is by total demand, highest first
+    (lowest first for rank='bottom') and cut to `top_n` when ranking; the
+    daily breakdown sums the ranked products per date.
+    """
+    totals = {pid: float(sum(f['predicted_demand'] for f in rows)) for pid, rows in forecasts.items()}
+    ranking = sorted(totals.items(), key=lambda kv: (kv[1], kv[0]) if rank == 'bottom' else (-kv[1], kv[0]))
+    if rank and top_n:
+        ranking = ranking[:top_n]
+
+    daily = {}
+    for pid, _ in ranking:
+        for row in forecasts[pid]:
+            daily[row['date']] = daily.get(row['date'], 0.0) + float(row['predicted_demand'])
+
+    return {
+        'products': len(ranking),
+        'total': sum(total for _, total in ranking),
+        'ranking': ranking,
+        'daily': sorted(daily.items()),
+    }
@@ -1,70 +1,440 @@
 import pandas as pd
 import numpy as np
+import json
 import os
 
-def load_data(path=None):
+from src import telemetry
+from src.catalog import (CATALOG_VERSION, DATA_PATH, PROJECT_ROOT, catalog_path,  # noqa: F401 -- re-exported
+                         catalog_product_names, columnar_cache_path, load_catalog)
+
+CACHE_ROW_GROUP_SIZE = 50_000
+
+try:
+    import pyarrow  # noqa: F401 -- enables the columnar (Parquet) cache
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+def build_columnar_cache(path=None, cache_path=None):
+    """Parse the CSV once and write it as a Parquet file sorted by (product_id, date).
+
+    Sorting keeps each product in a narrow band of row groups, so product and
+    date filters can skip most of the file using row-group statistics.
+    """
+    path = path or DATA_PATH
+    cache_path = cache_path or columnar_cache_path(path)
+
+    df = pd.read_csv(path, parse_dates=['date'])
+    df = df.sort_values(['product_id', 'date'], ignore_index=True)
+
+    tmp_path = cache_path + '.tmp'
+    df.to_parquet(tmp_path, index=False, row_group_size=CACHE_ROW_GROUP_SIZE)
+    os.replace(tmp_path, cache_path)
+    build_catalog(df, path)
+    return cache_path
+
+def _cache_is_fresh(path, cache_path):
+    return os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path)
+
+def sort_history(df):
+    """`df` in (product_id, date) order, keeping the order of ties."""
+    return df.sort_values(['product_id', 'date'], kind='stable')
+
+@telemetry.traced('load_data')
+def load_data(path=None, columns=None, product_ids=None, start_date=None, end_date=None,
+              use_cache=True, compact=False):
+    """Load demand history sorted by (product_id, date).
+
+    On first use the CSV is converted to a columnar Parquet cache next to it;
+    later reads are memory-mapped from the cache and only touch the requested
+    columns and the row groups matching the product/date filters.
+    compact=True returns the compact dtypes described in compact_dtypes.
+    """
     if path is None:
-        # Robust path finding: looks for data folder relative to this script
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        path = os.path.join(project_root, 'data', 'sample_product_demand.csv.gz')
+        path = DATA_PATH
 
     if not os.path.exists(path):
         raise FileNotFoundError(f"Could not find data file at: {path}")
 
-    df = pd.read_csv(path, parse_dates=['date'])
-    df = df.sort_values(['product_id', 'date'])
-    return df
+    if isinstance(product_ids, str):
+        product_ids = [product_ids]
+    start_date = pd.Timestamp(start_date) if start_date is not None else None
+    end_date = pd.Timestamp(end_date) if end_date is not None else None
+
+    if use_cache and HAS_PYARROW:
+        cache_path = columnar_cache_path(path)
+        if not _cache_is_fresh(path, cache_path):
+            with telemetry.span('build_columnar_cache'):
+                build_columnar_cache(path, cache_path)
+
+        filters = []
+        if product_ids is not None:
+            filters.append(('product_id', 'in', list(product_ids)))
+        if start_date is not None:
+            filters.append(('date', '>=', start_date))
+        if end_date is not None:
+            filters.append(('date', '<=', end_date))
+
+        read_cols = columns
+        if cache_path == path and columns is not None:
+            read_cols = list(dict.fromkeys(list(columns) + ['product_id', 'date']))
+        df = pd.read_parquet(cache_path, columns=read_cols, filters=filters or None, memory_map=True)
+        if cache_path == path:
+            # A Parquet dataset is read as is, in whatever order it was written
+            df = sort_history(df)
+            if columns is not None:
+                df = df[list(columns)]
+        df = df.reset_index(drop=True)
+        telemetry.inc('data_rows_loaded_total', len(df), source='parquet')
+        return compact_dtypes(df) if compact else df
+
+    # Fallback: parse the CSV directly
+    usecols = None
+    if columns is not None:
+        usecols = list(dict.fromkeys(list(columns) + ['product_id', 'date']))
+    df = pd.read_csv(path, parse_dates=['date'], usecols=usecols)
+    if product_ids is not None:
+        df = df[df['product_id'].isin(product_ids)]
+    if start_date is not None:
+        df = df[df['date'] >= start_date]
+    if end_date is not None:
+        df = df[df['date'] <= end_date]
+    df = sort_history(df)
+    if columns is not None:
+        df = df[list(columns)]
+    telemetry.inc('data_rows_loaded_total', len(df), source='csv')
+    return compact_dtypes(df) if compact else df
+
+# --- Catalog sidecar ---
+# Written whenever the columnar cache is (re)built; read by src.catalog,
+# which rebuilds it on demand when the source file changes.
+
+def product_stats(df, stats=None):
+    """Per-product name, first/last date and row count of `df`, merged into `stats`.
+
+    Rows may come in any order and in chunks: pass the previous result as
+    `stats` to fold in the next chunk, which keeps memory at one row per
+    product however long the history is.
+    """
+    chunk = df.groupby('product_id', observed=True, sort=False).agg(
+        product_name=('product_name', 'first'), first_date=('date', 'min'),
+        last_date=('date', 'max'), rows=('date', 'size'),
+    )
+    chunk.index = chunk.index.astype(str)
+    chunk['product_name'] = chunk['product_name'].astype(str)
+    if stats is None:
+        return chunk.sort_index()
+    return pd.concat([stats, chunk]).groupby(level=0, sort=True).agg(
+        {'product_name': 'first', 'first_date': 'min', 'last_date': 'max', 'rows': 'sum'}
+    )
+
+def build_catalog(df, path=None):
+    """Write the catalog for `df`, the dataset at `path` (see write_catalog)."""
+    return write_catalog(product_stats(df), path)
+
+def write_catalog(stats, path=None):
+    """Write the catalog of the dataset at `path` from its product_stats.
+
+    One entry per product: name, first/last date, row count and the
+    [row_start, row_end) offsets of its block in the (product_id, date)
+    order load_data returns, which are also its rows in the Parquet cache;
+    `row_groups` is the first and last cache row group holding them, or
+    None when the dataset is itself a Parquet file (its row groups are in
+    written order).
+    """
+    path = path or DATA_PATH
+    in_cache = columnar_cache_path(path) != path
+    stats = stats.sort_index()
+
+    first = stats['first_date'].dt.strftime('%Y-%m-%d')
+    last = stats['last_date'].dt.strftime('%Y-%m-%d')
+    # Products are contiguous in that order, so offsets follow from the counts
+    end = np.cumsum(stats['rows'].to_numpy())
+    start = end - stats['rows'].to_numpy()
+    products = [
+        {'product_id': pid, 'product_name': name, 'first_date': f, 'last_date': l, 'rows': int(n),
+         'row_start': int(a), 'row_end': int(b),
+         'row_groups': ([int(a) // CACHE_ROW_GROUP_SIZE, (int(b) - 1) // CACHE_ROW_GROUP_SIZE]
+                        if in_cache else None)}
+        for pid, name, f, l, n, a, b in zip(stats.index, stats['product_name'], first, last,
+                                            stats['rows'], start, end)
+    ]
+
+    st = os.stat(path)
+    catalog = {
+        'version': CATALOG_VERSION,
+        'source': os.path.basename(path),
+        'source_mtime_ns': st.st_mtime_ns,
+        'source_size': st.st_size,
+        'rows': int(end[-1]) if len(end) else 0,
+        'row_group_size': CACHE_ROW_GROUP_SIZE,
+        'products': products,
+    }
+    out_path = catalog_path(path)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(catalog, f, separators=(',', ':'))
+    os.replace(tmp_path, out_path)
+    return catalog
+
+# --- Compact dtype mode ---
+# Categorical keys, small ints for calendar flags and float32 for everything
+# else. Small ints (<= int16) and float32 together keep a float32 feature
+# matrix when it is handed to LightGBM.
+COMPACT_DTYPES = {
+    'product_id': 'category',
+    'product_name': 'category',
+    'product_month_interaction': 'category',
+    'promotion': 'int8',
+    'id_group': 'int8',
+    'is_christmas': 'int8',
+    'is_newyear': 'int8',
+    'is_july4': 'int8',
+    'is_weekend': 'int8',
+    'dayofweek': 'int8',
+    'month': 'int8',
+    'day_of_year': 'int16',
+    'days_elapsed': 'int16',
+    'product_num': 'float32',
+    'demand': 'int32',
+}
+
+def compact_dtype(name, dtype):
+    """Compact dtype for a column, or None to leave it as is."""
+    if name in COMPACT_DTYPES:
+        return COMPACT_DTYPES[name]
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float32'
+    return None
+
+def compact_dtypes(df):
+    """Return df with the compact dtypes applied (columns not listed are left alone)."""
+    dtypes = {}
+    for name, dtype in df.dtypes.items():
+        target = compact_dtype(name, dtype)
+        if target is not None and str(dtype) != target:
+            dtypes[name] = target
+    return df.astype(dtypes) if dtypes else df
+
+def memory_report(df):
+    """Bytes used by df and by the same data in default dtypes (int64/float64/str)."""
+    used = int(df.memory_usage(deep=True, index=False).sum())
+    default = 0
+    for name in df.columns:
+        col = df[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # Arrow-backed strings: UTF-8 bytes plus a 4-byte offset per row
+            sizes = np.array([len(str(c).encode()) for c in col.cat.categories] + [0]) + 4
+            default += int(sizes[col.cat.codes.to_numpy()].sum())
+        elif pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+            default += 8 * len(col)
+        else:
+            default += int(col.memory_usage(deep=True, index=False))
+    return {
+        'bytes': used,
+        'default_bytes': default,
+        'saved_pct': 100.0 * (1 - used / default) if default else 0.0,
+    }
+
+def format_memory_report(report, label='frame'):
+    return (f"{label}: {report['bytes'] / 1e6:.1f} MB "
+            f"(default dtypes: {report['default_bytes'] / 1e6:.1f} MB, {report['saved_pct']:.1f}% saved)")
+
+ROLLING_FEATURES = [
+    ('rolling_7_mean', 'mean', 7),
+    ('rolling_28_mean', 'mean', 28),
+    ('rolling_7_std', 'std', 7),
+]
+
+def product_blocks(codes, n_products):
+    """Position of each row inside its product block.
+
+    `codes` are integer product codes (e.g. from pd.factorize). Returns
+    (pos, perm). If rows of a product are not contiguous, perm is the stable
+    permutation that makes them so (row order within a product is kept) and
+    pos refers to the permuted order; otherwise perm is None.
+    """
+    n = len(codes)
+    perm = None
+    if n and np.count_nonzero(codes[1:] != codes[:-1]) != n_products - 1:
+        perm = np.argsort(codes, kind='stable')
+        codes = codes[perm]
+
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.array([], dtype=int)
+    lengths = np.diff(np.r_[starts, n])
+    pos = np.arange(n) - np.repeat(starts, lengths)
+    return pos, perm
+
+def grouped_shift(values, pos, lag):
+    """Shift values by `lag` rows within product-contiguous blocks (NaN at block starts)."""
+    out = np.full(len(values), np.nan)
+    if lag < len(values):
+        out[lag:] = values[:len(values) - lag]
+    out[pos < lag] = np.nan
+    return out
+
+def grouped_rolling(values, pos, window, stat='mean', shift=1):
+    """Rolling mean or sample std over the `window` values ending `shift` rows back.
+
+    Uses cumulative sums, so the cost is O(rows) for any window. Rows whose
+    window would reach past the start of their block, or holds a NaN, are
+    NaN (as with pandas rolling); a NaN does not affect any other window.
+    """
+    n = len(values)
+    out = np.full(n, np.nan)
+    first = window + shift - 1  # first row whose window fits in the array
+    if first >= n:
+        return out
+
+    # Window for row i covers values[i - shift - window + 1 : i - shift + 1].
+    # NaNs are summed as 0 and counted separately, so they only void their
+    # own windows instead of every later cumsum difference.
+    missing = np.isnan(values)
+    values = np.where(missing, 0.0, values)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    cnan = np.concatenate(([0], np.cumsum(missing)))
+    hi = slice(first - shift + 1, n - shift + 1)
+    lo = slice(first - shift + 1 - window, n - shift + 1 - window)
+    s1 = csum[hi] - csum[lo]
+
+    if stat == 'mean':
+        np.divide(s1, window, out=out[first:])
+    elif stat == 'std':
+        csq = np.concatenate(([0.0], np.cumsum(values * values)))
+        var = window * (csq[hi] - csq[lo]) - s1 * s1
+        np.maximum(var, 0.0, out=var)
+        var /= window * (window - 1)
+        np.sqrt(var, out=out[first:])
+    else:
+        raise ValueError(f"Unknown rolling stat: {stat}")
+
+    out[first:][cnan[hi] - cnan[lo] > 0] = np.nan
+    out[pos < first] = np.nan
+    return out
+
+def create_lag_features_reference(df, lags=[1, 7, 14, 28, 42, 60]):
+    """Lag and rolling columns via plain per-product pandas ops.
+
+    Slow but obviously correct; used to check the grouped kernel in
+    create_lag_features. Returns only the lag/rolling columns.
+    """
+    out = pd.DataFrame(index=df.index)
+    grouped = df.groupby('product_id', sort=False)
+    for lag in lags:
+        out[f'demand_lag_{lag}'] = grouped['demand'].shift(lag)
+        out[f'price_lag_{lag}'] = grouped['price'].shift(lag)
+
+    shifted = grouped['demand'].shift(1).groupby(df['product_id'], sort=False)
+    for name, stat, window in ROLLING_FEATURES:
+        out[name] = shifted.transform(lambda s: getattr(s.rolling(window=window), stat)())
+    return out
+
+@telemetry.traced('create_lag_features')
+def create_lag_features(df, lags=[1, 7, 14, 28, 42, 60], price_means=None, compact=False):
+    # price_means: optional {product_id: mean price}. Streaming callers pass the
+    # full-history means so price_ratio does not depend on the chunk boundaries.
+    # compact: emit the compact dtypes (see compact_dtypes) column by column.
+    #
+    # Features are built as NumPy columns and joined to the input once at the
+    # end, after the NaN rows are dropped, instead of copying and growing df.
+    feats = {}
+    # Per-product work is done once per unique product and broadcast via codes
+    codes, product_uniques = pd.factorize(df['product_id'])
 
-def create_lag_features(df, lags=[1, 7, 14, 28, 42, 60]):
-    df = df.copy()
-    
     # --- 1. Label Encoding / Product Grouping ---
     # Extract the integer from "P005" -> 5. 
     # This helps the model learn trends based on ID numbers (Odd vs Even).
-    df['product_num'] = df['product_id'].str.extract('(\d+)').astype(int)
-    df['id_group'] = df['product_num'] % 2  # 1 for Odd (Growth), 0 for Even (Decline)
+    product_nums = pd.Series(product_uniques).str.extract(r'(\d+)')[0].astype(int).to_numpy()
+    feats['product_num'] = product_nums[codes]
+    feats['id_group'] = feats['product_num'] % 2  # 1 for Odd (Growth), 0 for Even (Decline)
+
+    # Calendar fields are computed once per unique date and broadcast via codes
+    date_codes, dates = pd.factorize(df['date'])
+    dates = pd.DatetimeIndex(dates)
+    month = dates.month.to_numpy()[date_codes]
+    day = dates.day.to_numpy()[date_codes]
 
     # --- 2. Authentic Holiday Flags ---
     # We flag the specific days, allowing the model to learn the multiplier itself.
-    df['is_christmas'] = ((df['date'].dt.month == 12) & (df['date'].dt.day == 25)).astype(int)
-    df['is_newyear'] = ((df['date'].dt.month == 1) & (df['date'].dt.day == 1)).astype(int)
-    df['is_july4'] = ((df['date'].dt.month == 7) & (df['date'].dt.day == 4)).astype(int)
+    feats['is_christmas'] = ((month == 12) & (day == 25)).astype(int)
+    feats['is_newyear'] = ((month == 1) & (day == 1)).astype(int)
+    feats['is_july4'] = ((month == 7) & (day == 4)).astype(int)
 
     # --- 3. Relative Price Feature ---
     # Calculates if the current price is a "deal" compared to the product's average.
-    avg_price = df.groupby('product_id')['price'].transform('mean')
-    df['price_ratio'] = df['price'] / avg_price
+    price = df['price'].to_numpy(dtype=float)
+    if price_means is not None:
+        avg_price = pd.Series(price_means).reindex(product_uniques).to_numpy(dtype=float)
+    else:
+        known = ~np.isnan(price)
+        price_sum = np.bincount(codes, weights=np.where(known, price, 0.0), minlength=len(product_uniques))
+        price_count = np.bincount(codes, weights=known, minlength=len(product_uniques))
+        avg_price = price_sum / price_count
+    feats['price_ratio'] = price / avg_price[codes]
 
     # --- 4. Trend & Seasonality ---
     start_date = pd.Timestamp("2022-01-01")
-    df['days_elapsed'] = (df['date'] - start_date).dt.days 
-    
-    df['day_of_year'] = df['date'].dt.dayofyear
+    feats['days_elapsed'] = (dates - start_date).days.to_numpy()[date_codes]
+
+    day_of_year = dates.dayofyear.to_numpy()
+    feats['day_of_year'] = day_of_year[date_codes]
     # Fourier terms for smooth seasonality
-    df['sin_annual'] = np.sin(2 * np.pi * df['day_of_year'] / 365.25)
-    df['cos_annual'] = np.cos(2 * np.pi * df['day_of_year'] / 365.25)
+    feats['sin_annual'] = np.sin(2 * np.pi * day_of_year / 365.25)[date_codes]
+    feats['cos_annual'] = np.cos(2 * np.pi * day_of_year / 365.25)[date_codes]
 
     # --- 5. Lags & Rolling ---
+    # Computed on product-contiguous blocks so nothing leaks across products.
+    pos, perm = product_blocks(codes, len(product_uniques))
+    demand = df['demand'].to_numpy(dtype=float)
+    if perm is not None:
+        demand, price = demand[perm], price[perm]
+
+    def unsort(values):
+        if perm is None:
+            return values
+        out = np.empty_like(values)
+        out[perm] = values
+        return out
+
     for lag in lags:
-        df[f'demand_lag_{lag}'] = df.groupby('product_id')['demand'].shift(lag)
-        df[f'price_lag_{lag}'] = df.groupby('product_id')['price'].shift(lag)
-    
-    demand_shifted = df.groupby('product_id')['demand'].shift(1)
-    df['rolling_7_mean'] = demand_shifted.rolling(window=7).mean()
-    df['rolling_28_mean'] = demand_shifted.rolling(window=28).mean()
-    df['rolling_7_std'] = demand_shifted.rolling(window=7).std()
-    
+        feats[f'demand_lag_{lag}'] = unsort(grouped_shift(demand, pos, lag))
+        feats[f'price_lag_{lag}'] = unsort(grouped_shift(price, pos, lag))
+
+    for name, stat, window in ROLLING_FEATURES:
+        feats[name] = unsort(grouped_rolling(demand, pos, window, stat=stat, shift=1))
+
     # --- 6. Time Metadata ---
-    df['dayofweek'] = df['date'].dt.weekday
-    df['month'] = df['date'].dt.month
-    df['is_weekend'] = (df['dayofweek'] >= 5).astype(int)
-    
-    # Interaction feature
-    df['product_month_interaction'] = df['product_id'] + '_' + df['month'].astype(str)
-    
-    df = df.dropna()
-    return df
+    dayofweek = dates.weekday.to_numpy()[date_codes]
+    feats['dayofweek'] = dayofweek
+    feats['month'] = month
+    feats['is_weekend'] = (dayofweek >= 5).astype(int)
+
+    # Equivalent of df.dropna(): input rows with no missing values whose
+    # features are all defined
+    keep = df.notna().all(axis=1).to_numpy(copy=True)
+    for values in feats.values():
+        if values.dtype.kind == 'f':
+            keep &= ~np.isnan(values)
+
+    out = df.loc[keep, [c for c in df.columns if c not in feats]]
+    columns = {}
+    for name, values in feats.items():
+        values = values[keep]
+        target = compact_dtype(name, values.dtype) if compact else None
+        columns[name] = values.astype(target) if target is not None else values
+
+    # Interaction feature (built for kept rows only)
+    interactions = np.array([[f"{pid}_{m}" for m in range(1, 13)] for pid in product_uniques], dtype=object)
+    if compact:
+        columns['product_month_interaction'] = pd.Categorical.from_codes(
+            codes[keep] * 12 + month[keep] - 1, categories=interactions.ravel()
+        )
+        out = compact_dtypes(out)
+    else:
+        columns['product_month_interaction'] = interactions[codes[keep], month[keep] - 1]
+
+    feats = pd.DataFrame(columns, index=out.index, copy=False)
+    return pd.concat([out, feats], axis=1)
 
 def train_test_split_time_series(df, test_size_days=90):
     max_date = df['date'].max()
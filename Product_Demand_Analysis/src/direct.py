@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+
+from src.data_processing import create_lag_features
+from src.recursive_state import RingBufferHistory, history_matrix
+
+# Direct models: one model per horizon bucket, each predicting demand `h` days
+# after the forecast origin from what is known at the origin (the latest
+# lags, rolling stats and price) plus the target date's calendar.
+HORIZON_BUCKETS = [(1, 7), (8, 30), (31, 90)]
+ORIGIN_LAGS = [1, 7, 14, 28, 42, 60]
+START_DATE = pd.Timestamp("2022-01-01")
+
+ORIGIN_FEATURES = ([f'demand_lag_{lag}' for lag in ORIGIN_LAGS]
+                   + ['rolling_7_mean', 'rolling_28_mean', 'rolling_7_std', 'last_price', 'price_ratio'])
+CALENDAR_FEATURES = ['month', 'dayofweek', 'is_weekend', 'day_of_year', 'sin_annual', 'cos_annual',
+                     'days_elapsed', 'is_christmas', 'is_newyear', 'is_july4']
+DIRECT_FEATURES = (['product_id', 'horizon', 'product_num', 'id_group'] + ORIGIN_FEATURES
+                   + CALENDAR_FEATURES + ['product_month_interaction'])
+DIRECT_CATEGORICAL = ['product_id', 'product_month_interaction']
+
+# --- 1. Feature matrix ---
+
+def product_numbers(product_ids):
+    """"P005" -> 5, as in create_lag_features; 0 when there is no number."""
+    nums = pd.Series(list(product_ids), dtype=object).str.extract(r'(\d+)')[0]
+    return pd.to_numeric(nums, errors='coerce').fillna(0).astype(int).to_numpy()
+
+def calendar_columns(dates):
+    dates = pd.DatetimeIndex(dates)
+    month = dates.month.to_numpy()
+    day = dates.day.to_numpy()
+    dayofweek = dates.weekday.to_numpy()
+    day_of_year = dates.dayofyear.to_numpy()
+    return {
+        'month': month,
+        'dayofweek': dayofweek,
+        'is_weekend': dayofweek >= 5,
+        'day_of_year': day_of_year,
+        'sin_annual': np.sin(2 * np.pi * day_of_year / 365.25),
+        'cos_annual': np.cos(2 * np.pi * day_of_year / 365.25),
+        'days_elapsed': (dates - START_DATE).days.to_numpy(),
+        'is_christmas': (month == 12) & (day == 25),
+        'is_newyear': (month == 1) & (day == 1),
+        'is_july4': (month == 7) & (day == 4),
+    }
+
+def direct_matrix(product_codes, product_nums, origin, horizon, target_dates):
+    """float32 rows in DIRECT_FEATURES order.
+
+    product_codes index the artifact's product list (NaN when unknown);
+    product_month_interaction is encoded as product_code * 12 + month - 1.
+    origin is a (rows, len(ORIGIN_FEATURES)) block.
+    """
+    col = {f: i for i, f in enumerate(DIRECT_FEATURES)}
+    X = np.empty((len(horizon), len(DIRECT_FEATURES)), dtype=np.float32)
+    X[:, col['product_id']] = product_codes
+    X[:, col['horizon']] = horizon
+    X[:, col['product_num']] = product_nums
+    X[:, col['id_group']] = product_nums % 2
+    start = col[ORIGIN_FEATURES[0]]
+    X[:, start:start + len(ORIGIN_FEATURES)] = origin
+
+    calendar = calendar_columns(target_dates)
+    for name, values in calendar.items():
+        X[:, col[name]] = values
+    X[:, col['product_month_interaction']] = product_codes * 12 + calendar['month'] - 1
+    return X
+
+# --- 2. Training samples ---
+
+def direct_training_samples(df, cutoff, max_horizon=90, origin_stride=5):
+    """(X, y, horizon, target_date, product_ids) for every (product, origin, h) with a known target.
+
+    Origins are days on or before `cutoff` taken every `origin_stride` days
+    (keep it coprime with 7 so every weekday shows up as an origin); targets
+    after `cutoff` are never used, so the holdout stays unseen. Origin state
+    comes from the create_lag_features row of the day after the origin,
+    whose lags and rolling windows end at the origin.
+    """
+    cutoff = pd.Timestamp(cutoff)
+    df = df[df['date'] <= cutoff]
+    product_ids = sorted(df['product_id'].unique())
+    price_means = df.groupby('product_id')['price'].mean()
+
+    first = df['date'].min()
+    n_days = (cutoff - first).days + 1
+    p_all = pd.Categorical(df['product_id'], categories=product_ids).codes
+    t_all = (df['date'] - first).dt.days.to_numpy()
+    demand = np.full((len(product_ids), n_days), np.nan)
+    demand[p_all, t_all] = df['demand'].to_numpy(dtype=float)
+
+    feats = create_lag_features(df, lags=ORIGIN_LAGS, price_means=price_means)
+    t_origin = (feats['date'] - first).dt.days.to_numpy() - 1
+    feats = feats[t_origin % origin_stride == 0]
+    t_origin = t_origin[t_origin % origin_stride == 0]
+
+    codes = pd.Categorical(feats['product_id'], categories=product_ids).codes
+    origin = feats[ORIGIN_FEATURES[:-2]].to_numpy(dtype=float)
+    last_price = feats['price_lag_1'].to_numpy(dtype=float)
+    origin = np.column_stack([origin, last_price, last_price / price_means.to_numpy()[codes]])
+    nums = product_numbers(product_ids)[codes]
+
+    blocks = []
+    for h in range(1, max_horizon + 1):
+        t = t_origin + h
+        valid = t < n_days
+        valid[valid] &= ~np.isnan(demand[codes[valid], t[valid]])
+        if not valid.any():
+            continue
+        dates = first + pd.to_timedelta(t[valid], unit='D')
+        X = direct_matrix(codes[valid], nums[valid], origin[valid], np.full(valid.sum(), h), dates)
+        blocks.append((X, demand[codes[valid], t[valid]], np.full(valid.sum(), h), t[valid]))
+
+    X, y, horizon, t = (np.concatenate(parts) for parts in zip(*blocks))
+    return X, y, horizon, first + pd.to_timedelta(t, unit='D'), product_ids
+
+# --- 3. Forecasting ---
+
+def origin_state(df, product_ids):
+    """(origin block, last price, last dates) per product at the end of its history."""
+    n = len(product_ids)
+    avg_price = df.groupby('product_id')['price'].mean().reindex(product_ids).to_numpy()
+    demand, price, last_dates = history_matrix(df, product_ids, max(ORIGIN_LAGS))
+    history = RingBufferHistory(demand, price, size=max(ORIGIN_LAGS), windows=(7, 28))
+
+    origin = np.empty((n, len(ORIGIN_FEATURES)))
+    lag_price = np.empty(n)
+    for j, lag in enumerate(ORIGIN_LAGS):
+        history.lag(lag, origin[:, j], lag_price)
+    k = len(ORIGIN_LAGS)
+    history.rolling_mean(7, origin[:, k])
+    history.rolling_mean(28, origin[:, k + 1])
+    history.rolling_std(7, origin[:, k + 2])
+    last_price = price[:, -1].copy()
+    origin[:, k + 3] = last_price
+    origin[:, k + 4] = last_price / avg_price
+    return origin, last_price, last_dates
+
+def forecast_direct(artifact, df, product_ids, days_ahead=7):
+    """Whole-horizon forecast with the direct models; same output as forecast_products.
+
+    All (product, horizon) rows are built at once and each bucket's model
+    scores its contiguous block of rows in a single predict call; nothing
+    depends on earlier predictions.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    n = len(product_ids)
+    if n == 0:
+        return {}
+    max_horizon = max(hi for _, hi in artifact['buckets'])
+    if days_ahead > max_horizon:
+        raise ValueError(f"Direct models cover up to {max_horizon} days ahead, got {days_ahead}")
+
+    df = df[df['product_id'].isin(product_ids)]
+    missing = [pid for pid in product_ids if pid not in set(df['product_id'].unique())]
+    if missing:
+        raise ValueError(f"Unknown product_id(s): {', '.join(missing)}")
+
+    origin, last_price, last_dates = origin_state(df, product_ids)
+    known = {pid: code for code, pid in enumerate(artifact['products'])}
+    codes = np.array([known.get(pid, np.nan) for pid in product_ids], dtype=float)
+
+    # Rows are horizon-major: row (h - 1) * n + i is product i, h days ahead
+    horizon = np.repeat(np.arange(1, days_ahead + 1), n)
+    dates = pd.DatetimeIndex(np.concatenate([last_dates + pd.Timedelta(days=h) for h in range(1, days_ahead + 1)]))
+    X = direct_matrix(np.tile(codes, days_ahead), np.tile(product_numbers(product_ids), days_ahead),
+                      np.tile(origin, (days_ahead, 1)), horizon, dates)
+
+    pred = np.empty(len(X))
+    for (lo, hi), model in zip(artifact['buckets'], artifact['models']):
+        if lo > days_ahead:
+            break
+        rows = slice((lo - 1) * n, min(hi, days_ahead) * n)
+        pred[rows] = model.predict(X[rows])
+    pred = np.round(np.maximum(0, pred)).reshape(days_ahead, n)
+
+    date_strs = dates.strftime('%Y-%m-%d').to_numpy().reshape(days_ahead, n)
+    return {
+        pid: [{'date': date_strs[step, i], 'predicted_demand': float(pred[step, i]), 'price': float(last_price[i])}
+              for step in range(days_ahead)]
+        for i, pid in enumerate(product_ids)
+    }
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+from lightgbm import Sequence
+
+from src.streaming import encode_features
+
+# Kept apart from src.streaming so that only training imports LightGBM
+
+class FeaturePartitionSequence(Sequence):
+    """lightgbm.Sequence over Parquet feature partitions, restricted to a date range.
+
+    Only one partition is decoded at a time; LightGBM reads rows in order, so
+    each partition is loaded about once per pass. Labels are kept in memory
+    (one float per row).
+    """
+
+    batch_size = 16384
+
+    def __init__(self, paths, feature_cols, categories, start_date=None, end_date=None, target='demand'):
+        self.paths = list(paths)
+        self.feature_cols = list(feature_cols)
+        self.categories = categories
+        self.start_date = pd.Timestamp(start_date) if start_date is not None else None
+        self.end_date = pd.Timestamp(end_date) if end_date is not None else None
+
+        lengths, labels = [], []
+        for path in self.paths:
+            part = self._filter(pd.read_parquet(path, columns=['date', target]))
+            lengths.append(len(part))
+            labels.append(part[target].to_numpy(dtype=float))
+        self.offsets = np.concatenate(([0], np.cumsum(lengths))).astype(int)
+        self.labels = np.concatenate(labels) if labels else np.empty(0)
+
+        self._cached_index = None
+        self._cached = None
+
+    def _filter(self, df):
+        if self.start_date is not None:
+            df = df[df['date'] >= self.start_date]
+        if self.end_date is not None:
+            df = df[df['date'] <= self.end_date]
+        return df
+
+    def _partition(self, i):
+        if self._cached_index != i:
+            df = pd.read_parquet(self.paths[i], columns=['date'] + self.feature_cols)
+            self._cached = encode_features(self._filter(df), self.feature_cols, self.categories)
+            self._cached_index = i
+        return self._cached
+
+    def _rows(self, start, stop):
+        out = []
+        while start < stop:
+            i = int(np.searchsorted(self.offsets, start, side='right')) - 1
+            end = min(stop, self.offsets[i + 1])
+            out.append(self._partition(i)[start - self.offsets[i]:end - self.offsets[i]])
+            start = end
+        return out[0] if len(out) == 1 else np.vstack(out)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self))
+            return self._rows(start, stop)
+        if isinstance(idx, list):
+            return np.vstack([self._rows(i, i + 1) for i in idx])
+        return self._rows(int(idx), int(idx) + 1)[0]
+
+    def __len__(self):
+        return int(self.offsets[-1])
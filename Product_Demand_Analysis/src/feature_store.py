@@ -0,0 +1,150 @@
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from src.data_processing import PROJECT_ROOT, ROLLING_FEATURES
+from src.streaming import (DEFAULT_CHUNK_ROWS, DEFAULT_LAGS, LookbackFeatureBuilder,
+                           iter_raw_chunks, scan_history)
+
+FEATURE_STORE_DIR = os.path.join(PROJECT_ROOT, 'data', 'feature_store')
+# Bump when create_lag_features changes in a way that invalidates stored rows
+FEATURE_VERSION = 1
+
+RAW_COLUMNS = ['date', 'product_id', 'product_name', 'price', 'demand', 'promotion']
+
+def feature_config(lags=DEFAULT_LAGS):
+    return {
+        'version': FEATURE_VERSION,
+        'lags': sorted(lags),
+        'rolling': [list(spec) for spec in ROLLING_FEATURES],
+    }
+
+def config_key(config):
+    payload = json.dumps(config, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+class FeatureStore:
+    """Persisted lag/rolling features that grow one batch of days at a time.
+
+    Layout under <root>/<config hash>/:
+        meta.json          config, last stored date, partition count
+        state.parquet      last lookback rows per product (raw columns)
+        price.parquet      running per-product price sum/count
+        parts/part-*.parquet  feature rows, one file per build chunk or append
+
+    append() only computes features for the new dates, from the stored tails,
+    so a daily refresh costs O(products + new rows) instead of O(history).
+    price_ratio for appended rows uses the running price mean up to that day;
+    rows already stored are never rewritten.
+    """
+
+    def __init__(self, root=None, lags=DEFAULT_LAGS):
+        self.lags = sorted(lags)
+        self.config = feature_config(self.lags)
+        self.key = config_key(self.config)
+        self.dir = os.path.join(root or FEATURE_STORE_DIR, self.key)
+        self.parts_dir = os.path.join(self.dir, 'parts')
+        self.meta_path = os.path.join(self.dir, 'meta.json')
+        self.state_path = os.path.join(self.dir, 'state.parquet')
+        self.price_path = os.path.join(self.dir, 'price.parquet')
+
+    # --- Metadata ---
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def meta(self):
+        if not self.exists():
+            raise FileNotFoundError(f"No feature store at {self.dir}; run build() first")
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def last_date(self):
+        return pd.Timestamp(self.meta()['last_date'])
+
+    def _write_meta(self, last_date, parts):
+        meta = {'config': self.config, 'key': self.key, 'last_date': str(last_date.date()), 'parts': parts}
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, self.meta_path)
+
+    def _write_part(self, index, feats):
+        path = os.path.join(self.parts_dir, f'part-{index:05d}.parquet')
+        feats.to_parquet(path, index=False)
+
+    def _save_state(self, builder, price_stats):
+        builder.carry.to_parquet(self.state_path, index=False)
+        price_stats.rename_axis('product_id').reset_index().to_parquet(self.price_path, index=False)
+
+    # --- Build / append ---
+
+    def build(self, path=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """(Re)build the store from the raw data file, streaming in chunks."""
+        os.makedirs(self.parts_dir, exist_ok=True)
+        for old in glob.glob(os.path.join(self.parts_dir, 'part-*.parquet')):
+            os.remove(old)
+
+        stats = scan_history(path, chunk_rows)
+        builder = LookbackFeatureBuilder(self.lags, price_means=stats['price_means'])
+        parts = 0
+        for chunk in iter_raw_chunks(path, chunk_rows):
+            feats = builder.step(chunk)
+            if len(feats):
+                self._write_part(parts, feats)
+                parts += 1
+
+        self._save_state(builder, stats['price_stats'])
+        self._write_meta(stats['max_date'], parts)
+        return self
+
+    def append(self, new_rows):
+        """Add features for days after last_date(); returns the new feature rows."""
+        meta = self.meta()
+        last_date = pd.Timestamp(meta['last_date'])
+
+        new_rows = new_rows[RAW_COLUMNS].copy()
+        new_rows['date'] = pd.to_datetime(new_rows['date'])
+        if new_rows.empty:
+            return new_rows
+        if new_rows['date'].min() <= last_date:
+            raise ValueError(f"FeatureStore.append only accepts dates after {last_date.date()}")
+
+        # Running price mean including the new days
+        price_stats = pd.read_parquet(self.price_path).set_index('product_id')
+        new_stats = new_rows.groupby('product_id')['price'].agg(['sum', 'count'])
+        price_stats = price_stats.add(new_stats, fill_value=0)
+
+        builder = LookbackFeatureBuilder(
+            self.lags,
+            price_means=price_stats['sum'] / price_stats['count'],
+            carry=pd.read_parquet(self.state_path)
+        )
+        feats = builder.step(new_rows)
+
+        parts = meta['parts']
+        if len(feats):
+            self._write_part(parts, feats)
+            parts += 1
+        self._save_state(builder, price_stats)
+        self._write_meta(new_rows['date'].max(), parts)
+        return feats
+
+    # --- Read ---
+
+    def read(self, columns=None, product_ids=None, start_date=None, end_date=None):
+        """Stored feature rows, with optional column projection and filters."""
+        self.meta()
+        filters = []
+        if product_ids is not None:
+            filters.append(('product_id', 'in', list(product_ids)))
+        if start_date is not None:
+            filters.append(('date', '>=', pd.Timestamp(start_date)))
+        if end_date is not None:
+            filters.append(('date', '<=', pd.Timestamp(end_date)))
+        df = pd.read_parquet(self.parts_dir, columns=columns, filters=filters or None)
+        sort_cols = [c for c in ['product_id', 'date'] if columns is None or c in columns]
+        return df.sort_values(sort_cols, ignore_index=True) if sort_cols else df
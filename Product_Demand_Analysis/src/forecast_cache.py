@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src.data_processing import PROJECT_ROOT
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+FORECAST_CACHE_PATH = os.path.join(PROJECT_ROOT, 'data', 'forecast_cache.sqlite')
+
+def _forecast_size(forecast):
+    """Approximate in-memory size of a forecast (list of small dicts)."""
+    size = sys.getsizeof(forecast)
+    for item in forecast:
+        size += sys.getsizeof(item) + sum(sys.getsizeof(v) for v in item.values())
+    return size
+
+class ForecastCache:
+    """LRU cache of recursive forecasts keyed by (product_id, last data date, model version).
+
+    Only the longest horizon computed so far is stored per key. A recursive
+    forecast for h days is the first h days of any longer forecast from the
+    same origin, so shorter requests are answered by slicing. The memory tier
+    is bounded by `max_bytes`; with `disk_path` set, entries are also written
+    to a SQLite file and survive restarts.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_path=None):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (forecast, size)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        if disk_path is not None:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS forecasts ("
+                    "key TEXT PRIMARY KEY, horizon INTEGER NOT NULL, payload TEXT NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(product_id, last_date, model_version):
+        return f"{product_id}|{str(last_date)[:10]}|{model_version}"
+
+    @contextmanager
+    def _connect(self):
+        # sqlite3's own context manager only commits/rolls back; close too
+        conn = sqlite3.connect(self.disk_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- Memory tier ---
+
+    def _remember(self, key, forecast):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        size = _forecast_size(forecast)
+        self._entries[key] = (forecast, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats['evictions'] += 1
+
+    # --- Public API ---
+
+    def get(self, product_id, last_date, model_version, days_ahead):
+        """First `days_ahead` days of a cached forecast, or None if not long enough."""
+        key = self.make_key(product_id, last_date, model_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and len(entry[0]) >= days_ahead:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return [dict(item) for item in entry[0][:days_ahead]]
+
+            if self.disk_path is not None:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT horizon, payload FROM forecasts WHERE key = ?", (key,)
+                    ).fetchone()
+                if row is not None and row[0] >= days_ahead:
+                    forecast = json.loads(row[1])
+                    self._remember(key, forecast)
+                    self._stats['disk_hits'] += 1
+                    return [dict(item) for item in forecast[:days_ahead]]
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, product_id, last_date, model_version, forecast):
+        """Store a forecast unless a longer one is already cached for the key."""
+        self.put_many([(product_id, last_date, forecast)], model_version)
+
+    def put_many(self, forecasts, model_version):
+        """put() for (product_id, last_date, forecast) triples, in one disk transaction."""
+        rows = []
+        with self._lock:
+            for product_id, last_date, forecast in forecasts:
+                key = self.make_key(product_id, last_date, model_version)
+                forecast = [dict(item) for item in forecast]
+                entry = self._entries.get(key)
+                if entry is None or len(entry[0]) < len(forecast):
+                    self._remember(key, forecast)
+                rows.append((key, len(forecast), forecast))
+
+            if self.disk_path is not None and rows:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT INTO forecasts (key, horizon, payload) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET horizon = excluded.horizon, payload = excluded.payload "
+                        "WHERE excluded.horizon > forecasts.horizon",
+                        [(key, horizon, json.dumps(forecast)) for key, horizon, forecast in rows]
+                    )
+
+    def clear(self, disk=False):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if disk and self.disk_path is not None:
+                with self._connect() as conn:
+                    conn.execute("DELETE FROM forecasts")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+FORECAST_CACHE = ForecastCache()
+
+def configure_forecast_cache(max_bytes=DEFAULT_MAX_BYTES, disk_path=None):
+    """Replace the process-wide forecast cache (e.g. to enable the disk tier)."""
+    global FORECAST_CACHE
+    FORECAST_CACHE = ForecastCache(max_bytes=max_bytes, disk_path=disk_path)
+    return FORECAST_CACHE
+
+def get_forecast_cache():
+    return FORECAST_CACHE
@@ -0,0 +1,192 @@
+import json
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_profiler = None
+
+class MemoryBudgetExceeded(RuntimeError):
+    pass
+
+# --- 1. RSS sampling ---
+
+def current_rss():
+    """Resident set size in bytes (Linux /proc; falls back to the peak elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+class RssSampler:
+    """Background thread recording the highest RSS seen while a block runs."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = current_rss()
+        self.peak = self.start_rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+# --- 2. Per-stage profiling ---
+
+class MemoryProfiler:
+    """Per-stage memory report: tracemalloc peak/net allocations, RSS peak, top call sites.
+
+    tracemalloc sees Python and NumPy allocations; memory held by Arrow or
+    LightGBM's C++ side only shows up in RSS. With `budget_mb`, a stage whose
+    RSS peak goes over the budget raises MemoryBudgetExceeded when it ends.
+    """
+
+    def __init__(self, budget_mb=None, top=10, nframes=25):
+        self.budget_mb = budget_mb
+        self.top = top
+        self.nframes = nframes
+        self.stages = []
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        before = tracemalloc.take_snapshot()
+        start_traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+        with RssSampler() as rss:
+            yield
+
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__, all_frames=True)]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'traceback')
+
+        record = {
+            'stage': name,
+            'traced_peak_mb': round((peak - start_traced) / 2**20, 1),
+            'traced_net_mb': round((current - start_traced) / 2**20, 1),
+            'rss_start_mb': round(rss.start_rss / 2**20, 1),
+            'rss_peak_mb': round(rss.peak / 2**20, 1),
+            'top_sites': self._top_sites(diff),
+        }
+        self.stages.append(record)
+        print(f"[memory] {name}: RSS peak {record['rss_peak_mb']} MB, "
+              f"traced peak +{record['traced_peak_mb']} MB, net +{record['traced_net_mb']} MB", flush=True)
+
+        if self.budget_mb is not None and record['rss_peak_mb'] > self.budget_mb:
+            raise MemoryBudgetExceeded(
+                f"Stage '{name}' peaked at {record['rss_peak_mb']} MB RSS, over the {self.budget_mb} MB budget"
+            )
+
+    def _top_sites(self, diff):
+        """Net allocations grouped by the innermost project line that led to them.
+
+        Library frames (pandas, NumPy, LightGBM) are folded into the line of
+        our code that called into them; `via` names the innermost frame.
+        """
+        sites = {}
+        for stat in diff:
+            if stat.size_diff <= 0:
+                continue
+            frames = list(stat.traceback)  # most recent call last
+            own = next((f for f in reversed(frames) if f.filename.startswith(PROJECT_ROOT)), frames[-1])
+            site = sites.setdefault(f"{own.filename}:{own.lineno}",
+                                    {'size': 0, 'count': 0, 'via': f"{frames[-1].filename}:{frames[-1].lineno}"})
+            site['size'] += stat.size_diff
+            site['count'] += stat.count_diff
+        ranked = sorted(sites.items(), key=lambda kv: kv[1]['size'], reverse=True)[:self.top]
+        return [
+            {'site': os.path.relpath(name, PROJECT_ROOT) if name.startswith(PROJECT_ROOT) else name,
+             'size_mb': round(s['size'] / 2**20, 2), 'count': s['count'], 'via': s['via']}
+            for name, s in ranked
+        ]
+
+    def report(self):
+        lines = ["\n--- Memory profile ---",
+                 f"{'stage':<28} {'RSS peak MB':>12} {'traced peak MB':>15} {'net MB':>8}"]
+        for r in self.stages:
+            lines.append(f"{r['stage']:<28} {r['rss_peak_mb']:>12} {r['traced_peak_mb']:>15} {r['traced_net_mb']:>8}")
+        for r in self.stages:
+            if r['top_sites']:
+                lines.append(f"\nTop allocation sites in {r['stage']}:")
+                lines.extend(f"  {s['size_mb']:>9.2f} MB  {s['count']:>8}  {s['site']}" for s in r['top_sites'])
+        return '\n'.join(lines)
+
+    def write(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'budget_mb': self.budget_mb, 'stages': self.stages}, f, indent=2)
+
+# --- 3. Module-level switch used by the pipeline ---
+
+def enable(budget_mb=None, top=10):
+    global _profiler
+    _profiler = MemoryProfiler(budget_mb=budget_mb, top=top)
+    _profiler.start()
+    return _profiler
+
+def disable():
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+    _profiler = None
+
+def stage(name):
+    """Profile a pipeline stage if profiling is enabled; a no-op otherwise."""
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.stage(name)
+
+def add_cli_args(parser):
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="Report tracemalloc and RSS peaks plus top allocation sites per stage.")
+    parser.add_argument("--memory-budget-mb", type=float,
+                        help="With --profile-memory: fail when a stage's RSS peak exceeds this many MB.")
+    parser.add_argument("--memory-report", help="With --profile-memory: also write the report as JSON here.")
+
+@contextmanager
+def profile_from_args(args):
+    """Enable profiling per add_cli_args flags; prints the report and exits 1 over budget."""
+    if not args.profile_memory:
+        yield None
+        return
+
+    profiler = enable(budget_mb=args.memory_budget_mb)
+    try:
+        yield profiler
+    except MemoryBudgetExceeded as e:
+        print(profiler.report())
+        if args.memory_report:
+            profiler.write(args.memory_report)
+        print(f"\nMemory budget exceeded: {e}")
+        sys.exit(1)
+    finally:
+        disable()
+    print(profiler.report())
+    if args.memory_report:
+        profiler.write(args.memory_report)
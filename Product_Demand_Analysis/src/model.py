@@ -1,36 +1,97 @@
+import hashlib
+import json
 import os
+import shutil
+import uuid
+from datetime import datetime
 import joblib
-from lightgbm import LGBMRegressor, early_stopping, log_evaluation
+import numpy as np
+import pandas as pd
+
+# LightGBM is imported by the functions that train: it takes longer to
+# import than anything else here, and loading a saved model brings it in
+# anyway (unpickling), so importers that only forecast pay for it on first use
+from src import telemetry
+from src.direct import DIRECT_CATEGORICAL, DIRECT_FEATURES, HORIZON_BUCKETS, direct_training_samples
+from src.streaming import encode_features
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__)) 
 MODEL_PATH = os.path.join(BASE_DIR, "models", "lgbm_model_tuned.joblib")
+DATASET_CACHE_DIR = os.path.join(BASE_DIR, "models", "dataset_cache")
+MODEL_VERSIONS_DIR = os.path.join(BASE_DIR, "models", "versions")
+DIRECT_MODEL_PATH = os.path.join(BASE_DIR, "models", "direct_models.joblib")
+COMPILED_MODEL_PATH = os.path.join(BASE_DIR, "models", "lgbm_model_tuned.npz")
+CATEGORICAL_FEATURES = ['product_id', 'product_month_interaction']
+
+# Model parameters tuned for "Authentic" learning
+MODEL_PARAMS = dict(
+    objective='rmse',
+    n_estimators=10000,        # High capacity to learn rules
+    learning_rate=0.01,        # Precise learning
+    num_leaves=50,             # Complex enough for holiday rules
+    max_depth=12,
+    min_child_samples=15,      
+    subsample=0.8,
+    colsample_bytree=0.8,
+    reg_alpha=0.1,             # Prevent memorizing noise
+    reg_lambda=0.1,
+    random_state=42,
+    n_jobs=-1,
+    boosting_type='gbdt'
+)
+
+# Parameters that change how LightGBM bins a Dataset (min_child_samples
+# matters through feature_pre_filter); anything else can vary between runs
+# without invalidating a cached binary Dataset.
+DATASET_PARAMS = ('max_bin', 'min_child_samples', 'random_state')
+
+def booster_params(params=None):
+    """MODEL_PARAMS (plus overrides) as lgb.train params and a round count."""
+    params = dict(MODEL_PARAMS, **(params or {}))
+    num_boost_round = params.pop('n_estimators')
+    params['metric'] = 'rmse'
+    params.setdefault('verbose', -1)
+    return params, num_boost_round
+
+@telemetry.traced('train_model')
+def train_model(train_df, feature_cols, val_df=None, target='demand', compact=False,
+                params=None, model_path=None, dataset_cache=False, metadata=None):
+    """Fit the LightGBM model and save it.
+
+    dataset_cache=True trains from binned LightGBM Datasets cached on disk
+    (see cached_datasets) and returns a Booster instead of an LGBMRegressor;
+    predictions are the same.
+    """
+    from lightgbm import LGBMRegressor, early_stopping, log_evaluation
+
+    if dataset_cache:
+        booster = train_booster_cached(train_df, feature_cols, val_df, target, compact, params)
+        save_model(booster, feature_cols, model_path, metadata)
+        return booster
 
-def train_model(train_df, feature_cols, val_df=None, target='demand'):
     X_train = train_df[feature_cols]
     y_train = train_df[target]
 
-    # Model parameters tuned for "Authentic" learning
-    model = LGBMRegressor(
-        objective='rmse',
-        n_estimators=10000,        # High capacity to learn rules
-        learning_rate=0.01,        # Precise learning
-        num_leaves=50,             # Complex enough for holiday rules
-        max_depth=12,
-        min_child_samples=15,      
-        subsample=0.8,
-        colsample_bytree=0.8,
-        reg_alpha=0.1,             # Prevent memorizing noise
-        reg_lambda=0.1,
-        random_state=42,
-        n_jobs=-1,
-        boosting_type='gbdt'
-    )
+    model = LGBMRegressor(**dict(MODEL_PARAMS, **(params or {})))
+
+    categorical_features = CATEGORICAL_FEATURES
+    fit_kwargs = {}
+    if compact:
+        # Hand LightGBM a float32 matrix: its pandas path turns category codes
+        # into float64 and would upcast the whole feature matrix.
+        categories = {
+            c: list(train_df[c].astype('category').cat.categories)
+            for c in feature_cols if c in CATEGORICAL_FEATURES
+        }
+        categorical_features = list(categories)
+        X_train = encode_features(train_df, feature_cols, categories, dtype=np.float32)
+        fit_kwargs['feature_name'] = feature_cols
 
-    categorical_features = ['product_id', 'product_month_interaction']
-    
     if val_df is not None:
         X_val = val_df[feature_cols]
         y_val = val_df[target]
+        if compact:
+            X_val = encode_features(val_df, feature_cols, categories, dtype=np.float32)
         
         callbacks = [
             early_stopping(stopping_rounds=200),
@@ -42,18 +103,368 @@ def train_model(train_df, feature_cols, val_df=None, target='demand'):
             eval_set=[(X_val, y_val)],
             eval_metric='rmse',
             categorical_feature=categorical_features,
-            callbacks=callbacks
+            callbacks=callbacks,
+            **fit_kwargs
         )
     else:
-        model.fit(X_train, y_train, categorical_feature=categorical_features)
+        model.fit(X_train, y_train, categorical_feature=categorical_features, **fit_kwargs)
 
-    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-    joblib.dump({'model': model, 'features': feature_cols}, MODEL_PATH)
-    print("Model saved at:", MODEL_PATH)
+    if compact:
+        # Same category mapping a pandas fit would record, so predict() on
+        # DataFrames and category_codes() keep working
+        model.booster_.pandas_categorical = [categories[c] for c in categorical_features]
 
+    save_model(model, feature_cols, model_path, metadata)
     return model
 
-def load_model():
-    print("Loading model from:", MODEL_PATH)
-    d = joblib.load(MODEL_PATH)
-    return d['model'], d['features']
\ No newline at end of file
+@telemetry.traced('train_model_streaming')
+def train_model_streaming(train_seq, feature_cols, categories, val_seq=None, params=None, metadata=None):
+    """Out-of-core variant of train_model.
+
+    train_seq/val_seq are lightgbm.Sequence objects (see
+    src.feature_sequence.FeaturePartitionSequence) that read feature rows from disk in
+    batches, so the feature matrix never has to fit in memory. Returns a
+    lightgbm Booster whose category mapping matches `categories`.
+    """
+    import lightgbm as lgb
+    from lightgbm import early_stopping, log_evaluation
+
+    params, num_boost_round = booster_params(params)
+
+    cat_cols = [c for c in feature_cols if c in CATEGORICAL_FEATURES]
+    train_set = lgb.Dataset(
+        train_seq, label=train_seq.labels,
+        feature_name=feature_cols, categorical_feature=cat_cols
+    )
+
+    valid_sets, callbacks = [], [log_evaluation(period=1000)]
+    if val_seq is not None:
+        valid_sets.append(lgb.Dataset(val_seq, label=val_seq.labels, reference=train_set))
+        callbacks.insert(0, early_stopping(stopping_rounds=200))
+
+    booster = lgb.train(params, train_set, num_boost_round=num_boost_round,
+                        valid_sets=valid_sets, callbacks=callbacks)
+
+    # Same layout LightGBM records when trained on pandas categoricals, so
+    # predict() and category_codes() work as for the in-memory model
+    booster.pandas_categorical = [list(categories[c]) for c in cat_cols]
+
+    save_model(booster, feature_cols, metadata=metadata)
+    return booster
+
+# --- Binary Dataset cache ---
+
+def _matrix_and_categories(df, feature_cols, compact):
+    """What train_model hands LightGBM: the pandas frame, or a float32 matrix in compact mode."""
+    if not compact:
+        return df[feature_cols], None
+    categories = {
+        c: list(df[c].astype('category').cat.categories)
+        for c in feature_cols if c in CATEGORICAL_FEATURES
+    }
+    return encode_features(df, feature_cols, categories, dtype=np.float32), categories
+
+def dataset_fingerprint(df, feature_cols, target='demand', params=None, compact=False):
+    """Content hash of the training inputs that determine a binned Dataset."""
+    import lightgbm as lgb
+
+    params = dict(MODEL_PARAMS, **(params or {}))
+    h = hashlib.sha256(json.dumps({
+        'features': list(feature_cols),
+        'target': target,
+        'compact': compact,
+        'params': {k: params.get(k) for k in DATASET_PARAMS},
+        'lightgbm': lgb.__version__,
+    }, sort_keys=True).encode())
+    for col in list(feature_cols) + [target]:
+        values = df[col]
+        h.update(f'{col}:{values.dtype}:{len(values)}'.encode())
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Category order decides the codes LightGBM sees
+            h.update(json.dumps([str(c) for c in values.cat.categories]).encode())
+        h.update(pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+def cached_datasets(train_df, feature_cols, val_df=None, target='demand', compact=False,
+                    params=None, cache_dir=None):
+    """Binned train/validation Datasets, built once and reloaded from LightGBM's binary format.
+
+    Entries live in cache_dir/<train fingerprint>[-<val fingerprint>]/ with
+    the category mapping in meta.json (the binary format does not keep it).
+    Returns (train_set, val_set, pandas_categorical, hit).
+    """
+    import lightgbm as lgb
+
+    cache_dir = cache_dir or DATASET_CACHE_DIR
+    train_params, _ = booster_params(params)
+    key = dataset_fingerprint(train_df, feature_cols, target, params, compact)
+    if val_df is not None:
+        key += '-' + dataset_fingerprint(val_df, feature_cols, target, params, compact)
+    entry = os.path.join(cache_dir, key)
+    cat_cols = [c for c in feature_cols if c in CATEGORICAL_FEATURES]
+
+    meta_path = os.path.join(entry, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        train_set = lgb.Dataset(os.path.join(entry, 'train.bin'), params=train_params)
+        val_set = None
+        if val_df is not None:
+            val_set = lgb.Dataset(os.path.join(entry, 'val.bin'), reference=train_set, params=train_params)
+        return train_set, val_set, meta['pandas_categorical'], True
+
+    X_train, categories = _matrix_and_categories(train_df, feature_cols, compact)
+    extra = {'feature_name': list(feature_cols)} if compact else {}
+    train_set = lgb.Dataset(X_train, label=train_df[target], categorical_feature=cat_cols,
+                            params=train_params, free_raw_data=False, **extra).construct()
+    pandas_categorical = ([categories[c] for c in cat_cols] if compact
+                          else [list(c) for c in (train_set.pandas_categorical or [])])
+
+    val_set = None
+    if val_df is not None:
+        X_val = (encode_features(val_df, feature_cols, categories, dtype=np.float32) if compact
+                 else val_df[feature_cols])
+        val_set = lgb.Dataset(X_val, label=val_df[target], reference=train_set,
+                              params=train_params, free_raw_data=False, **extra).construct()
+
+    # Write into a scratch directory and rename, so readers never see half an entry
+    tmp = entry + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    train_set.save_binary(os.path.join(tmp, 'train.bin'))
+    if val_set is not None:
+        val_set.save_binary(os.path.join(tmp, 'val.bin'))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'features': list(feature_cols), 'target': target,
+                   'pandas_categorical': pandas_categorical}, f)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmp, entry)
+    return train_set, val_set, pandas_categorical, False
+
+def train_booster_cached(train_df, feature_cols, val_df=None, target='demand', compact=False, params=None):
+    import lightgbm as lgb
+    from lightgbm import early_stopping, log_evaluation
+
+    train_set, val_set, pandas_categorical, hit = cached_datasets(
+        train_df, feature_cols, val_df, target, compact, params
+    )
+    print("Loaded binned dataset from cache" if hit else "Binned dataset saved to cache")
+    train_params, num_boost_round = booster_params(params)
+
+    valid_sets, callbacks = [], [log_evaluation(period=1000)]
+    if val_set is not None:
+        valid_sets.append(val_set)
+        callbacks.insert(0, early_stopping(stopping_rounds=200))
+
+    booster = lgb.train(train_params, train_set, num_boost_round=num_boost_round,
+                        valid_sets=valid_sets, callbacks=callbacks)
+    booster.pandas_categorical = pandas_categorical
+    return booster
+
+# --- Incremental training ---
+
+def continue_training(model, feature_cols, new_df, extra_trees=200, target='demand', params=None):
+    """Boost up to `extra_trees` more trees on new rows, starting from `model` (init_model).
+
+    Starts from the model's best iteration (trees past an early-stopping
+    point are dropped) and encodes categoricals with the model's own
+    category mapping, so existing codes keep their meaning; unseen products
+    are treated as missing.
+    """
+    import lightgbm as lgb
+
+    booster = getattr(model, 'booster_', model)
+    base = lgb.Booster(model_str=booster.model_to_string())  # truncated at best_iteration
+    pandas_categorical = getattr(booster, 'pandas_categorical', None) or []
+
+    cat_cols = [c for c in feature_cols if c in CATEGORICAL_FEATURES]
+    categories = dict(zip(cat_cols, pandas_categorical))
+    X = encode_features(new_df, feature_cols, categories)
+
+    train_params, _ = booster_params(params)
+    train_set = lgb.Dataset(X, label=new_df[target].to_numpy(dtype=float), feature_name=list(feature_cols),
+                            categorical_feature=cat_cols, params=train_params)
+    updated = lgb.train(train_params, train_set, num_boost_round=extra_trees, init_model=base)
+    updated.pandas_categorical = pandas_categorical
+    return updated
+
+# --- Artifacts, versions and provenance ---
+
+def new_version_id():
+    return datetime.now().strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+
+def version_path(version):
+    return os.path.join(MODEL_VERSIONS_DIR, f"{version}.joblib")
+
+def _dump_atomic(artifact, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + '.tmp'
+    joblib.dump(artifact, tmp)
+    os.replace(tmp, path)
+
+def _write_version_meta(metadata):
+    with open(os.path.join(MODEL_VERSIONS_DIR, f"{metadata['version']}.json"), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+def save_model(model, feature_cols, path=None, metadata=None, status=None):
+    """Save the joblib artifact with provenance metadata.
+
+    Saving to MODEL_PATH also archives the artifact under
+    MODEL_VERSIONS_DIR/<version>.joblib with a <version>.json sidecar, which
+    is what rollback_model restores from.
+    """
+    import lightgbm as lgb
+
+    path = path or MODEL_PATH
+    metadata = dict(metadata or {})
+    metadata.setdefault('version', new_version_id())
+    metadata.setdefault('created_at', datetime.now().isoformat(timespec='seconds'))
+    metadata['lightgbm'] = lgb.__version__
+    metadata['num_trees'] = getattr(model, 'booster_', model).num_trees()
+    metadata['features'] = len(feature_cols)
+
+    artifact = {'model': model, 'features': feature_cols, 'metadata': metadata}
+    _dump_atomic(artifact, path)
+
+    if os.path.abspath(path) == os.path.abspath(MODEL_PATH):
+        _dump_atomic(artifact, version_path(metadata['version']))
+        status = status or 'promoted'
+    if status is not None:
+        _write_version_meta(dict(metadata, status=status))
+    print("Model saved at:", path)
+    return metadata
+
+def load_artifact(path=None):
+    """The full artifact dict; models saved before versioning get empty metadata."""
+    d = joblib.load(path or MODEL_PATH)
+    d.setdefault('metadata', {})
+    return d
+
+def list_versions():
+    """Metadata of archived versions, oldest first."""
+    if not os.path.isdir(MODEL_VERSIONS_DIR):
+        return []
+    versions = []
+    for name in os.listdir(MODEL_VERSIONS_DIR):
+        if name.endswith('.json'):
+            with open(os.path.join(MODEL_VERSIONS_DIR, name)) as f:
+                versions.append(json.load(f))
+    return sorted(versions, key=lambda m: (m.get('created_at', ''), m['version']))
+
+def set_version_status(version, status, **extra):
+    meta_path = os.path.join(MODEL_VERSIONS_DIR, f"{version}.json")
+    with open(meta_path) as f:
+        metadata = json.load(f)
+    metadata.update(extra, status=status)
+    _write_version_meta(metadata)
+    return metadata
+
+def promote_version(version):
+    """Make an archived version the serving model (atomic replace of MODEL_PATH)."""
+    tmp = MODEL_PATH + '.tmp'
+    shutil.copyfile(version_path(version), tmp)
+    os.replace(tmp, MODEL_PATH)
+    return set_version_status(version, 'promoted', promoted_at=datetime.now().isoformat(timespec='seconds'))
+
+def rollback_model(version=None):
+    """Restore `version`, or the parent of the serving model, as the serving model."""
+    current = load_artifact()['metadata']
+    if version is None:
+        version = current.get('parent')
+        if version is None:
+            raise ValueError("Serving model has no recorded parent version to roll back to")
+    if not os.path.exists(version_path(version)):
+        raise FileNotFoundError(f"No archived model version {version}")
+    print("Rolling back to model version", version)
+    restored = promote_version(version)
+    replaced = current.get('version')
+    if replaced and replaced != version and os.path.exists(os.path.join(MODEL_VERSIONS_DIR, f"{replaced}.json")):
+        set_version_status(replaced, 'rolled_back')
+    return restored
+
+# --- Direct multi-horizon models ---
+
+# A bucket sees up to 90x more rows per origin than the recursive model
+# sees per day, so it trains at a higher rate with a lower round cap
+DIRECT_PARAMS = dict(learning_rate=0.05, n_estimators=2000)
+
+@telemetry.traced('train_direct_models')
+def train_direct_models(df, cutoff, buckets=None, origin_stride=5, params=None,
+                        val_days=30, path=None, metadata=None):
+    """Fit one Booster per horizon bucket on origins up to `cutoff` and save them.
+
+    The last `val_days` target dates before the cutoff are held out for
+    early stopping, as train_model does with the last 30 training days.
+    """
+    import lightgbm as lgb
+    from lightgbm import early_stopping, log_evaluation
+
+    buckets = buckets or HORIZON_BUCKETS
+    X, y, horizon, target_dates, product_ids = direct_training_samples(
+        df, cutoff, max_horizon=max(hi for _, hi in buckets), origin_stride=origin_stride)
+    is_val = np.asarray(target_dates > pd.Timestamp(cutoff) - pd.Timedelta(days=val_days))
+    lgb_params, num_boost_round = booster_params(dict(DIRECT_PARAMS, **(params or {})))
+
+    models = []
+    for lo, hi in buckets:
+        in_bucket = (horizon >= lo) & (horizon <= hi)
+        fit, val = in_bucket & ~is_val, in_bucket & is_val
+        print(f"Horizon {lo}-{hi}: {fit.sum()} train rows, {val.sum()} validation rows")
+        train_set = lgb.Dataset(X[fit], label=y[fit], feature_name=DIRECT_FEATURES,
+                                categorical_feature=DIRECT_CATEGORICAL, params=lgb_params)
+        val_set = lgb.Dataset(X[val], label=y[val], reference=train_set)
+        models.append(lgb.train(lgb_params, train_set, num_boost_round=num_boost_round, valid_sets=[val_set],
+                                callbacks=[early_stopping(stopping_rounds=200), log_evaluation(period=1000)]))
+
+    metadata = dict(metadata or {})
+    metadata.setdefault('version', new_version_id())
+    metadata.setdefault('created_at', datetime.now().isoformat(timespec='seconds'))
+    metadata.update(lightgbm=lgb.__version__, trained_through=str(pd.Timestamp(cutoff).date()),
+                    train_rows=int(len(y)), origin_stride=origin_stride,
+                    num_trees=[m.num_trees() for m in models])
+    artifact = {'models': models, 'buckets': [tuple(b) for b in buckets], 'features': DIRECT_FEATURES,
+                'products': product_ids, 'metadata': metadata}
+    path = path or DIRECT_MODEL_PATH
+    _dump_atomic(artifact, path)
+    print("Direct models saved at:", path)
+    return artifact
+
+@telemetry.traced('load_direct_models')
+def load_direct_models(path=None):
+    path = path or DIRECT_MODEL_PATH
+    print("Loading direct models from:", path)
+    return joblib.load(path)
+
+@telemetry.traced('load_model')
+def load_model(path=None):
+    path = path or MODEL_PATH
+    print("Loading model from:", path)
+    d = joblib.load(path)
+    return d['model'], d['features']
+
+def predict_matrix(model, X):
+    """Predict from a plain float matrix laid out like `features`.
+
+    Goes straight to the Booster: the sklearn wrapper would re-validate the
+    array and warn about missing feature names on every call.
+    """
+    if not telemetry.is_enabled():
+        return getattr(model, 'booster_', model).predict(X)
+    with telemetry.span('model_predict', rows=len(X)):
+        telemetry.inc('model_predict_rows_total', len(X))
+        return getattr(model, 'booster_', model).predict(X)
+
+def category_codes(model, features):
+    """{column: {category: code}} as used by the model for pandas categoricals.
+
+    Lets callers feed the model a plain float matrix: LightGBM stores the
+    training categories per categorical column (in feature order) and encodes
+    a category by its position in that list.
+    """
+    booster = getattr(model, 'booster_', model)
+    pandas_categorical = getattr(booster, 'pandas_categorical', None) or []
+    cat_cols = [f for f in features if f in CATEGORICAL_FEATURES]
+    return {
+        col: {cat: code for code, cat in enumerate(cats)}
+        for col, cats in zip(cat_cols, pandas_categorical)
+    }
@@ -0,0 +1,194 @@
+import re
+from collections import deque, namedtuple
+from functools import lru_cache
+
+Match = namedtuple('Match', ['product_id', 'text', 'start', 'end', 'fuzzy', 'score'])
+
+_SEPARATORS = re.compile(r'[\s_\-]+')
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+def normalize(text):
+    """Lowercase with underscores, dashes and runs of whitespace folded to one space."""
+    return _SEPARATORS.sub(' ', str(text).lower()).strip()
+
+def _edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is certain to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+def _deletes(token, edits):
+    """All strings reachable from token by deleting up to `edits` characters."""
+    found = {token}
+    frontier = {token}
+    for _ in range(edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+class ProductMatcher:
+    """Finds product names and IDs in free text.
+
+    Exact matching runs a word-level Aho-Corasick automaton over the
+    normalized names and IDs (see normalize, so "chai_latte_mix" and
+    "Chai Latte Mix" are the same pattern): one pass over the query words,
+    independent of catalog size. Hits are ranked longest first; a hit inside
+    a longer one is dropped.
+
+    When nothing matches exactly, a bounded fuzzy pass looks up each query
+    word in a deletion index of the name vocabulary (at most `max_edits`
+    edits per word, or none for words shorter than `min_fuzzy_len`).
+    Products whose name words are covered at least `min_coverage` are
+    returned, best coverage first.
+    """
+
+    def __init__(self, products, max_edits=1, min_fuzzy_len=4, min_coverage=0.6):
+        # products: {product_id: product_name}
+        self.names = dict(products)
+        self.max_edits = max_edits
+        self.min_fuzzy_len = min_fuzzy_len
+        self.min_coverage = min_coverage
+
+        self._patterns = []  # (word tuple, product_id)
+        for pid, name in self.names.items():
+            for pattern in dict.fromkeys([tuple(_TOKEN.findall(normalize(name))), tuple(_TOKEN.findall(normalize(pid)))]):
+                if pattern:
+                    self._patterns.append((pattern, pid))
+        self._build_automaton()
+        self._build_fuzzy_index()
+
+    @classmethod
+    def from_name_map(cls, product_map, **kwargs):
+        """From the chatbots' {name_lower: product_id} map."""
+        return cls({pid: name for name, pid in product_map.items()}, **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    # --- Exact matching ---
+
+    def _build_automaton(self):
+        # Aho-Corasick over words rather than characters: word boundaries come
+        # for free and the trie has one node per distinct name prefix
+        self._goto = [{}]
+        self._out = [[]]
+        for k, (pattern, _) in enumerate(self._patterns):
+            state = 0
+            for word in pattern:
+                nxt = self._goto[state].get(word)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][word] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(k)
+
+        # Failure links in BFS order; outputs inherit those of their fallback state
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and word not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(word, 0)
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def exact(self, query):
+        words = list(_TOKEN.finditer(normalize(query)))
+        hits = []
+        state = 0
+        for i, m in enumerate(words):
+            word = m.group()
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for k in self._out[state]:
+                pattern, pid = self._patterns[k]
+                hits.append(Match(pid, ' '.join(pattern), i - len(pattern) + 1, i + 1, False, 1.0))
+
+        # Longest first (start/end count words); a hit inside a longer one
+        # ("latte" in "chai latte mix") is part of that mention, not a
+        # product of its own
+        matches, seen = [], set()
+        for m in sorted(hits, key=lambda m: (-(m.end - m.start), m.start, m.product_id)):
+            if m.product_id in seen or any(k.start <= m.start and m.end <= k.end for k in matches):
+                continue
+            matches.append(m)
+            seen.add(m.product_id)
+        return matches
+
+    # --- Fuzzy fallback ---
+
+    def _build_fuzzy_index(self):
+        self._name_tokens = {}
+        self._postings = {}   # vocabulary word -> product ids
+        self._deletions = {}  # deletion variant -> vocabulary words
+        for pid, name in self.names.items():
+            tokens = set(_TOKEN.findall(normalize(name)))
+            self._name_tokens[pid] = tokens
+            for token in tokens:
+                if token not in self._postings:
+                    self._postings[token] = set()
+                    edits = self.max_edits if len(token) >= self.min_fuzzy_len else 0
+                    for variant in _deletes(token, edits):
+                        self._deletions.setdefault(variant, set()).add(token)
+                self._postings[token].add(pid)
+
+    def _similar_words(self, word):
+        edits = self.max_edits if len(word) >= self.min_fuzzy_len else 0
+        candidates = set()
+        for variant in _deletes(word, edits):
+            candidates |= self._deletions.get(variant, set())
+        return {c for c in candidates if _edit_distance(word, c, edits) <= edits}
+
+    def fuzzy(self, query):
+        covered = {}
+        for word in set(_TOKEN.findall(normalize(query))):
+            for token in self._similar_words(word):
+                for pid in self._postings[token]:
+                    covered.setdefault(pid, set()).add(token)
+
+        matches = []
+        for pid, tokens in covered.items():
+            score = len(tokens) / len(self._name_tokens[pid])
+            if score >= self.min_coverage:
+                matches.append(Match(pid, ' '.join(sorted(tokens)), -1, -1, True, score))
+        return sorted(matches, key=lambda m: (-m.score, -len(m.text), m.product_id))
+
+    # --- Public entry points ---
+
+    def match(self, query):
+        """All products mentioned in the query, best first; fuzzy only if nothing matches exactly."""
+        return self.exact(query) or self.fuzzy(query)
+
+    def best(self, query):
+        matches = self.match(query)
+        return matches[0].product_id if matches else None
+
+@lru_cache(maxsize=8)
+def _matcher_for(items):
+    return ProductMatcher.from_name_map(dict(items))
+
+def as_matcher(products):
+    """A ProductMatcher as is, or one built from a {name_lower: product_id} map.
+
+    Matchers built from maps are cached by the map's contents, so passing
+    the same dict with every query builds the index once. Callers that can
+    should still build the matcher once and pass it instead.
+    """
+    if isinstance(products, ProductMatcher):
+        return products
+    return _matcher_for(frozenset(products.items()))
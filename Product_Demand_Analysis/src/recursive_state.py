@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+def history_matrix(df, product_ids, window):
+    """Last `window` days of demand and price per product, plus each product's last date.
+
+    Histories are right-aligned in (products x window) matrices; products
+    with shorter history are NaN-padded on the left.
+    """
+    n = len(product_ids)
+    tail = df.sort_values(['product_id', 'date']).groupby('product_id').tail(window)
+    last_dates = pd.DatetimeIndex(tail.groupby('product_id')['date'].max().reindex(product_ids))
+
+    demand = np.full((n, window), np.nan)
+    price = np.full((n, window), np.nan)
+
+    row_idx = pd.Categorical(tail['product_id'], categories=product_ids).codes
+    col_idx = window - 1 - tail.groupby('product_id').cumcount(ascending=False).to_numpy()
+    demand[row_idx, col_idx] = tail['demand'].to_numpy()
+    price[row_idx, col_idx] = tail['price'].to_numpy()
+    return demand, price, last_dates
+
+class RingBufferHistory:
+    """Fixed-size demand/price history for recursive forecasting of N products.
+
+    Keeps the last `size` values per product in (N, size) ring buffers that all
+    products advance through together. Rolling window sums and sums of squares
+    are updated incrementally as values enter and leave each window, so a step
+    costs O(N) regardless of how far the forecast has run.
+    """
+
+    def __init__(self, demand, price, size=60, windows=(7, 28)):
+        # demand/price: (N, L) arrays, right-aligned, NaN-padded on the left
+        # for products with less than L days of history.
+        demand = np.asarray(demand, dtype=float)
+        price = np.asarray(price, dtype=float)
+        n, length = demand.shape
+
+        self.size = size
+        self.windows = tuple(windows)
+        self.head = 0  # next write position, shared by all products
+        self.count = (~np.isnan(demand)).sum(axis=1).astype(float)
+
+        # Whole-history sums back the "lag reaches past known history" fallback
+        self.total_demand = np.nansum(demand, axis=1)
+        self.total_price = np.nansum(price, axis=1)
+
+        # Unfilled slots hold 0.0 so they drop out of the window sums for free
+        self.demand = np.zeros((n, size))
+        self.price = np.zeros((n, size))
+        keep = min(size, length)
+        self.demand[:, :keep] = np.nan_to_num(demand[:, length - keep:])
+        self.price[:, :keep] = np.nan_to_num(price[:, length - keep:])
+        self.head = keep % size
+
+        self.win_sum = {w: self.demand[:, max(0, keep - w):keep].sum(axis=1) for w in self.windows}
+        self.win_sumsq = {w: (self.demand[:, max(0, keep - w):keep] ** 2).sum(axis=1) for w in self.windows}
+
+        # Scratch buffers reused by every step
+        self._tmp = np.empty(n)
+        self._mask = np.empty(n, dtype=bool)
+        self._n = np.empty(n)
+        self._sq = np.empty(n)
+
+    def lag(self, lag, demand_out, price_out):
+        """Write the demand/price values from `lag` days ago into the out arrays."""
+        slot = (self.head - lag) % self.size
+        demand_out[:] = self.demand[:, slot]
+        price_out[:] = self.price[:, slot]
+
+        np.less(self.count, lag, out=self._mask)
+        if self._mask.any():
+            np.divide(self.total_demand, self.count, out=self._tmp)
+            np.copyto(demand_out, self._tmp, where=self._mask)
+            np.divide(self.total_price, self.count, out=self._tmp)
+            np.copyto(price_out, self._tmp, where=self._mask)
+
+    def rolling_mean(self, window, out):
+        np.minimum(self.count, window, out=self._n)
+        np.divide(self.win_sum[window], self._n, out=out)
+
+    def rolling_std(self, window, out):
+        """Sample (ddof=1) std over the last `window` values."""
+        n = np.minimum(self.count, window, out=self._n)
+        # (n * sum(x^2) - sum(x)^2) / (n * (n - 1)), exact for integer demand
+        np.multiply(self.win_sum[window], self.win_sum[window], out=self._tmp)
+        np.multiply(n, self.win_sumsq[window], out=out)
+        np.subtract(out, self._tmp, out=out)
+        np.maximum(out, 0.0, out=out)
+        np.multiply(n, n - 1, out=self._tmp)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            np.divide(out, self._tmp, out=out)
+        np.sqrt(out, out=out)
+        np.less(n, 2, out=self._mask)
+        out[self._mask] = np.nan
+
+    def push(self, demand, price):
+        """Append one new day (one value per product) to the history."""
+        np.multiply(demand, demand, out=self._sq)
+        for w in self.windows:
+            leaving = self.demand[:, (self.head - w) % self.size]
+            self.win_sum[w] += demand
+            self.win_sum[w] -= leaving
+            self.win_sumsq[w] += self._sq
+            np.multiply(leaving, leaving, out=self._tmp)
+            self.win_sumsq[w] -= self._tmp
+
+        self.demand[:, self.head] = demand
+        self.price[:, self.head] = price
+        self.total_demand += demand
+        self.total_price += price
+        self.count += 1
+        self.head = (self.head + 1) % self.size
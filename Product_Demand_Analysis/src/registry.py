@@ -0,0 +1,108 @@
+import hashlib
+import os
+import threading
+
+from src.compiled_model import compile_model
+from src.data_processing import DATA_PATH, load_data
+from src.model import DIRECT_MODEL_PATH, MODEL_PATH, load_direct_models, load_model
+
+class ArtifactRegistry:
+    """Process-wide cache for artifacts loaded from disk (model, demand history).
+
+    Each entry remembers the file's mtime/size and a content hash. A changed
+    mtime triggers a re-hash, and the artifact is only reloaded when the
+    content really differs. Cached objects are shared between callers and
+    must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.RLock()
+        self._stats = {}
+
+    def get(self, key, path, loader):
+        with self._lock:
+            stats = self._stats.setdefault(key, {'hits': 0, 'misses': 0, 'reloads': 0})
+            st = os.stat(path)
+            entry = self._entries.get(key)
+
+            if entry is not None and entry['path'] == path:
+                if (entry['mtime_ns'], entry['size']) == (st.st_mtime_ns, st.st_size):
+                    stats['hits'] += 1
+                    return entry['value']
+
+                # Touched but identical content (e.g. re-copied file): keep the cached copy
+                digest = file_digest(path)
+                if digest == entry['digest']:
+                    entry['mtime_ns'], entry['size'] = st.st_mtime_ns, st.st_size
+                    stats['hits'] += 1
+                    return entry['value']
+                stats['reloads'] += 1
+            else:
+                digest = file_digest(path)
+
+            stats['misses'] += 1
+            value = loader(path)
+            self._entries[key] = {
+                'path': path,
+                'mtime_ns': st.st_mtime_ns,
+                'size': st.st_size,
+                'digest': digest,
+                'value': value,
+            }
+            return value
+
+    def version(self, key):
+        """Content hash of the currently cached artifact, or None."""
+        entry = self._entries.get(key)
+        return entry['digest'] if entry else None
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {key: dict(s) for key, s in self._stats.items()}
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+REGISTRY = ArtifactRegistry()
+
+def get_model(path=None):
+    """Cached (model, features) tuple; reloads only when the joblib file changes."""
+    return REGISTRY.get('model', path or MODEL_PATH, load_model)
+
+def get_compiled_model(path=None):
+    """Cached (CompiledModel, features) for the joblib model; recompiled when the file changes.
+
+    Not used for serving, which scores with predict_matrix (see src.compiled_model).
+    """
+    def loader(p):
+        model, features = load_model(p)
+        return compile_model(model), features
+    return REGISTRY.get('compiled_model', path or MODEL_PATH, loader)
+
+def get_direct_models(path=None):
+    """Cached direct multi-horizon artifact (see src.model.train_direct_models)."""
+    return REGISTRY.get('direct_models', path or DIRECT_MODEL_PATH, load_direct_models)
+
+def get_data(path=None):
+    """Cached demand history; reloads only when the data file changes."""
+    return REGISTRY.get('data', path or DATA_PATH, load_data)
+
+def get_last_dates(path=None):
+    """Cached last history date per product_id; refreshed together with the data file."""
+    loader = lambda p: load_data(p, columns=['product_id', 'date']).groupby('product_id')['date'].max()
+    return REGISTRY.get('last_dates', path or DATA_PATH, loader)
+
+def registry_stats():
+    return REGISTRY.stats()
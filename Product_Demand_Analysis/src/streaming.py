@@ -0,0 +1,179 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.data_processing import DATA_PATH, PROJECT_ROOT, ROLLING_FEATURES, create_lag_features
+
+DEFAULT_LAGS = [1, 7, 14, 28, 42, 60]
+DEFAULT_CHUNK_ROWS = 500_000
+FEATURE_DIR = os.path.join(PROJECT_ROOT, 'data', 'features')
+
+# --- 1. Raw data in date-ordered chunks ---
+
+def iter_raw_chunks(path=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield the raw CSV in chunks of roughly `chunk_rows` rows.
+
+    The file must be ordered by date (data_sample.py writes it that way).
+    Every chunk holds whole days: rows of the last date in a read block are
+    held back and emitted with the next chunk.
+    """
+    path = path or DATA_PATH
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Could not find data file at: {path}")
+
+    pending = None
+    last_date = None
+    for block in pd.read_csv(path, parse_dates=['date'], chunksize=chunk_rows):
+        if pending is not None:
+            block = pd.concat([pending, block], ignore_index=True)
+        if not block['date'].is_monotonic_increasing or (last_date is not None and block['date'].iloc[0] <= last_date):
+            raise ValueError("Streaming mode needs the data file ordered by date")
+
+        boundary = block['date'].iloc[-1]
+        ready = block[block['date'] < boundary]
+        pending = block[block['date'] == boundary]
+        if len(ready):
+            last_date = ready['date'].iloc[-1]
+            yield ready
+
+    if pending is not None and len(pending):
+        yield pending
+
+def scan_history(path=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """One cheap pass over the raw data: per-product price sum/count/mean and the date range."""
+    sums = None
+    min_date, max_date, rows = None, None, 0
+    for chunk in iter_raw_chunks(path, chunk_rows):
+        agg = chunk.groupby('product_id')['price'].agg(['sum', 'count'])
+        sums = agg if sums is None else sums.add(agg, fill_value=0)
+        min_date = chunk['date'].iloc[0] if min_date is None else min_date
+        max_date = chunk['date'].iloc[-1]
+        rows += len(chunk)
+
+    if sums is None:
+        raise ValueError("Data file is empty")
+    return {
+        'price_stats': sums,
+        'price_means': sums['sum'] / sums['count'],
+        'product_ids': sorted(sums.index),
+        'min_date': min_date,
+        'max_date': max_date,
+        'rows': rows,
+    }
+
+# --- 2. Feature chunks with lookback carry-over ---
+
+def lookback_rows(lags=DEFAULT_LAGS):
+    """Rows per product a chunk needs from the past to compute every feature."""
+    return max(max(lags), max(window + 1 for _, _, window in ROLLING_FEATURES))
+
+class LookbackFeatureBuilder:
+    """Turns consecutive raw chunks into feature rows, carrying per-product tails.
+
+    Only the last `lookback_rows(lags)` rows per product are kept between
+    calls. `carry` can be restored from disk to resume where a previous run
+    stopped (see src.feature_store).
+    """
+
+    def __init__(self, lags=DEFAULT_LAGS, price_means=None, carry=None):
+        self.lags = list(lags)
+        self.lookback = lookback_rows(self.lags)
+        self.price_means = price_means
+        self.carry = carry
+
+    def step(self, chunk):
+        """Feature rows for the dates in `chunk` (all later than the carried rows)."""
+        frame = chunk if self.carry is None else pd.concat([self.carry, chunk], ignore_index=True)
+        frame = frame.sort_values(['product_id', 'date'], kind='stable', ignore_index=True)
+
+        feats = create_lag_features(frame, self.lags, price_means=self.price_means)
+        feats = feats[feats['date'] >= chunk['date'].min()]
+        self.carry = frame.groupby('product_id', sort=False).tail(self.lookback).reset_index(drop=True)
+        return feats
+
+def stream_lag_features(path=None, lags=DEFAULT_LAGS, chunk_rows=DEFAULT_CHUNK_ROWS, price_means=None):
+    """Generator of create_lag_features output, one date-ordered chunk at a time.
+
+    Only the last `lookback_rows(lags)` rows per product are carried from one
+    chunk to the next, so peak memory is bounded by the chunk size plus
+    products x lookback, not by the length of the history. The union of the
+    chunks equals create_lag_features(load_data()) when price_means holds the
+    full-history means (computed with scan_history if not given).
+    """
+    if price_means is None:
+        price_means = scan_history(path, chunk_rows)['price_means']
+
+    builder = LookbackFeatureBuilder(lags, price_means=price_means)
+    for chunk in iter_raw_chunks(path, chunk_rows):
+        feats = builder.step(chunk)
+        if len(feats):
+            yield feats
+
+def write_feature_partitions(out_dir=None, columns=None, **stream_kwargs):
+    """Write stream_lag_features chunks as numbered Parquet files; returns their paths."""
+    out_dir = out_dir or FEATURE_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(out_dir, 'part-*.parquet')):
+        os.remove(old)
+
+    paths = []
+    for i, feats in enumerate(stream_lag_features(**stream_kwargs)):
+        if columns is not None:
+            feats = feats[columns]
+        part = os.path.join(out_dir, f'part-{i:05d}.parquet')
+        feats.to_parquet(part, index=False)
+        paths.append(part)
+    return paths
+
+# --- 3. Out-of-core access for LightGBM ---
+# (the lightgbm.Sequence itself is src.feature_sequence.FeaturePartitionSequence)
+
+def category_lists(product_ids):
+    """Category order train.py would get from .astype('category') on the full history."""
+    return {
+        'product_id': sorted(product_ids),
+        'product_month_interaction': sorted(f"{pid}_{m}" for pid in product_ids for m in range(1, 13)),
+    }
+
+def encode_features(df, feature_cols, categories, dtype=np.float64):
+    """Float matrix of feature_cols with categorical columns replaced by their codes."""
+    X = np.empty((len(df), len(feature_cols)), dtype=dtype)
+    for j, col in enumerate(feature_cols):
+        if col in categories:
+            codes = pd.Categorical(df[col], categories=categories[col]).codes.astype(float)
+            codes[codes < 0] = np.nan
+            X[:, j] = codes
+        else:
+            X[:, j] = df[col].to_numpy(dtype=dtype)
+    return X
+
+# --- 4. Streaming evaluation ---
+
+class StreamingMetrics:
+    """MAE / RMSE / R² accumulated chunk by chunk in O(1) memory."""
+
+    def __init__(self):
+        self.n = 0
+        self.abs_err = 0.0
+        self.sq_err = 0.0
+        self.y_sum = 0.0
+        self.y_sq_sum = 0.0
+
+    def update(self, y_true, y_pred):
+        y_true = np.asarray(y_true, dtype=float)
+        err = y_true - np.asarray(y_pred, dtype=float)
+        self.n += len(y_true)
+        self.abs_err += np.abs(err).sum()
+        self.sq_err += (err ** 2).sum()
+        self.y_sum += y_true.sum()
+        self.y_sq_sum += (y_true ** 2).sum()
+
+    def result(self):
+        total = self.y_sq_sum - self.y_sum ** 2 / self.n
+        return {
+            'mae': float(self.abs_err / self.n),
+            'rmse': float(np.sqrt(self.sq_err / self.n)),
+            'r2': float(1 - self.sq_err / total),
+        }
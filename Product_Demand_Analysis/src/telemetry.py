@@ -0,0 +1,181 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+logger = logging.getLogger('demand.telemetry')
+
+# Seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = False
+_log_spans = False
+_lock = threading.Lock()
+_local = threading.local()
+_counters = {}    # (name, labels) -> float
+_histograms = {}  # (name, labels) -> {'buckets', 'counts', 'sum', 'count'}
+_NULL_SPAN = nullcontext()
+
+# --- 1. Switching on and off ---
+
+def enable(log_spans=True, level=logging.INFO):
+    """Start recording metrics; span timings also go to the 'demand.telemetry' logger.
+
+    Pass level=logging.DEBUG to log nested spans too.
+    """
+    global _enabled, _log_spans
+    _enabled = True
+    _log_spans = log_spans
+    if log_spans and not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+# --- 2. Metrics ---
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add to a counter (no-op while disabled)."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Record a value in a histogram (no-op while disabled)."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {'buckets': tuple(buckets), 'counts': [0] * (len(buckets) + 1),
+                                       'sum': 0.0, 'count': 0}
+        hist['counts'][bisect.bisect_left(hist['buckets'], value)] += 1
+        hist['sum'] += value
+        hist['count'] += 1
+
+# --- 3. Spans ---
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'start', 'parent')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1] if stack else None
+        stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _local.stack.pop()
+        observe('span_duration_seconds', duration, span=self.name)
+        if exc_type is not None:
+            inc('span_errors_total', span=self.name)
+        # Top-level spans log at INFO, nested ones (e.g. each forecast step) at DEBUG
+        level = logging.DEBUG if self.parent else logging.INFO
+        if _log_spans and logger.isEnabledFor(level):
+            record = {'event': 'span', 'span': self.name, 'parent': self.parent,
+                      'duration_ms': round(duration * 1000, 3), 'ok': exc_type is None}
+            record.update(self.attrs)
+            logger.log(level, json.dumps(record, default=str))
+        return False
+
+def span(name, **attrs):
+    """Context manager timing a block; a shared no-op while disabled."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+def traced(name):
+    """Decorator form of span(); costs one flag check per call while disabled."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- 4. Snapshots ---
+
+def snapshot():
+    """All counters and histograms as a JSON-serialisable dict."""
+    with _lock:
+        return {
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+            'histograms': [
+                {'name': name, 'labels': dict(labels), 'buckets': list(h['buckets']),
+                 'counts': list(h['counts']), 'sum': h['sum'], 'count': h['count']}
+                for (name, labels), h in sorted(_histograms.items())
+            ],
+        }
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+def prometheus_text():
+    """Counters and histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        typed = set()
+        for (name, labels), value in sorted(_counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_labels_text(labels)} {value}')
+        for (name, labels), h in sorted(_histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(list(h['buckets']) + ['+Inf'], h['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels_text(labels, {"le": bound})} {cumulative}')
+            lines.append(f'{name}_sum{_labels_text(labels)} {h["sum"]}')
+            lines.append(f'{name}_count{_labels_text(labels)} {h["count"]}')
+    return '\n'.join(lines) + '\n'
+
+def write_snapshot(path):
+    """Write the snapshot as Prometheus text (.prom/.txt) or JSON (anything else)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        if path.endswith(('.prom', '.txt')):
+            f.write(prometheus_text())
+        else:
+            json.dump(snapshot(), f, indent=2)
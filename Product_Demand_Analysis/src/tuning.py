@@ -0,0 +1,210 @@
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+from src.data_processing import DATA_PATH, PROJECT_ROOT
+from src.model import CATEGORICAL_FEATURES, booster_params
+
+TUNING_DIR = os.path.join(PROJECT_ROOT, 'data', 'tuning')
+
+# Candidates are drawn from this grid; unlisted parameters keep MODEL_PARAMS values
+SEARCH_SPACE = {
+    'learning_rate': [0.01, 0.03, 0.05],
+    'num_leaves': [31, 50, 127],
+    'max_depth': [8, 12, -1],
+    'min_child_samples': [15, 50, 100],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'reg_lambda': [0.1, 1.0, 5.0],
+}
+
+# --- 1. Shared feature matrix ---
+
+def prepare_matrix(df, feature_cols, work_dir, target='demand'):
+    """Write the date-ordered feature matrix, labels and day index as .npy files.
+
+    Rows are sorted by date, so every rolling-origin fold is a contiguous
+    prefix (train) followed by a slice (validation): workers open the files
+    with mmap_mode='r' and hand LightGBM views without copying, and all
+    processes share the same page cache.
+    """
+    from src.streaming import category_lists, encode_features
+
+    os.makedirs(work_dir, exist_ok=True)
+    meta_path = os.path.join(work_dir, 'matrix.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta['features'] == list(feature_cols):
+            return meta
+
+    df = df.sort_values('date', kind='stable')
+    categories = category_lists(df['product_id'].unique())
+    X = np.lib.format.open_memmap(os.path.join(work_dir, 'X.npy'), mode='w+',
+                                  dtype=np.float32, shape=(len(df), len(feature_cols)))
+    # Column by column keeps the float64 intermediate to one column
+    for j, col in enumerate(feature_cols):
+        X[:, j] = encode_features(df[[col]], [col], categories, dtype=np.float32)[:, 0]
+    X.flush()
+    del X
+    np.save(os.path.join(work_dir, 'y.npy'), df[target].to_numpy(dtype=np.float32))
+
+    dates = pd.DatetimeIndex(df['date'])
+    day = (dates - dates.min()).days.to_numpy().astype(np.int32)
+    np.save(os.path.join(work_dir, 'day.npy'), day)
+
+    meta = {
+        'features': list(feature_cols),
+        'categorical': [c for c in feature_cols if c in CATEGORICAL_FEATURES],
+        'rows': int(len(df)),
+        'first_date': str(dates.min().date()),
+        'last_day': int(day[-1]),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def rolling_origin_folds(last_day, n_folds=3, horizon=30, holdout=90):
+    """(train_end_day, val_end_day) pairs; validation windows tile back from the holdout."""
+    end = last_day - holdout
+    folds = [(end - horizon * (n_folds - i), end - horizon * (n_folds - i - 1)) for i in range(n_folds)]
+    if folds[0][0] <= 0:
+        raise ValueError("Not enough history for the requested folds")
+    return folds
+
+def sample_candidates(n_trials, seed=42, space=None):
+    """n_trials distinct parameter overrides drawn from the search space; the first is the default."""
+    space = space or SEARCH_SPACE
+    names = sorted(space)
+    grid = list(itertools.product(*(space[n] for n in names)))
+    random.Random(seed).shuffle(grid)
+    return [{}] + [dict(zip(names, values)) for values in grid[:max(0, n_trials - 1)]]
+
+# --- 2. Workers ---
+
+_worker = {}
+
+def _init_worker(work_dir, num_threads):
+    _worker['X'] = np.load(os.path.join(work_dir, 'X.npy'), mmap_mode='r')
+    _worker['y'] = np.load(os.path.join(work_dir, 'y.npy'), mmap_mode='r')
+    _worker['day'] = np.load(os.path.join(work_dir, 'day.npy'), mmap_mode='r')
+    with open(os.path.join(work_dir, 'matrix.json')) as f:
+        _worker['meta'] = json.load(f)
+    _worker['num_threads'] = num_threads
+
+def _run_fold(task):
+    import lightgbm as lgb
+
+    X, y, day, meta = _worker['X'], _worker['y'], _worker['day'], _worker['meta']
+    n_train = int(np.searchsorted(day, task['train_end'], side='right'))
+    n_val = int(np.searchsorted(day, task['val_end'], side='right'))
+
+    params, _ = booster_params(dict(task['params'], n_jobs=_worker['num_threads']))
+    train_set = lgb.Dataset(X[:n_train], label=y[:n_train], feature_name=meta['features'],
+                            categorical_feature=meta['categorical'], params=params, free_raw_data=True)
+    val_set = lgb.Dataset(X[n_train:n_val], label=y[n_train:n_val], reference=train_set)
+    booster = lgb.train(params, train_set, num_boost_round=task['max_rounds'], valid_sets=[val_set],
+                        callbacks=[lgb.early_stopping(task['early_stopping'], verbose=False)])
+
+    pred = np.maximum(0, booster.predict(X[n_train:n_val], num_iteration=booster.best_iteration))
+    err = np.asarray(y[n_train:n_val], dtype=float) - pred
+    return dict(task, rmse=float(np.sqrt(np.mean(err ** 2))), mae=float(np.mean(np.abs(err))),
+                best_iteration=int(booster.best_iteration), train_rows=n_train, val_rows=n_val - n_train)
+
+# --- 3. Search driver ---
+
+def task_key(data_key, params, fold, max_rounds, early_stopping):
+    blob = json.dumps([data_key, params, fold, max_rounds, early_stopping], sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+def load_results(path):
+    """Completed fold results by key; a torn last line from an interrupted run is ignored."""
+    results = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                results[record['key']] = record
+    return results
+
+def plan_workers(rows, n_features, workers=None, memory_budget_mb=None):
+    """(processes, threads per process) that fit all cores into the memory budget.
+
+    A worker holds LightGBM's binned copy of its training rows (about one
+    byte per value, plus histogram and bookkeeping overhead); the float32
+    matrix itself is shared through the page cache.
+    """
+    cores = os.cpu_count() or 1
+    workers = workers or cores
+    if memory_budget_mb:
+        per_worker_mb = rows * n_features * 3 / 2**20 + 200
+        workers = min(workers, max(1, int(memory_budget_mb // per_worker_mb)))
+    workers = max(1, min(workers, cores))
+    return workers, max(1, cores // workers)
+
+def run_search(df, feature_cols, n_trials=8, n_folds=3, horizon=30, max_rounds=2000, early_stopping=100,
+               workers=None, memory_budget_mb=None, seed=42, work_dir=None, data_key=None):
+    """Rolling-origin CV over sampled candidates in a process pool; resumes from cached results.
+
+    Returns candidates ranked by mean validation RMSE, each with its mean
+    best iteration across folds.
+    """
+    data_key = data_key or hashlib.sha256(json.dumps(list(feature_cols)).encode()).hexdigest()[:16]
+    work_dir = work_dir or os.path.join(TUNING_DIR, data_key)
+    meta = prepare_matrix(df, feature_cols, work_dir)
+    folds = rolling_origin_folds(meta['last_day'], n_folds, horizon)
+    candidates = sample_candidates(n_trials, seed)
+
+    results_path = os.path.join(work_dir, 'results.jsonl')
+    done = load_results(results_path)
+    tasks = []
+    for cid, params in enumerate(candidates):
+        for train_end, val_end in folds:
+            key = task_key(data_key, params, [train_end, val_end], max_rounds, early_stopping)
+            if key not in done:
+                tasks.append({'key': key, 'candidate': cid, 'params': params, 'train_end': train_end,
+                              'val_end': val_end, 'max_rounds': max_rounds, 'early_stopping': early_stopping})
+
+    n_workers, threads = plan_workers(meta['rows'], len(feature_cols), workers, memory_budget_mb)
+    print(f"{len(candidates)} candidates x {len(folds)} folds: {len(tasks)} to run, "
+          f"{len(candidates) * len(folds) - len(tasks)} cached; {n_workers} workers x {threads} threads")
+
+    if tasks:
+        ctx = mp.get_context('spawn')  # LightGBM's OpenMP runtime is not fork-safe
+        with ProcessPoolExecutor(n_workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(work_dir, threads)) as pool, open(results_path, 'a') as out:
+            futures = [pool.submit(_run_fold, task) for task in tasks]
+            for i, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                done[record['key']] = record
+                print(f"  [{i}/{len(tasks)}] candidate {record['candidate']} fold ending day {record['val_end']}: "
+                      f"RMSE {record['rmse']:.3f} ({record['best_iteration']} rounds)", flush=True)
+
+    ranked = []
+    for cid, params in enumerate(candidates):
+        keys = [task_key(data_key, params, [a, b], max_rounds, early_stopping) for a, b in folds]
+        rows = [done[k] for k in keys]
+        ranked.append({
+            'params': params,
+            'rmse': float(np.mean([r['rmse'] for r in rows])),
+            'mae': float(np.mean([r['mae'] for r in rows])),
+            'best_iteration': int(np.mean([r['best_iteration'] for r in rows])),
+        })
+    ranked.sort(key=lambda r: r['rmse'])
+    return ranked
+
+def data_fingerprint(path=None, feature_cols=()):
+    """Tuning work-dir key: raw data file digest plus the feature list."""
+    from src.registry import file_digest
+    return hashlib.sha256((file_digest(path or DATA_PATH) + json.dumps(list(feature_cols))).encode()).hexdigest()[:16]
@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from backtest import origin_dates, out_of_sample
+
+def test_origin_on_trained_through_is_out_of_sample():
+    # train.py records trained_through = max_date - 90, the default latest origin
+    origins = origin_dates('2024-12-31', horizon=90, n_origins=4)
+    kept = out_of_sample(origins, '2024-10-02')
+    assert list(kept) == [pd.Timestamp('2024-10-02')]
+
+def test_origins_before_trained_through_are_dropped():
+    origins = origin_dates('2024-12-31', horizon=60, n_origins=10)
+    kept = out_of_sample(origins, '2024-10-02')
+    assert (kept >= pd.Timestamp('2024-10-02')).all()
+    assert len(kept) == (origins >= pd.Timestamp('2024-10-02')).sum()
+
+def test_all_in_sample_raises_unless_allowed():
+    origins = origin_dates('2024-12-31', horizon=120, n_origins=3)
+    with pytest.raises(ValueError):
+        out_of_sample(origins, '2024-10-02')
+    assert list(out_of_sample(origins, '2024-10-02', allow_in_sample=True)) == list(origins)
+
+def test_no_trained_through_keeps_every_origin():
+    origins = origin_dates('2024-12-31', n_origins=3)
+    assert list(out_of_sample(origins, None)) == list(origins)
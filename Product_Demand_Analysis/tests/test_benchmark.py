@@ -0,0 +1,33 @@
+import multiprocessing as mp
+import os
+
+import pytest
+
+from benchmark import _wait_for_result
+
+def _send(queue):
+    queue.put(('ok', [1, 2]))
+
+def _crash(queue):
+    os._exit(3)
+
+@pytest.fixture
+def ctx():
+    if 'fork' not in mp.get_all_start_methods():
+        pytest.skip('needs the fork start method')
+    return mp.get_context('fork')
+
+def test_result_is_returned(ctx):
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_send, args=(queue,))
+    proc.start()
+    assert _wait_for_result(queue, proc, poll=0.1) == ('ok', [1, 2])
+    proc.join()
+
+def test_dead_process_reports_its_exit_code(ctx):
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_crash, args=(queue,))
+    proc.start()
+    status, payload = _wait_for_result(queue, proc, poll=0.1)
+    assert status == 'error'
+    assert 'exited with code 3' in payload
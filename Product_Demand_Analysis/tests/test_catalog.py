@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from data_sample import write_dataset
+from src.catalog import load_catalog
+from src.data_processing import build_catalog, load_data
+
+def assert_offsets_match(path):
+    df = load_data(path)
+    catalog = load_catalog(path)
+    assert catalog['rows'] == len(df)
+    for entry in catalog['products']:
+        block = df.iloc[entry['row_start']:entry['row_end']]
+        assert len(block) == entry['rows']
+        assert (block['product_id'] == entry['product_id']).all()
+        assert block['date'].is_monotonic_increasing
+        assert block['date'].iloc[0].strftime('%Y-%m-%d') == entry['first_date']
+        assert block['date'].iloc[-1].strftime('%Y-%m-%d') == entry['last_date']
+    return df, catalog
+
+def test_parquet_dataset_is_loaded_sorted_and_offsets_match(tmp_path):
+    # The generator writes Parquet in date order, interleaving products
+    path = str(tmp_path / 'demand.parquet')
+    write_dataset(path, n_products=4, start='2023-01-01', end='2023-03-31', chunk_rows=50)
+
+    df, catalog = assert_offsets_match(path)
+    assert df['product_id'].is_monotonic_increasing
+    assert all(entry['row_groups'] is None for entry in catalog['products'])
+
+def test_parquet_dataset_column_subset(tmp_path):
+    path = str(tmp_path / 'demand.parquet')
+    write_dataset(path, n_products=3, start='2023-01-01', end='2023-01-31')
+
+    subset = load_data(path, columns=['demand'])
+    assert list(subset.columns) == ['demand']
+    assert subset['demand'].tolist() == load_data(path)['demand'].tolist()
+
+def test_csv_dataset_offsets_match(tmp_path):
+    path = str(tmp_path / 'demand.csv.gz')
+    write_dataset(path, n_products=4, start='2023-01-01', end='2023-03-31', chunk_rows=50)
+
+    _, catalog = assert_offsets_match(path)
+    assert all(entry['row_groups'] is not None for entry in catalog['products'])
+
+@pytest.mark.parametrize('name', ['demand.csv.gz', 'demand.parquet'])
+def test_write_dataset_catalog_matches_full_scan(tmp_path, name):
+    path = str(tmp_path / name)
+    write_dataset(path, n_products=5, start='2023-01-01', end='2023-02-28', chunk_rows=40)
+
+    # Written from the chunks: fresh without reading the data back
+    streamed = load_catalog(path)
+    assert not (tmp_path / 'demand.parquet').exists() or name.endswith('.parquet')
+
+    scanned = build_catalog(load_data(path, use_cache=name.endswith('.parquet')), path)
+    assert streamed == scanned
+    assert_offsets_match(path)
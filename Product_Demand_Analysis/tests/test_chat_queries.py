@@ -0,0 +1,70 @@
+import pytest
+
+from src.chat_queries import parse_query
+from src.product_matcher import ProductMatcher, as_matcher
+
+NAMES = {
+    'P001': 'Coffee_Beans_Arabica', 'P002': 'Espresso_Machine_V1', 'P005': 'Chai_Latte_Mix',
+    'P012': 'Honey_Local_12oz', 'P020': 'Decaf_Blend_House',
+}
+
+@pytest.fixture(scope='module')
+def matcher():
+    return ProductMatcher(NAMES)
+
+@pytest.mark.parametrize('query, pid, days', [
+    ('forecast P001 for the whole month', 'P001', 30),
+    ('chai latte mix for the entire month', 'P005', 30),
+    ('each day for P005', 'P005', 7),
+    ('most likely demand for chai latte mix', 'P005', 7),
+    ('what is the best week for P001', 'P001', 7),
+    ('all products? no, just P012 for 10 days', 'P012', 10),
+    ('top 5 for chai latte mix next month', 'P005', 30),
+])
+def test_single_product_is_not_widened(matcher, query, pid, days):
+    assert parse_query(query, matcher) == (([pid], days, 'single', None, None))
+
+@pytest.mark.parametrize('query, rank, top_n', [
+    ('forecast all products for 30 days', None, None),
+    ('forecast every product next week', None, None),
+    ('forecast everything for 30 days', None, None),
+    ('the whole catalog next month', None, None),
+    ('top 3 products next week', 'top', 3),
+    ('top products next week', 'top', 5),
+    ('best 2 for 14 days', 'top', 2),
+    ('bottom 4 products', 'bottom', 4),
+])
+def test_all_products(matcher, query, rank, top_n):
+    q = parse_query(query, matcher)
+    assert (q.scope, q.rank, q.top_n) == ('all', rank, top_n)
+    assert q.product_ids == list(NAMES)
+
+@pytest.mark.parametrize('query', ['most likely demand next week', 'the whole month', 'each day', 'hello'])
+def test_no_product_no_widening(matcher, query):
+    assert parse_query(query, matcher) is None
+
+def test_list_of_products(matcher):
+    q = parse_query('chai latte mix and P001 and honey local 12oz for 2 weeks', matcher)
+    assert (q.product_ids, q.days, q.scope, q.rank) == (['P005', 'P001', 'P012'], 14, 'list', None)
+
+def test_ranking_of_listed_products(matcher):
+    q = parse_query('top 2 of P001, P002 and P020', matcher)
+    assert (q.product_ids, q.scope, q.rank, q.top_n) == (['P001', 'P002', 'P020'], 'list', 'top', 2)
+
+def test_typo_falls_back_to_one_product(matcher):
+    assert parse_query('cofee beans arabika 5 days', matcher).product_ids == ['P001']
+
+def test_parse_user_query_wrappers():
+    import chatbot
+    import chatbot_streamlit
+
+    product_map = {'coffee_beans_arabica': 'P001', 'chai_latte_mix': 'P005'}
+    for module in (chatbot, chatbot_streamlit):
+        assert module.parse_user_query('chai latte mix for 2 weeks', product_map) == ('P005', 14)
+        assert module.parse_user_query('P001 and P005 next month', product_map) == ('P001', 30)
+        assert module.parse_user_query('all products for 3 days', product_map) == (None, 3)
+        assert module.parse_user_query('what about the weather', product_map) == (None, 7)
+
+def test_name_map_matcher_is_built_once():
+    product_map = {'coffee_beans_arabica': 'P001', 'chai_latte_mix': 'P005'}
+    assert as_matcher(product_map) is as_matcher(dict(product_map))
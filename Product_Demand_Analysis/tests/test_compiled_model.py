@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+lightgbm = pytest.importorskip('lightgbm')
+
+from src.compiled_model import compile_model, export_model, load_compiled_model
+
+@pytest.fixture(scope='module')
+def model_and_rows():
+    rng = np.random.default_rng(0)
+    n = 2000
+    X = pd.DataFrame({
+        'x': rng.normal(size=n),
+        'zeros': np.where(rng.random(n) < 0.3, 0.0, rng.normal(size=n)),
+        'gaps': np.where(rng.random(n) < 0.2, np.nan, rng.normal(size=n)),
+        'cat': pd.Categorical(rng.integers(0, 40, n)),
+    })
+    y = (X['x'] * 3 + np.nan_to_num(X['gaps']) + X['cat'].cat.codes % 7 + rng.normal(size=n)).to_numpy()
+    model = lightgbm.LGBMRegressor(n_estimators=40, num_leaves=15, min_child_samples=5, verbose=-1)
+    model.fit(X, y)
+
+    rows = X.assign(cat=X['cat'].cat.codes.astype(float)).to_numpy(dtype=float)
+    # Unseen and missing categories, NaN where training had none
+    rows[:5, 3] = [45.0, np.nan, -1.0, 0.0, 39.0]
+    rows[5:10, 0] = np.nan
+    return model, rows
+
+def test_compiled_predictions_match_booster(model_and_rows):
+    model, rows = model_and_rows
+    compiled = compile_model(model)
+    assert np.array_equal(compiled.predict(rows), model.booster_.predict(rows))
+    assert np.array_equal(compiled.predict(rows[0]), model.booster_.predict(rows[:1]))
+
+def test_export_round_trip(model_and_rows, tmp_path):
+    model, rows = model_and_rows
+    path = str(tmp_path / 'model.npz')
+    export_model(model, path)
+    loaded = load_compiled_model(path)
+    assert loaded.num_trees() == model.booster_.num_trees()
+    assert np.array_equal(loaded.predict(rows), model.booster_.predict(rows))
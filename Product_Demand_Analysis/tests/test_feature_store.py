@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_sample import write_dataset
+from src.data_processing import ROLLING_FEATURES, create_lag_features
+from src.feature_store import FeatureStore
+from src.streaming import DEFAULT_LAGS
+
+CUTOFF = pd.Timestamp('2022-06-30')
+
+def by_product(df):
+    df = df.astype({'product_id': str, 'product_name': str, 'product_month_interaction': str})
+    return df.sort_values(['product_id', 'date']).reset_index(drop=True)
+
+@pytest.fixture(scope='module')
+def raw(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('raw') / 'full.csv.gz')
+    write_dataset(path, catalog=False, n_products=5, start='2022-01-01', end='2022-08-31')
+    return pd.read_csv(path, parse_dates=['date'])
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory, raw):
+    tmp = tmp_path_factory.mktemp('store')
+    head_path = str(tmp / 'head.csv.gz')
+    raw[raw['date'] <= CUTOFF].to_csv(head_path, index=False, date_format='%Y-%m-%d')
+    store = FeatureStore(root=str(tmp / 'appended')).build(head_path, chunk_rows=64)
+    tail = raw[raw['date'] > CUTOFF]
+    # Two daily-refresh style batches
+    for month in (7, 8):
+        store.append(tail[tail['date'].dt.month == month])
+
+    return by_product(store.read()), by_product(create_lag_features(raw))
+
+def test_append_matches_full_recompute(stores):
+    stored, full = stores
+    assert len(stored) == len(full)
+    assert (stored[['product_id', 'date']] == full[['product_id', 'date']]).all().all()
+
+    exact = [f'{kind}_lag_{lag}' for lag in DEFAULT_LAGS for kind in ('demand', 'price')]
+    exact += [name for name, _, _ in ROLLING_FEATURES] + ['demand', 'price', 'days_elapsed']
+    for name in exact:
+        np.testing.assert_allclose(stored[name].to_numpy(dtype=float), full[name].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9, err_msg=name)
+
+def test_price_ratio_uses_the_running_mean(stores, raw):
+    # Each batch's rows are scaled by the product's price mean up to the end of that batch;
+    # a full recompute would use the full-history mean
+    stored, full = stores
+    expected = np.empty(len(stored))
+    for end in (CUTOFF, pd.Timestamp('2022-07-31'), pd.Timestamp('2022-08-31')):
+        start = end - pd.offsets.MonthEnd(1) if end != CUTOFF else pd.Timestamp.min
+        means = raw[raw['date'] <= end].groupby('product_id')['price'].mean()
+        rows = ((stored['date'] > start) & (stored['date'] <= end)).to_numpy()
+        expected[rows] = stored.loc[rows, 'price'] / stored.loc[rows, 'product_id'].map(means)
+    np.testing.assert_allclose(stored['price_ratio'].to_numpy(), expected, rtol=1e-12)
+
+    drift = np.abs(stored['price_ratio'].to_numpy() - full['price_ratio'].to_numpy())
+    assert 0 < drift.max() < 0.01
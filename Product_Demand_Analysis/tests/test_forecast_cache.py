@@ -0,0 +1,32 @@
+import sqlite3
+
+from src.forecast_cache import ForecastCache
+
+def forecast(days, value=1.0):
+    return [{'date': f'2025-01-{d + 1:02d}', 'predicted_demand': value} for d in range(days)]
+
+def test_put_many_writes_one_transaction(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ForecastCache(disk_path=path)
+
+    connects = []
+    real_connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, 'connect', lambda *a, **k: connects.append(a) or real_connect(*a, **k))
+    cache.put_many([(f'P{i:03d}', '2024-12-31', forecast(7)) for i in range(500)], 'model-1')
+    assert len(connects) == 1
+    monkeypatch.undo()
+
+    # Served from disk after a restart
+    restarted = ForecastCache(disk_path=path)
+    assert restarted.get('P123', '2024-12-31', 'model-1', 5) == forecast(5)
+    assert restarted.stats()['disk_hits'] == 1
+
+def test_put_many_keeps_the_longest_forecast(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = ForecastCache(disk_path=path)
+    cache.put_many([('P001', '2024-12-31', forecast(30, 2.0))], 'model-1')
+    cache.put_many([('P001', '2024-12-31', forecast(7, 3.0)), ('P002', '2024-12-31', forecast(7))], 'model-1')
+
+    for c in (cache, ForecastCache(disk_path=path)):
+        assert c.get('P001', '2024-12-31', 'model-1', 30) == forecast(30, 2.0)
+        assert c.get('P002', '2024-12-31', 'model-1', 7) == forecast(7)
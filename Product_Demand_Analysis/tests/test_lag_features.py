@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_processing import (ROLLING_FEATURES, create_lag_features, create_lag_features_reference,
+                                 grouped_rolling, product_blocks)
+
+def make_history(lengths, seed=0):
+    """Daily history per product; lengths maps product_id -> number of days."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for pid, n in lengths.items():
+        frames.append(pd.DataFrame({
+            'date': pd.date_range('2022-01-01', periods=n),
+            'product_id': pid,
+            'product_name': f'Name_{pid}',
+            'price': rng.uniform(5, 15, n).round(2),
+            'promotion': rng.integers(0, 2, n),
+            'demand': rng.integers(10, 100, n).astype(float),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+def assert_matches_reference(df, lags):
+    out = create_lag_features(df, lags=lags)
+    ref = create_lag_features_reference(df, lags=lags)
+
+    # Rows kept: complete input rows whose reference features are all defined
+    columns = [f'{kind}_lag_{lag}' for lag in lags for kind in ('demand', 'price')]
+    columns += [name for name, _, _ in ROLLING_FEATURES]
+    expected = df.index[df.notna().all(axis=1) & ref[columns].notna().all(axis=1)]
+    assert sorted(out.index) == sorted(expected)
+
+    for name in columns:
+        np.testing.assert_allclose(out[name].to_numpy(dtype=float), ref.loc[out.index, name].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9, err_msg=name)
+    return out
+
+def test_matches_reference():
+    assert_matches_reference(make_history({'P001': 200, 'P002': 150}), lags=[1, 7, 14, 28, 42, 60])
+
+def test_nan_demand_only_voids_its_own_windows():
+    df = make_history({'P001': 200, 'P002': 200})
+    baseline = create_lag_features(df)
+    df.loc[100, 'demand'] = np.nan
+
+    out = assert_matches_reference(df, lags=[1, 7, 14, 28, 42, 60])
+    # The NaN row and the rows whose lags/windows reach it drop out, nothing else
+    assert len(baseline) - len(out) < 100
+    assert (out['product_id'] == 'P002').sum() == (baseline['product_id'] == 'P002').sum()
+
+def test_unsorted_input():
+    df = make_history({'P001': 120, 'P002': 90, 'P003': 100})
+    df.loc[50, 'demand'] = np.nan
+    shuffled = df.sample(frac=1.0, random_state=1)
+    # Per-product order is by date in both; only the interleaving differs
+    shuffled = shuffled.sort_values('date', kind='stable')
+    assert_matches_reference(shuffled, lags=[1, 7, 14])
+
+def test_groups_shorter_than_the_window():
+    df = make_history({'P001': 100, 'P002': 20, 'P003': 5})
+    out = assert_matches_reference(df, lags=[1, 7])
+    # rolling_28_mean needs 29 rows, so the short products drop out entirely
+    assert set(out['product_id']) == {'P001'}
+
+@pytest.mark.parametrize('window', [7, 28])
+def test_short_groups_with_short_windows(window):
+    df = make_history({'P001': 40, 'P002': window + 3})
+    df.loc[45, 'demand'] = np.nan
+    ref = create_lag_features_reference(df, lags=[1])
+
+    codes, _ = pd.factorize(df['product_id'])
+    pos, perm = product_blocks(codes, 2)
+    assert perm is None
+    values = df['demand'].to_numpy(dtype=float)
+    for name, stat, w in ROLLING_FEATURES:
+        if w != window:
+            continue
+        np.testing.assert_allclose(grouped_rolling(values, pos, w, stat=stat), ref[name].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9, err_msg=name)
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+lightgbm = pytest.importorskip('lightgbm')
+
+from predict import FULL_LAGS, forecast_products
+from src.data_processing import create_lag_features
+from train import select_feature_cols
+
+START_DATE = pd.Timestamp("2022-01-01")
+
+def base_features_reference(date, product_id):
+    """The original per-row calendar features."""
+    p_num = int(product_id[1:])
+    id_group = p_num % 2
+    days_elapsed = (date - START_DATE).days
+    trend_direction = 1 if id_group == 1 else -1
+    return {
+        'day': date.day, 'month': date.month, 'dayofweek': date.weekday(),
+        'is_weekend': 1 if date.weekday() >= 5 else 0,
+        'product_num': p_num, 'id_group': id_group, 'days_elapsed': days_elapsed,
+        'trend_direction': trend_direction, 'trend_sim': days_elapsed * trend_direction,
+        'day_of_year': date.dayofyear,
+        'sin_annual': np.sin(2 * np.pi * date.dayofyear / 365.25),
+        'cos_annual': np.cos(2 * np.pi * date.dayofyear / 365.25),
+        'is_christmas': 1 if (date.month == 12 and date.day == 25) else 0,
+        'is_newyear': 1 if (date.month == 1 and date.day == 1) else 0,
+        'is_july4': 1 if (date.month == 7 and date.day == 4) else 0,
+        'product_month_interaction': f"{product_id}_{date.month}",
+    }
+
+def forecast_reference(model, features, df, product_id, days_ahead):
+    """The original predict_for_product loop: one pandas row and predict call per day."""
+    df = df[df['product_id'] == product_id].sort_values('date')
+    avg_price = df['price'].mean()
+    history = df[['date', 'demand', 'price', 'promotion']].tail(100).copy()
+
+    preds = []
+    for _ in range(days_ahead):
+        current_date = history['date'].max() + pd.Timedelta(days=1)
+        row = base_features_reference(current_date, product_id)
+        row['product_id'] = product_id
+        row['price'] = history.iloc[-1]['price']
+        row['promotion'] = 0
+        row['price_diff'] = row['price'] - avg_price
+        row['price_ratio'] = row['price'] / avg_price
+
+        for lag in FULL_LAGS:
+            if lag <= len(history):
+                row[f'demand_lag_{lag}'] = history['demand'].iloc[-lag]
+                row[f'price_lag_{lag}'] = history['price'].iloc[-lag]
+            else:
+                row[f'demand_lag_{lag}'] = history['demand'].mean()
+                row[f'price_lag_{lag}'] = history['price'].mean()
+
+        row['rolling_7_mean'] = history['demand'].tail(7).mean()
+        row['rolling_28_mean'] = history['demand'].tail(28).mean()
+        row['rolling_7_std'] = history['demand'].tail(7).std()
+
+        X = pd.DataFrame([row])
+        X['product_id'] = X['product_id'].astype('category')
+        X['product_month_interaction'] = X['product_month_interaction'].astype('category')
+        pred = max(0, round(model.predict(X[features])[0], 0))
+
+        preds.append({'date': current_date.strftime('%Y-%m-%d'), 'predicted_demand': float(pred),
+                      'price': float(row['price'])})
+        history = pd.concat([history, pd.DataFrame([{'date': current_date, 'demand': pred,
+                                                     'price': row['price'], 'promotion': 0}])],
+                            ignore_index=True, sort=False)
+    return preds
+
+def make_history(lengths, seed=0):
+    """Weekly-seasonal daily demand; lengths maps product_id -> days, all ending on one date."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp('2023-06-30')
+    frames = []
+    for i, (pid, n) in enumerate(lengths.items()):
+        dates = pd.date_range(end=end, periods=n)
+        weekly = np.where(dates.weekday >= 5, 1.3, 1.0)
+        frames.append(pd.DataFrame({
+            'date': dates,
+            'product_id': pid,
+            'product_name': f'Name_{pid}',
+            'price': rng.uniform(8, 12, n).round(2),
+            'promotion': (rng.random(n) < 0.05).astype(int),
+            'demand': np.round((40 + 10 * i) * weekly + rng.normal(0, 5, n)).clip(0),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+@pytest.fixture(scope='module')
+def fitted():
+    # P003 and P004 have fewer days than the longest lag and the 7-day window
+    df = make_history({'P001': 400, 'P002': 400, 'P003': 40, 'P004': 5})
+    feats = create_lag_features(df)
+    features = select_feature_cols(feats.columns)
+    for col in ('product_id', 'product_month_interaction'):
+        feats[col] = feats[col].astype('category')
+    model = lightgbm.LGBMRegressor(n_estimators=60, num_leaves=15, min_child_samples=5,
+                                   random_state=0, verbose=-1)
+    model.fit(feats[features], feats['demand'], categorical_feature=['product_id', 'product_month_interaction'])
+    return model, features, df
+
+def test_matches_per_row_reference(fitted):
+    model, features, df = fitted
+    product_ids = ['P001', 'P002', 'P003', 'P004']
+    days_ahead = 75  # past the 60-day lag, so forecasts feed back into every lag
+
+    preds = forecast_products(model, features, df, product_ids, days_ahead)
+    for pid in product_ids:
+        assert preds[pid] == forecast_reference(model, features, df, pid, days_ahead), pid
+
+def test_forecast_does_not_depend_on_the_batch(fitted):
+    model, features, df = fitted
+    together = forecast_products(model, features, df, ['P004', 'P001', 'P003'], 20)
+    for pid in ['P001', 'P003', 'P004']:
+        assert together[pid] == forecast_products(model, features, df, [pid], 20)[pid]
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import serve
+from serve import ForecastService, HTTPError
+
+def test_concurrent_evaluations_are_shared_per_streaming_flag(monkeypatch):
+    calls = []
+
+    def fake_evaluate(streaming):
+        calls.append(streaming)
+        time.sleep(0.05)
+        return {'streaming': streaming}
+
+    monkeypatch.setattr(serve, '_evaluate', fake_evaluate)
+
+    async def run():
+        service = ForecastService()
+        try:
+            return await asyncio.gather(service.evaluate(False), service.evaluate(True),
+                                        service.evaluate(False), service.evaluate(True))
+        finally:
+            await service.close()
+
+    results = asyncio.run(run())
+    assert [r['streaming'] for r in results] == [False, True, False, True]
+    assert sorted(calls) == [False, True]
+
+def test_product_check_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def fake_last_dates():
+        threads.append(threading.current_thread())
+        return pd.Series([pd.Timestamp('2024-12-31')], index=['P001'])
+
+    monkeypatch.setattr(serve, 'get_last_dates', fake_last_dates)
+
+    async def run():
+        service = ForecastService()
+        try:
+            with pytest.raises(HTTPError) as e:
+                await service.forecast(['P999'], 7)
+            return e.value.status
+        finally:
+            await service.close()
+
+    assert asyncio.run(run()) == 404
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from data_sample import write_dataset
+from src.data_processing import create_lag_features, load_data
+from src.streaming import iter_raw_chunks, stream_lag_features
+
+def by_product(df):
+    df = df.astype({'product_id': str, 'product_name': str, 'product_month_interaction': str})
+    return df.sort_values(['product_id', 'date']).reset_index(drop=True)
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('stream') / 'demand.csv.gz')
+    write_dataset(path, catalog=False, n_products=6, start='2022-01-01', end='2022-07-31')
+    return path
+
+def test_chunks_split_read_blocks_but_keep_whole_days(dataset):
+    # 40 is not a multiple of 6 products, so read blocks end mid-day
+    chunks = list(iter_raw_chunks(dataset, chunk_rows=40))
+    assert len(chunks) > 10
+    days = [set(chunk['date']) for chunk in chunks]
+    for a, b in zip(days, days[1:]):
+        assert not a & b
+    assert all(len(chunk) == 6 * len(d) for chunk, d in zip(chunks, days))
+
+def test_union_of_chunks_equals_full_features(dataset):
+    streamed = pd.concat(list(stream_lag_features(dataset, chunk_rows=40)), ignore_index=True)
+    full = create_lag_features(load_data(dataset, use_cache=False))
+
+    assert set(streamed.columns) == set(full.columns)
+    streamed, full = by_product(streamed), by_product(full[streamed.columns])
+    assert len(streamed) == len(full)
+    pd.testing.assert_frame_equal(streamed, full, check_dtype=False, rtol=1e-9)
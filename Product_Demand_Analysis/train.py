@@ -1,25 +1,23 @@
+import argparse
+import json
+import os
 import pandas as pd
 import numpy as np
-from src.model import train_model
-from src.data_processing import load_data, create_lag_features, train_test_split_time_series
+from src import memory_profile, telemetry
+from src.compiled_model import export_model
+from src.model import (BASE_DIR, COMPILED_MODEL_PATH, MODEL_PATH, continue_training, list_versions, load_artifact, new_version_id,
+                       promote_version, rollback_model, save_model, set_version_status, train_direct_models,
+                       train_model, train_model_streaming, version_path)
+from src.registry import file_digest
+from src.data_processing import (DATA_PATH, load_data, create_lag_features, train_test_split_time_series,
+                                 format_memory_report, memory_report)
+from src.streaming import DEFAULT_CHUNK_ROWS, category_lists, scan_history, write_feature_partitions
 
-if __name__ == "__main__":
-    print("--- 1. Loading and Feature Engineering ---")
-    df = load_data()
-    df = create_lag_features(df)
-    
-    # Split: Train vs Hold-out Test (Last 90 days)
-    full_train_df, test_df = train_test_split_time_series(df, test_size_days=90)
-
-    # Split: Train vs Validation (Last 30 days of training)
-    max_train_date = full_train_df['date'].max()
-    split_val_date = max_train_date - pd.Timedelta(days=30)
-    
-    train_df = full_train_df[full_train_df['date'] <= split_val_date].copy()
-    val_df = full_train_df[full_train_df['date'] > split_val_date].copy()
+BEST_PARAMS_PATH = os.path.join(BASE_DIR, "models", "best_params.json")
 
+def select_feature_cols(columns):
     # Define Features
-    feature_cols = [c for c in train_df.columns if c not in [
+    feature_cols = [c for c in columns if c not in [
         "demand", "date", "product_name"
     ]]
     
@@ -27,19 +25,272 @@ if __name__ == "__main__":
     if 'product_id' in feature_cols:
         feature_cols.remove('product_id')
         feature_cols.insert(0, 'product_id')
+    return feature_cols
+
+def data_provenance():
+    return {'data_path': os.path.relpath(DATA_PATH, BASE_DIR), 'data_digest': file_digest(DATA_PATH)}
+
+def train_in_memory(compact=False, dataset_cache=False, params=None):
+    print("--- 1. Loading and Feature Engineering ---")
+    with memory_profile.stage('load_data'):
+        df = load_data(compact=compact)
+    with memory_profile.stage('create_lag_features'):
+        df = create_lag_features(df, compact=compact)
+    if compact:
+        print(format_memory_report(memory_report(df), label="Feature frame (compact)"))
+    
+    with memory_profile.stage('split'):
+        # Split: Train vs Hold-out Test (Last 90 days)
+        full_train_df, test_df = train_test_split_time_series(df, test_size_days=90)
+
+        # Split: Train vs Validation (Last 30 days of training)
+        max_train_date = full_train_df['date'].max()
+        split_val_date = max_train_date - pd.Timedelta(days=30)
+
+        train_df = full_train_df[full_train_df['date'] <= split_val_date].copy()
+        val_df = full_train_df[full_train_df['date'] > split_val_date].copy()
+
+    feature_cols = select_feature_cols(train_df.columns)
 
-    # Convert Categoricals
-    categorical_cols = ['product_id', 'product_month_interaction']
-    for col in categorical_cols:
-        if col in train_df.columns:
-            train_df[col] = train_df[col].astype('category')
-        if col in val_df.columns:
-            val_df[col] = val_df[col].astype('category')
+    with memory_profile.stage('categorical_conversion'):
+        # Convert Categoricals
+        categorical_cols = ['product_id', 'product_month_interaction']
+        for col in categorical_cols:
+            if col in train_df.columns:
+                train_df[col] = train_df[col].astype('category')
+            if col in val_df.columns:
+                val_df[col] = val_df[col].astype('category')
         
     print(f"Features: {len(feature_cols)}")
     print(f"Train Rows: {len(train_df)} | Val Rows: {len(val_df)}")
     
     print("\n--- 2. Training Model ---")
-    trained_model = train_model(train_df, feature_cols, val_df=val_df, target='demand')
+    with memory_profile.stage('train_model'):
+        metadata = dict(data_provenance(), mode='full', trained_through=str(max_train_date.date()),
+                        train_rows=len(train_df) + len(val_df), params=params or {})
+        return train_model(train_df, feature_cols, val_df=val_df, target='demand', compact=compact,
+                           params=params, dataset_cache=dataset_cache, metadata=metadata)
+
+def train_direct(origin_stride=5, params=None):
+    """Direct multi-horizon models, trained through the same cutoff as train_in_memory."""
+    print("--- 1. Loading Data ---")
+    with memory_profile.stage('load_data'):
+        df = load_data()
+    cutoff = df['date'].max() - pd.Timedelta(days=90)
+
+    print("\n--- 2. Training Direct Models ---")
+    with memory_profile.stage('train_direct_models'):
+        metadata = dict(data_provenance(), mode='direct', params=params or {})
+        return train_direct_models(df, cutoff, origin_stride=origin_stride, params=params, metadata=metadata)
+
+def train_streaming(chunk_rows=DEFAULT_CHUNK_ROWS, params=None):
+    """Same splits as train_in_memory, with features streamed to disk in chunks."""
+    from src.feature_sequence import FeaturePartitionSequence  # imports LightGBM
+
+    print("--- 1. Streaming Feature Engineering ---")
+    with memory_profile.stage('scan_history'):
+        stats = scan_history(chunk_rows=chunk_rows)
+    with memory_profile.stage('write_feature_partitions'):
+        paths = write_feature_partitions(chunk_rows=chunk_rows, price_means=stats['price_means'])
+    print(f"Wrote {len(paths)} feature partitions for {stats['rows']} raw rows")
+
+    # Split: Train vs Hold-out Test (Last 90 days), then last 30 days of training for validation
+    max_train_date = stats['max_date'] - pd.Timedelta(days=90)
+    split_val_date = max_train_date - pd.Timedelta(days=30)
+
+    feature_cols = select_feature_cols(pd.read_parquet(paths[0]).columns)
+    categories = category_lists(stats['product_ids'])
+
+    with memory_profile.stage('feature_sequences'):
+        train_seq = FeaturePartitionSequence(paths, feature_cols, categories, end_date=split_val_date)
+        val_seq = FeaturePartitionSequence(paths, feature_cols, categories,
+                                           start_date=split_val_date + pd.Timedelta(days=1),
+                                           end_date=max_train_date)
+
+    print(f"Features: {len(feature_cols)}")
+    print(f"Train Rows: {len(train_seq)} | Val Rows: {len(val_seq)}")
+
+    print("\n--- 2. Training Model ---")
+    with memory_profile.stage('train_model_streaming'):
+        metadata = dict(data_provenance(), mode='streaming', trained_through=str(max_train_date.date()),
+                        train_rows=len(train_seq) + len(val_seq), params=params or {})
+        return train_model_streaming(train_seq, feature_cols, categories, val_seq=val_seq,
+                                     params=params, metadata=metadata)
+
+def train_incremental(extra_trees=200, since=None, tolerance=0.0, params=None):
+    """Continue boosting the serving model on days it has not seen; promote only if the holdout holds.
+
+    New days are those after the model's `trained_through` date (or `since`)
+    up to the start of evaluate_model's 90-day holdout. The candidate is
+    archived and evaluated on that holdout next to the serving model; it
+    replaces it only if RMSE does not get worse by more than `tolerance`
+    (relative), otherwise the serving model stays and the candidate is
+    marked rejected. MODEL_PATH is only written when a candidate is promoted.
+    """
+    from predict import evaluate_model
+
+    current = load_artifact()
+    model, feature_cols, meta = current['model'], current['features'], current['metadata']
+    since = since or meta.get('trained_through')
+    if since is None:
+        raise ValueError("Serving model has no 'trained_through' date; pass --since YYYY-MM-DD")
+    since = pd.Timestamp(since)
+    # An unversioned serving model gets a version id now and is archived
+    # under it only if a candidate replaces it, so it can be rolled back to
+    parent = meta.get('version') or new_version_id()
+
+    print("--- 1. Loading and Feature Engineering ---")
+    df = create_lag_features(load_data())
+    cutoff = df['date'].max() - pd.Timedelta(days=90)
+
+    new_df = df[(df['date'] > since) & (df['date'] <= cutoff)]
+    del df
+    if new_df.empty:
+        print(f"No new days between {since.date()} and {cutoff.date()}; nothing to train.")
+        return None
+
+    print(f"\n--- 2. Continuing from version {parent} on {new_df['date'].nunique()} new days "
+          f"({len(new_df)} rows), up to {extra_trees} trees ---")
+    booster = continue_training(model, feature_cols, new_df, extra_trees, params=params)
+
+    version = new_version_id()
+    metadata = dict(data_provenance(), version=version, mode='incremental', parent=parent,
+                    trained_through=str(cutoff.date()), new_days_from=str((since + pd.Timedelta(days=1)).date()),
+                    new_rows=len(new_df), extra_trees=extra_trees, params=params or {})
+    save_model(booster, feature_cols, version_path(version), metadata, status='candidate')
+
+    print("\n--- 3. Holdout check ---")
+    current_metrics = evaluate_model(model_path=MODEL_PATH)
+    candidate_metrics = evaluate_model(model_path=version_path(version))
+    holdout = {'serving': current_metrics, 'candidate': candidate_metrics}
+
+    if candidate_metrics['rmse'] <= current_metrics['rmse'] * (1 + tolerance):
+        if not meta.get('version'):
+            save_model(model, feature_cols, version_path(parent), dict(meta, version=parent, mode='imported'),
+                       status='archived')
+        promote_version(version)
+        set_version_status(version, 'promoted', holdout=holdout)
+        print(f"Promoted version {version}: RMSE {current_metrics['rmse']:.3f} -> {candidate_metrics['rmse']:.3f}")
+        return booster
+
+    set_version_status(version, 'rejected', holdout=holdout)
+    print(f"Rolled back: candidate {version} RMSE {candidate_metrics['rmse']:.3f} is worse than "
+          f"{current_metrics['rmse']:.3f}; serving model unchanged")
+    return None
+
+def export_arrays(path=None):
+    """Dump the serving model as flat NumPy arrays (see src.compiled_model)."""
+    path = path or COMPILED_MODEL_PATH
+    artifact = load_artifact()
+    compiled = export_model(artifact['model'], path)
+    print(f"Exported {compiled.num_trees()} trees ({len(compiled.column)} nodes) to {path}")
+    return compiled
+
+def print_versions():
+    serving = load_artifact()['metadata'].get('version')
+    for m in list_versions():
+        marker = '*' if m['version'] == serving else ' '
+        rmse = m.get('holdout', {}).get('candidate', {}).get('rmse')
+        print(f"{marker} {m['version']}  {m.get('status', ''):<11} {m.get('mode', ''):<12} "
+              f"parent={m.get('parent') or '-':<22} trained_through={m.get('trained_through', '-')} "
+              f"trees={m.get('num_trees')}" + (f" holdout_rmse={rmse:.3f}" if rmse is not None else ''))
+
+def tune(n_trials=8, n_folds=3, workers=None, memory_budget_mb=None):
+    """Rolling-origin CV search; writes the best parameter overrides to BEST_PARAMS_PATH."""
+    from src.tuning import data_fingerprint, run_search
+
+    print("--- 1. Loading and Feature Engineering ---")
+    df = create_lag_features(load_data())
+    feature_cols = select_feature_cols(df.columns)
+
+    print("\n--- 2. Cross-validated Search ---")
+    ranked = run_search(df, feature_cols, n_trials=n_trials, n_folds=n_folds, workers=workers,
+                        memory_budget_mb=memory_budget_mb, data_key=data_fingerprint(DATA_PATH, feature_cols))
+    del df
+
+    print(f"\n{'rank':>4} {'RMSE':>8} {'MAE':>8} {'rounds':>7}  params")
+    for i, r in enumerate(ranked, 1):
+        print(f"{i:>4} {r['rmse']:8.3f} {r['mae']:8.3f} {r['best_iteration']:>7}  {r['params'] or 'defaults'}")
+
+    os.makedirs(os.path.dirname(BEST_PARAMS_PATH), exist_ok=True)
+    with open(BEST_PARAMS_PATH, 'w') as f:
+        json.dump(ranked[0]['params'], f, indent=2)
+    print("Best parameters saved at:", BEST_PARAMS_PATH)
+    return ranked
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the demand forecasting model.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Build features chunk by chunk on disk and train out-of-core (bounded memory).")
+    parser.add_argument("--compact", action="store_true",
+                        help="Categorical keys, float32 features and small-int flags through to LightGBM.")
+    parser.add_argument("--dataset-cache", action="store_true",
+                        help="Reuse binned LightGBM Datasets from models/dataset_cache when the inputs are unchanged.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Raw rows per chunk in streaming mode.")
+    parser.add_argument("--direct", action="store_true",
+                        help="Train one direct model per horizon bucket (1-7, 8-30, 31-90 days) instead.")
+    parser.add_argument("--origin-stride", type=int, default=5,
+                        help="For --direct: use every Nth day as a forecast origin.")
+    parser.add_argument("--tune", action="store_true",
+                        help="Run a rolling-origin CV parameter search in a process pool instead of training.")
+    parser.add_argument("--trials", type=int, default=8, help="Parameter candidates to evaluate in --tune mode.")
+    parser.add_argument("--folds", type=int, default=3, help="Rolling-origin folds in --tune mode.")
+    parser.add_argument("--workers", type=int, help="Worker processes in --tune mode (default: all cores).")
+    parser.add_argument("--tune-memory-mb", type=float,
+                        help="Memory budget for --tune workers; caps the process count.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Continue boosting the serving model on new days; keep it if the holdout gets worse.")
+    parser.add_argument("--extra-trees", type=int, default=200, help="Tree cap for --incremental.")
+    parser.add_argument("--since", help="For --incremental: last date the serving model has seen (default: its metadata).")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="For --incremental: relative holdout RMSE increase still accepted.")
+    parser.add_argument("--rollback", nargs='?', const='parent', metavar='VERSION',
+                        help="Restore an archived model version (default: the serving model's parent) and exit.")
+    parser.add_argument("--list-versions", action="store_true", help="List archived model versions and exit.")
+    parser.add_argument("--export-arrays", nargs='?', const=COMPILED_MODEL_PATH, metavar='PATH',
+                        help="Export the serving model as NumPy arrays for src.compiled_model and exit.")
+    parser.add_argument("--params", help="JSON file of parameter overrides (e.g. models/best_params.json).")
+    parser.add_argument("--trace", action="store_true",
+                        help="Log timing spans and print a metrics snapshot (Prometheus text) at the end.")
+    parser.add_argument("--metrics-out", help="Write the metrics snapshot here (.prom for text, else JSON).")
+    memory_profile.add_cli_args(parser)
+    args = parser.parse_args()
+
+    if args.trace or args.metrics_out:
+        telemetry.enable(log_spans=args.trace)
+
+    if args.list_versions:
+        print_versions()
+        raise SystemExit(0)
+    if args.export_arrays:
+        export_arrays(args.export_arrays)
+        raise SystemExit(0)
+    if args.rollback:
+        rollback_model(None if args.rollback == 'parent' else args.rollback)
+        raise SystemExit(0)
+
+    params = None
+    if args.params:
+        with open(args.params) as f:
+            params = json.load(f)
+
+    with memory_profile.profile_from_args(args):
+        if args.tune:
+            tune(args.trials, args.folds, args.workers, args.tune_memory_mb)
+        elif args.direct:
+            trained_model = train_direct(args.origin_stride, params=params)
+        elif args.incremental:
+            trained_model = train_incremental(args.extra_trees, args.since, args.tolerance, params=params)
+        elif args.streaming:
+            trained_model = train_streaming(args.chunk_rows, params=params)
+        else:
+            trained_model = train_in_memory(compact=args.compact, dataset_cache=args.dataset_cache,
+                                            params=params)
     
-    print("\nTraining completed.")
\ No newline at end of file
+    print("\nTuning completed." if args.tune else "\nTraining completed.")
+
+    if args.metrics_out:
+        telemetry.write_snapshot(args.metrics_out)
+    elif args.trace:
+        print(telemetry.prometheus_text())